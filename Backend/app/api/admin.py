@@ -1,9 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
+from pydantic import BaseModel, Field
+from typing import List, Optional, Tuple
 from app.core.database import get_db
 from app.models.user import User
 from app.models.driver import Driver
 from app.models.customer import Customer
+from app.services.dispatch_service import dispatch_engine
+from app.services.location_ingest import location_ingestor
+from app.services.location_history import location_history
+from app.services.presence import presence
+from app.services.pickup_index import pending_pickups
+from app.services.trip_meter import trip_meters
+from app.services.tracking_hub import tracking_hub
+from app.services.user_events import user_events
+from app.api.websocket import manager as ws_manager
+from app.services.ai_service import AIService, get_ai_service
+from app.services.route_cache import route_cache
+from app.utils.cursor import Keyset
 
 router = APIRouter(prefix="/api/v1/admin", tags=["admin"])
 
@@ -13,18 +27,32 @@ def admin_guard():
     return True
 
 
+# Newest sign-ups first, a page at a time (ix_users_created)
+USERS_BY_CREATED = Keyset(User.created_at, User.id)
+
+
+def users_page(query, cursor: Optional[str], limit: int):
+    try:
+        return USERS_BY_CREATED.page(query, cursor, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @router.get("/customers")
 def get_all_customers(
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     _: bool = Depends(admin_guard)
 ):
-    customers = (
-        db.query(User)
-        .join(Customer, Customer.id == User.id)
-        .all()
+    customers, next_cursor = users_page(
+        db.query(User, *USERS_BY_CREATED.columns())
+        .join(Customer, Customer.id == User.id),
+        cursor,
+        limit
     )
 
-    return [
+    return {"items": [
         {
             "id": u.id,
             "name": u.name,
@@ -32,22 +60,25 @@ def get_all_customers(
             "phone": u.phone,
             "created_at": u.created_at
         }
-        for u in customers
-    ]
+        for u, *_ in customers
+    ], "next_cursor": next_cursor}
 
 
 @router.get("/drivers")
 def get_all_drivers(
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     _: bool = Depends(admin_guard)
 ):
-    drivers = (
-        db.query(User, Driver)
-        .join(Driver, Driver.id == User.id)
-        .all()
+    drivers, next_cursor = users_page(
+        db.query(User, Driver, *USERS_BY_CREATED.columns())
+        .join(Driver, Driver.id == User.id),
+        cursor,
+        limit
     )
 
-    return [
+    return {"items": [
         {
             "id": user.id,
             "name": user.name,
@@ -58,5 +89,112 @@ def get_all_drivers(
             "total_deliveries": driver.total_deliveries,
             "created_at": user.created_at
         }
-        for user, driver in drivers
-    ]
+        for user, driver, *_ in drivers
+    ], "next_cursor": next_cursor}
+
+
+@router.get("/dispatch/metrics")
+def get_dispatch_metrics(_: bool = Depends(admin_guard)):
+    return dispatch_engine.get_metrics()
+
+
+@router.post("/dispatch/run")
+def run_dispatch_round(
+    db: Session = Depends(get_db),
+    _: bool = Depends(admin_guard)
+):
+    """Run one dispatch round immediately (debug / ops)"""
+    return dispatch_engine.run_once(db)
+
+
+# Keeps the debug endpoint from being used as a free matrix service
+MAX_MATRIX_ELEMENTS = 2500
+
+
+class DistanceMatrixRequest(BaseModel):
+    origins: List[Tuple[float, float]] = Field(..., min_length=1)
+    destinations: List[Tuple[float, float]] = Field(..., min_length=1)
+
+
+@router.post("/debug/distance-matrix")
+def debug_distance_matrix(
+    payload: DistanceMatrixRequest,
+    ai_service: AIService = Depends(get_ai_service),
+    _: bool = Depends(admin_guard)
+):
+    """Travel-time matrix between every origin and destination ([lat, lng] pairs)"""
+    if len(payload.origins) * len(payload.destinations) > MAX_MATRIX_ELEMENTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Matrix too large (max {MAX_MATRIX_ELEMENTS} elements)"
+        )
+
+    return ai_service.distance_matrix(payload.origins, payload.destinations)
+
+
+@router.get("/route-cache/stats")
+def get_route_cache_stats(_: bool = Depends(admin_guard)):
+    return route_cache.stats()
+
+
+@router.delete("/route-cache")
+def clear_route_cache(_: bool = Depends(admin_guard)):
+    route_cache.clear()
+    return {"success": True}
+
+
+@router.get("/routing/metrics")
+def get_routing_metrics(
+    _: bool = Depends(admin_guard),
+    ai_service: AIService = Depends(get_ai_service)
+):
+    return ai_service.routing_metrics()
+
+
+@router.get("/locations/metrics")
+def get_location_ingest_metrics(_: bool = Depends(admin_guard)):
+    return location_ingestor.get_metrics()
+
+
+@router.post("/locations/flush")
+def flush_locations(
+    db: Session = Depends(get_db),
+    _: bool = Depends(admin_guard)
+):
+    """Write pending driver positions now (debug / ops)"""
+    return {"rows_written": location_ingestor.flush(db)}
+
+
+@router.get("/locations/history/metrics")
+def get_location_history_metrics(_: bool = Depends(admin_guard)):
+    return location_history.get_metrics()
+
+
+@router.get("/trips/meter/metrics")
+def get_trip_meter_metrics(_: bool = Depends(admin_guard)):
+    return trip_meters.get_metrics()
+
+
+@router.get("/tracking/metrics")
+def get_tracking_metrics(_: bool = Depends(admin_guard)):
+    return tracking_hub.get_metrics()
+
+
+@router.get("/ws/metrics")
+def get_websocket_metrics(_: bool = Depends(admin_guard)):
+    return ws_manager.get_metrics()
+
+
+@router.get("/ws/events/metrics")
+def get_user_event_metrics(_: bool = Depends(admin_guard)):
+    return user_events.get_metrics()
+
+
+@router.get("/presence/metrics")
+def get_presence_metrics(_: bool = Depends(admin_guard)):
+    return presence.get_metrics()
+
+
+@router.get("/pickups/metrics")
+def get_pickup_index_metrics(_: bool = Depends(admin_guard)):
+    return pending_pickups.get_metrics()
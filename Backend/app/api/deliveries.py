@@ -1,20 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from app.schemas.delivery import (
     DeliveryCreate,
     DeliveryResponse,
-    AssignedDriver
+    AssignedDriver,
+    DeliveryPage,
+    UnassignedDelivery,
+    UnassignedDeliveryPage
 )
-from app.services.delivery_service import DeliveryService
-from app.core.database import get_db
+from app.services.delivery_service import DELIVERY_DETAIL, DeliveryService, epoch_seconds, load_delivery
+from app.services.ai_service import AIService, get_ai_service
+from app.services.driver_index import driver_index
+from app.services.location_ingest import location_ingestor
+from app.services.location_history import location_history
+from app.services.pickup_index import pending_pickups
+from app.services.presence import presence
+from app.services.trip_meter import trip_meters
+from app.services.tracking_hub import tracking_hub
+from app.services.user_events import publish_delivery_update
+from app.utils.polyline import encode as encode_polyline, simplify_for_zoom
+from app.utils.cursor import Keyset, decode_cursor, encode_cursor
+from app.core.config import settings
+from app.core.database import get_async_db, get_db
 from app.services.auth_service import AuthService
 from app.models.user import User
 from app.models.delivery import Delivery, DeliveryStatus
 from app.models.driver import Driver 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime, timedelta, timezone
  
 router = APIRouter(tags=["deliveries"])
@@ -26,11 +43,13 @@ print("DeliveryStatus members:", list(DeliveryStatus))
 # -------------------------
 # AUTH DEPENDENCY
 # -------------------------
+# async def routes use the AsyncSession; the plain def routes (list pages,
+# route, trail) stay on the sync session in the threadpool on purpose
 def get_current_user_dep(
     db: Session = Depends(get_db),
     token: str = Depends(oauth2_scheme)
 ) -> User:
-    user, error = AuthService.get_current_user(db, token)
+    user, error = AuthService.get_current_user_sync(db, token)
 
     if error or not user:
         raise HTTPException(
@@ -41,6 +60,34 @@ def get_current_user_dep(
     return user
 
 
+async def get_current_user_async_dep(
+    db: AsyncSession = Depends(get_async_db),
+    token: str = Depends(oauth2_scheme)
+) -> User:
+    user, error = await AuthService.get_current_user(db, token)
+
+    if error or not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token"
+        )
+
+    return user
+
+
+def get_token_claims_dep(token: str = Depends(oauth2_scheme)) -> dict:
+    """Signed token claims only - for hot paths that must not hit the database"""
+    claims = AuthService.get_token_claims(token)
+
+    if not claims:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token"
+        )
+
+    return claims
+
+
 # -------------------------
 # HELPER: ATTACH ASSIGNED DRIVER
 # -------------------------
@@ -87,6 +134,9 @@ def attach_assigned_driver(delivery: Delivery) -> DeliveryResponse:
         estimated_distance=delivery.estimated_distance,
         estimated_time=delivery.estimated_time,
         estimated_cost=delivery.estimated_cost,
+        actual_distance=delivery.actual_distance,
+        actual_time=delivery.actual_time,
+        actual_cost=delivery.actual_cost,
 
         scheduled_pickup=delivery.scheduled_pickup,
         created_at=delivery.created_at,
@@ -98,14 +148,32 @@ def attach_assigned_driver(delivery: Delivery) -> DeliveryResponse:
     )
 
 
+# -------------------------
+# HELPER: KEYSET PAGES
+# -------------------------
+# Lists page on (created_at, id) / (actual_delivery, id), newest first;
+# see the ix_deliveries_*_created / _status indexes on Delivery
+BY_CREATED = Keyset(Delivery.created_at, Delivery.id)
+BY_DELIVERED = Keyset(Delivery.actual_delivery, Delivery.id, nullable=True)
+
+
+def delivery_page(keyset: Keyset, query, cursor: Optional[str], limit: int) -> DeliveryPage:
+    try:
+        rows, next_cursor = keyset.page(query, cursor, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return DeliveryPage(items=[attach_assigned_driver(row.Delivery) for row in rows], next_cursor=next_cursor)
+
+
 # -------------------------
 # CUSTOMER: BOOK DELIVERY
 # -------------------------
 @router.post("/book", response_model=DeliveryResponse)
 async def book_delivery(
     delivery_data: DeliveryCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user_dep)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async_dep),
+    ai_service: AIService = Depends(get_ai_service)
 ):
     if current_user.user_type != "customer":
         raise HTTPException(
@@ -113,10 +181,12 @@ async def book_delivery(
             detail="Only customers can book deliveries"
         )
 
-    delivery, error = DeliveryService.book_delivery(
+    # Routing and the ORM work both await, so other requests and sockets keep moving
+    delivery, error = await DeliveryService.book_delivery(
         db,
         current_user.id,
-        delivery_data.dict()
+        delivery_data.dict(),
+        ai_service
     )
 
     if error:
@@ -128,18 +198,44 @@ async def book_delivery(
     return attach_assigned_driver(delivery)
 
 
+# -------------------------
+# CUSTOMER: FARE QUOTE
+# -------------------------
+class DeliveryQuoteRequest(BaseModel):
+    pickup_lat: float = Field(..., ge=-90, le=90)
+    pickup_lng: float = Field(..., ge=-180, le=180)
+    dropoff_lat: float = Field(..., ge=-90, le=90)
+    dropoff_lng: float = Field(..., ge=-180, le=180)
+    vehicle_type: str = "auto"
+
+
+@router.post("/quote", response_model=dict)
+async def quote_delivery(
+    quote_data: DeliveryQuoteRequest,
+    current_user: User = Depends(get_current_user_async_dep),
+    ai_service: AIService = Depends(get_ai_service)
+):
+    return await ai_service.quote_async(
+        (quote_data.pickup_lat, quote_data.pickup_lng),
+        (quote_data.dropoff_lat, quote_data.dropoff_lng),
+        quote_data.vehicle_type
+    )
+
+
 # -------------------------
 # CUSTOMER / DRIVER: MY DELIVERIES
 # -------------------------
-@router.get("/my-deliveries", response_model=List[DeliveryResponse])
+@router.get("/my-deliveries", response_model=DeliveryPage)
 def get_my_deliveries(
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user_dep),
 ):
+    """Open deliveries (and completed unpaid ones for customers), newest first"""
+    query = db.query(Delivery, *BY_CREATED.columns()).options(*DELIVERY_DETAIL)
     if current_user.user_type == "customer":
-        deliveries = (
-            db.query(Delivery)
-                .filter(
+        query = query.filter(
                     Delivery.customer_id == current_user.id,
                     (
                         Delivery.status.in_([
@@ -155,46 +251,97 @@ def get_my_deliveries(
                         (Delivery.new_payment_status != "paid")
                     )
 
-                ).all()
-        )
+                )
 
     elif current_user.user_type == "driver":
-        deliveries = db.query(Delivery).filter(
+        query = query.filter(
             Delivery.driver_id == current_user.id,
              Delivery.status != DeliveryStatus.CANCELLED.value
-        ).all()
+        )
 
     else:
-        deliveries = []
+        return DeliveryPage(items=[])
 
-    return [attach_assigned_driver(d) for d in deliveries]
+    return delivery_page(BY_CREATED, query, cursor, limit)
 
 
 # -------------------------
 # DRIVER: VIEW UNASSIGNED DELIVERIES
 # -------------------------
-@router.get("/unassigned", response_model=List[DeliveryResponse])
+@router.get("/unassigned", response_model=UnassignedDeliveryPage)
 async def get_unassigned_deliveries(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user_dep)
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lng: Optional[float] = Query(None, ge=-180, le=180),
+    radius_km: float = Query(settings.UNASSIGNED_RADIUS_KM, gt=0, le=settings.UNASSIGNED_MAX_RADIUS_KM),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async_dep)
 ):
+    """
+    Pending pickups around the driver, nearest first, a page at a time.
+
+    Served from the pickup index; the database is only asked for the
+    rows on this page. The position defaults to the driver's last ping.
+    next_cursor carries the origin and radius, so later pages keep the
+    order of the first even if the driver has moved.
+    """
     if current_user.user_type != "driver":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Drivers only"
         )
 
-    deliveries = (
-        db.query(Delivery)
-        .filter(
-            Delivery.driver_id.is_(None),
-            Delivery.status == DeliveryStatus.PENDING.value
-        )
-        .all()
-    )
-
-
-    return [attach_assigned_driver(d) for d in deliveries]
+    after = None
+    if cursor:
+        try:
+            lat, lng, radius_km, last_distance, last_id = decode_cursor(cursor, 5)
+            lat, lng, radius_km = float(lat), float(lng), float(radius_km)
+            after = (float(last_distance), str(last_id))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        # Same bounds as the query parameters (a cursor is client input too);
+        # the comparisons are False for NaN
+        if not (
+            -90 <= lat <= 90 and -180 <= lng <= 180
+            and 0 < radius_km <= settings.UNASSIGNED_MAX_RADIUS_KM
+            and 0 <= after[0] <= radius_km
+        ):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    elif lat is None or lng is None:
+        position = location_ingestor.position(current_user.id)
+        if position is not None:
+            lat, lng = position["lat"], position["lng"]
+        else:
+            driver = (await db.execute(
+                select(Driver.current_location_lat, Driver.current_location_lng)
+                .where(Driver.id == current_user.id)
+            )).first()
+            if driver is None or driver[0] is None or driver[1] is None:
+                raise HTTPException(status_code=400, detail="Driver position unknown: pass lat and lng")
+            lat, lng = driver
+
+    found = pending_pickups.page(lat, lng, radius_km, limit, after)
+    rows = (await db.scalars(
+        select(Delivery)
+        .options(*DELIVERY_DETAIL)
+        .where(Delivery.id.in_([delivery_id for delivery_id, _ in found]))
+    )).all() if found else []
+    by_id = {d.id: d for d in rows}
+
+    items = []
+    for delivery_id, distance in found:
+        delivery = by_id.get(delivery_id)
+        # Taken or cancelled since the index was read
+        if delivery is None or delivery.status != DeliveryStatus.PENDING.value or delivery.driver_id is not None:
+            continue
+        items.append(UnassignedDelivery(**attach_assigned_driver(delivery).dict(), distance_km=round(distance, 3)))
+
+    next_cursor = None
+    if len(found) == limit:
+        last_id, last_distance = found[-1]
+        next_cursor = encode_cursor([lat, lng, radius_km, last_distance, last_id])
+    return UnassignedDeliveryPage(items=items, next_cursor=next_cursor)
 
 
 # -------------------------
@@ -203,13 +350,13 @@ async def get_unassigned_deliveries(
 @router.post("/{delivery_id}/accept", response_model=DeliveryResponse)
 async def accept_delivery(
     delivery_id: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user_dep)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async_dep)
 ):
     if current_user.user_type != "driver":
         raise HTTPException(status_code=403, detail="Drivers only")
 
-    delivery, error = DeliveryService.force_assign_driver(
+    delivery, error = await DeliveryService.force_assign_driver(
         db=db,
         delivery_id=delivery_id,
         driver_id=current_user.id
@@ -227,13 +374,13 @@ async def accept_delivery(
 @router.post("/{delivery_id}/start", response_model=DeliveryResponse)
 async def start_trip(
     delivery_id: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user_dep)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async_dep)
 ):
     if current_user.user_type != "driver":
         raise HTTPException(status_code=403, detail="Drivers only")
 
-    delivery, error = DeliveryService.start_trip(
+    delivery, error = await DeliveryService.start_trip(
         db=db,
         delivery_id=delivery_id,
         driver_id=current_user.id
@@ -245,56 +392,138 @@ async def start_trip(
     return attach_assigned_driver(delivery)
 
 
-@router.get("/completed", response_model=List[DeliveryResponse])
+@router.get("/completed", response_model=DeliveryPage)
 def get_completed_deliveries(
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user_dep)
 ):
+    """The customer's completed deliveries, newest booking first"""
     if current_user.user_type != "customer":
         raise HTTPException(status_code=403, detail="Customers only")
 
-    deliveries = (
-        db.query(Delivery)
+    query = (
+        db.query(Delivery, *BY_CREATED.columns())
+        .options(*DELIVERY_DETAIL)
         .filter(
             Delivery.customer_id == current_user.id,
             Delivery.status == DeliveryStatus.COMPLETED.value
         )
-        .all()
     )
 
-    return [attach_assigned_driver(d) for d in deliveries]
+    return delivery_page(BY_CREATED, query, cursor, limit)
 
 
-@router.get("/driver/completed", response_model=List[DeliveryResponse])
+@router.get("/driver/completed", response_model=DeliveryPage)
 def get_driver_completed_deliveries(
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user_dep),
 ):
+    """The driver's completed trips, most recently delivered first"""
     if current_user.user_type != "driver":
         raise HTTPException(status_code=403, detail="Drivers only")
 
-    deliveries = (
-        db.query(Delivery)
+    query = (
+        db.query(Delivery, *BY_DELIVERED.columns())
+        .options(*DELIVERY_DETAIL)
         .filter(
             Delivery.driver_id == current_user.id,
             Delivery.status == DeliveryStatus.COMPLETED.value
         )
-        .order_by(Delivery.actual_delivery.desc())
-        .all()
     )
 
-    return [attach_assigned_driver(d) for d in deliveries]
+    return delivery_page(BY_DELIVERED, query, cursor, limit)
 
 # -------------------------
 # CUSTOMER / DRIVER: GET DELIVERY BY ID
 # -------------------------
-@router.get("/{delivery_id}", response_model=DeliveryResponse)
-async def get_delivery(
+# -------------------------
+# CUSTOMER / DRIVER: ROUTE GEOMETRY
+# -------------------------
+@router.get("/{delivery_id}/route", response_model=dict)
+def get_delivery_route(
+    delivery_id: str,
+    zoom: Optional[float] = Query(None, ge=0, le=22),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user_dep)
+):
+    """Encoded polyline for the booked route, simplified for ?zoom= (full resolution without it)"""
+    delivery = db.query(Delivery).filter(Delivery.id == delivery_id).first()
+    if not delivery:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Delivery not found"
+        )
+    if current_user.id not in (delivery.customer_id, delivery.driver_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to access this delivery"
+        )
+
+    points = DeliveryService.route_points(delivery)
+    simplified = simplify_for_zoom(points, zoom)
+    return {
+        "delivery_id": delivery.id,
+        "zoom": zoom,
+        "polyline": encode_polyline(simplified),
+        "point_count": len(simplified),
+        "full_point_count": len(points)
+    }
+
+
+# -------------------------
+# CUSTOMER / DRIVER: DRIVEN TRAIL
+# -------------------------
+@router.get("/{delivery_id}/trail", response_model=dict)
+def get_delivery_trail(
     delivery_id: str,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user_dep)
 ):
-    delivery = DeliveryService.get_delivery_by_id(
+    """Positions the driver reported between pickup and delivery (so far, if still in transit)"""
+    delivery = db.query(Delivery).filter(Delivery.id == delivery_id).first()
+    if not delivery:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Delivery not found"
+        )
+    if current_user.id not in (delivery.customer_id, delivery.driver_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to access this delivery"
+        )
+    if not delivery.driver_id or not delivery.actual_pickup:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Trip has not started"
+        )
+
+    start = epoch_seconds(delivery.actual_pickup)
+    end = epoch_seconds(delivery.actual_delivery) if delivery.actual_delivery else datetime.now(timezone.utc).timestamp()
+    trail = location_history.trail(delivery.driver_id, start, end)
+
+    return {
+        "delivery_id": delivery.id,
+        "driver_id": delivery.driver_id,
+        "from": start,
+        "to": end,
+        "point_count": len(trail),
+        "polyline": encode_polyline([(lat, lng) for lat, lng, _ in trail]),
+        # Seconds since pickup, one per polyline point
+        "timestamps": [round(ts - start, 3) for _, _, ts in trail]
+    }
+
+
+@router.get("/{delivery_id}", response_model=DeliveryResponse)
+async def get_delivery(
+    delivery_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async_dep)
+):
+    delivery = await DeliveryService.get_delivery_by_id(
         db,
         delivery_id,
         current_user.id
@@ -334,13 +563,13 @@ async def get_delivery(
 @router.post("/{delivery_id}/complete", response_model=DeliveryResponse)
 async def complete_trip(
     delivery_id: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user_dep)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async_dep)
 ):
     if current_user.user_type != "driver":
         raise HTTPException(status_code=403, detail="Drivers only")
 
-    delivery, error = DeliveryService.complete_trip(
+    delivery, error = await DeliveryService.complete_trip(
         db=db,
         delivery_id=delivery_id,
         driver_id=current_user.id
@@ -357,55 +586,58 @@ class DriverStatusUpdate(BaseModel):
     current_status: str  # "online", "offline", "busy"
 
 class DriverLocationUpdate(BaseModel):
-    lat: float
-    lng: float
+    lat: float = Field(..., ge=-90, le=90, allow_inf_nan=False)
+    lng: float = Field(..., ge=-180, le=180, allow_inf_nan=False)
 
 # --- Add these Routes to the router ---
 @router.put("/driver/status", response_model=dict)
 async def update_driver_status(
     status_data: DriverStatusUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user_dep)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async_dep)
 ):
     """Allows drivers to toggle availability (On Wait / Offline)"""
     if current_user.user_type != "driver":
         raise HTTPException(status_code=403, detail="Drivers only")
 
     # Assuming driver profile exists
-    driver = db.query(Driver).filter(Driver.id == current_user.id).first()
+    driver = await db.get(Driver, current_user.id)
     if not driver:
         raise HTTPException(status_code=404, detail="Driver profile not found")
 
     driver.is_available = status_data.is_available
     driver.current_status = status_data.current_status
     
-    db.commit()
+    await db.commit()
+    presence.status_changed(driver.id, driver.is_available)
+
+    # The fleet state is ahead of the row until the next location flush
+    position = location_ingestor.position(driver.id)
+    driver_index.set_status(
+        driver.id,
+        driver.is_available,
+        position["lat"] if position else driver.current_location_lat,
+        position["lng"] if position else driver.current_location_lng,
+        driver.overall_rating
+    )
     return {"success": True, "status": driver.current_status}
 
 @router.put("/driver/location", response_model=dict)
 async def update_driver_location(
     location_data: DriverLocationUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user_dep)
+    claims: dict = Depends(get_token_claims_dep)
 ):
-    """Allows drivers to send GPS updates"""
-    if current_user.user_type != "driver":
+    """Allows drivers to send GPS updates (written behind to the database)"""
+    if claims.get("user_type") != "driver":
         raise HTTPException(status_code=403, detail="Drivers only")
 
-    driver = db.query(Driver).filter(Driver.id == current_user.id).first()
-    if not driver:
-        raise HTTPException(status_code=404, detail="Driver profile not found")
-
-    driver.current_location_lat = location_data.lat
-    driver.current_location_lng = location_data.lng
-    
-    db.commit()
+    location_ingestor.ingest(claims["user_id"], location_data.lat, location_data.lng)
     return {"success": True, "location": {"lat": location_data.lat, "lng": location_data.lng}}
 
 @router.get("/driver/location", response_model=dict)
 async def get_driver_location(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user_dep)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async_dep)
 ):
     """
     Returns the driver's current GPS so the customer can see
@@ -414,33 +646,25 @@ async def get_driver_location(
 
     # If customer → get assigned driver
     if current_user.user_type == "customer":
-        delivery = (
-            db.query(Delivery)
-            .filter(
+        delivery = await db.scalar(
+            select(Delivery)
+            .where(
                 Delivery.customer_id == current_user.id,
                 Delivery.status != DeliveryStatus.COMPLETED.value,
                 Delivery.driver_id.isnot(None)
             )
-            .first()
+            .limit(1)
         )
 
 
         if not delivery:
             return {"lat": None, "lng": None}
 
-        driver = (
-            db.query(Driver)
-            .filter(Driver.id == delivery.driver_id)
-            .first()
-        )
+        driver = await db.get(Driver, delivery.driver_id)
 
     # If driver → return YOUR location
     elif current_user.user_type == "driver":
-        driver = (
-            db.query(Driver)
-            .filter(Driver.id == current_user.id)
-            .first()
-        )
+        driver = await db.get(Driver, current_user.id)
 
     else:
         raise HTTPException(status_code=403, detail="Not allowed")
@@ -448,6 +672,10 @@ async def get_driver_location(
     if not driver:
         return {"lat": None, "lng": None}
 
+    position = location_ingestor.position(driver.id)
+    if position:
+        return {"lat": position["lat"], "lng": position["lng"]}
+
     return {
         "lat": driver.current_location_lat,
         "lng": driver.current_location_lng
@@ -501,16 +729,20 @@ async def get_driver_location(
 @router.post("/{delivery_id}/driver-cancel", response_model=DeliveryResponse)
 async def driver_cancel_delivery(
     delivery_id: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user_dep)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async_dep)
 ):
     if current_user.user_type != "driver":
         raise HTTPException(status_code=403, detail="Drivers only")
 
-    delivery = db.query(Delivery).filter(Delivery.id == delivery_id).first()
+    delivery = await db.get(Delivery, delivery_id)
     if not delivery:
         raise HTTPException(status_code=404, detail="Delivery not found")
 
+    # Only the assigned driver may drop it - before any live state is touched
+    if delivery.driver_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not allowed")
+
     if delivery.status == DeliveryStatus.COMPLETED.value:
         raise HTTPException(
             status_code=400,
@@ -530,14 +762,20 @@ async def driver_cancel_delivery(
             fine = 100
 
     # Apply cancellation
+    trip_meters.discard(delivery.id, current_user.id)
+    tracking_hub.close(delivery.id)
     delivery.status = DeliveryStatus.PENDING.value
     delivery.driver_id = None
 
     # Optional: store fine
     # delivery.driver_penalty = fine
 
-    db.commit()
-    db.refresh(delivery)
+    await db.commit()
+    delivery = await load_delivery(db, Delivery.id == delivery_id)
+
+    pending_pickups.sync(delivery)
+    # The driver is no longer on the delivery but still has to hear about it
+    publish_delivery_update(delivery, "driver_cancelled", extra_user_ids=(current_user.id,))
 
     return {
         **attach_assigned_driver(delivery).dict(),
@@ -548,10 +786,10 @@ async def driver_cancel_delivery(
 @router.post("/{delivery_id}/customer-cancel", response_model=DeliveryResponse)
 async def customer_cancel_delivery(
     delivery_id: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user_dep)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async_dep)
 ):
-    delivery = db.query(Delivery).filter(Delivery.id == delivery_id).first()
+    delivery = await db.get(Delivery, delivery_id)
 
     if not delivery:
         raise HTTPException(status_code=404, detail="Delivery not found")
@@ -563,21 +801,29 @@ async def customer_cancel_delivery(
     if delivery.status == DeliveryStatus.COMPLETED.value:
         raise HTTPException(status_code=400, detail="Cannot cancel completed delivery")
 
+    if delivery.driver_id:
+        trip_meters.discard(delivery.id, delivery.driver_id)
+        tracking_hub.close(delivery.id)
+
+    cancelled_driver_id = delivery.driver_id
     delivery.status = DeliveryStatus.CANCELLED.value
     delivery.driver_id = None
 
-    db.commit()
-    db.refresh(delivery)
+    await db.commit()
+    delivery = await load_delivery(db, Delivery.id == delivery_id)
+
+    pending_pickups.sync(delivery)
+    publish_delivery_update(delivery, "cancelled", extra_user_ids=(cancelled_driver_id,))
 
     return attach_assigned_driver(delivery)
 
 @router.post("/{delivery_id}/mark-paid", response_model=DeliveryResponse)
 async def mark_delivery_paid(
     delivery_id: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user_dep),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async_dep),
 ):
-    delivery = db.query(Delivery).filter(Delivery.id == delivery_id).first()
+    delivery = await db.get(Delivery, delivery_id)
 
     if not delivery:
         raise HTTPException(status_code=404, detail="Delivery not found")
@@ -589,8 +835,10 @@ async def mark_delivery_paid(
         raise HTTPException(status_code=400, detail="Delivery not completed")
 
     delivery.new_payment_status = "paid"   # ✅ THIS IS THE KEY
-    db.commit()
-    db.refresh(delivery)
+    await db.commit()
+    delivery = await load_delivery(db, Delivery.id == delivery_id)
+
+    publish_delivery_update(delivery, "paid")
 
     return attach_assigned_driver(delivery)
 
@@ -606,10 +854,10 @@ class ReschedulePickup(BaseModel):
 async def reschedule_pickup(
     delivery_id: str,
     payload: ReschedulePickup,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user_dep),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async_dep),
 ):
-    delivery = db.query(Delivery).filter(Delivery.id == delivery_id).first()
+    delivery = await db.get(Delivery, delivery_id)
 
     if not delivery:
         raise HTTPException(status_code=404, detail="Delivery not found")
@@ -645,8 +893,10 @@ async def reschedule_pickup(
     # Store as UTC-aware
     delivery.scheduled_pickup = incoming
 
-    db.commit()
-    db.refresh(delivery)
+    await db.commit()
+    delivery = await load_delivery(db, Delivery.id == delivery_id)
+
+    publish_delivery_update(delivery, "rescheduled")
 
     return attach_assigned_driver(delivery)
 
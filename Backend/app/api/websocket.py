@@ -1,41 +1,378 @@
 # File: app/api/websocket.py
-from fastapi import WebSocket, WebSocketDisconnect
-from typing import Dict, List
+import asyncio
 import json
+import struct
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Hashable, Optional, Tuple
+from fastapi import WebSocket
+from app.core.config import settings
+from app.services.backplane import Backplane, create_backplane
+from app.services.routing import LatencyHistogram
+from app.utils import ws_binary
+from app.utils.timer_wheel import TimerWheel
+
+# Frame as carried over the backplane: flags, coalesce key length, key, text
+ENVELOPE = struct.Struct("<BH")
+FLAG_PRIVATE = 1
+BROADCAST_CHANNEL = "broadcast"
+_UNSET = object()
+
+
+class Frame:
+    """
+    A message encoded once and shared by every queue it is put on.
+
+    The JSON text and the binary-subprotocol form are each built on
+    first use, so a frame only pays for the encodings its recipients
+    need. Private frames (live tracking) only go to sockets that
+    connected with the user's own token.
+    """
+
+    __slots__ = ("_message", "_text", "_binary", "coalesce_key", "private")
+
+    def __init__(
+        self,
+        message: Optional[dict] = None,
+        coalesce_key: Optional[Hashable] = None,
+        private: bool = False,
+        text: Optional[str] = None
+    ):
+        self._message = message
+        self._text = text
+        self._binary = _UNSET
+        self.coalesce_key = coalesce_key
+        self.private = private
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = json.dumps(self._message)
+        return self._text
+
+    @property
+    def binary(self) -> Optional[bytes]:
+        """The frame for binary-subprotocol clients, None if it only exists as JSON"""
+        if self._binary is _UNSET:
+            if self._message is None:
+                self._message = json.loads(self._text)
+            self._binary = ws_binary.encode_message(self._message)
+        return self._binary
+
+    def to_envelope(self) -> bytes:
+        key = json.dumps(list(self.coalesce_key)).encode() if self.coalesce_key is not None else b""
+        flags = FLAG_PRIVATE if self.private else 0
+        return ENVELOPE.pack(flags, len(key)) + key + self.text.encode()
+
+    @classmethod
+    def from_envelope(cls, payload: bytes) -> "Frame":
+        flags, key_len = ENVELOPE.unpack_from(payload)
+        start = ENVELOPE.size
+        key = tuple(json.loads(payload[start:start + key_len])) if key_len else None
+        return cls(None, key, bool(flags & FLAG_PRIVATE), text=payload[start + key_len:].decode())
+
+
+class Connection:
+    """
+    One socket with a bounded send queue drained by its own writer task.
+
+    Frames carrying a coalesce_key replace a queued frame with the same
+    key (only the newest driver position matters). When the queue is
+    full the oldest frame is dropped; a consumer that stays behind for
+    longer than slow_consumer_seconds without catching up is disconnected.
+    """
+
+    def __init__(
+        self,
+        manager: "ConnectionManager",
+        websocket: WebSocket,
+        user_id: str,
+        authenticated: bool = False,
+        binary: bool = False
+    ):
+        self.manager = manager
+        self.websocket = websocket
+        self.user_id = user_id
+        self.authenticated = authenticated
+        self.binary = binary
+        # (frame, enqueued at) pairs
+        self.queue: Deque[Tuple[Frame, float]] = deque()
+        self.ready = asyncio.Event()
+        # When the queue first overflowed since it was last empty
+        self.overflow_since: Optional[float] = None
+        self.closed = False
+        self.task: Optional[asyncio.Task] = None
+
+    def put(self, frame: Frame) -> bool:
+        m = self.manager.metrics
+        if self.closed:
+            return False
+        if frame.private and not self.authenticated:
+            m["refused_private"] += 1
+            return False
+
+        if frame.coalesce_key is not None:
+            for i, (queued, enqueued_at) in enumerate(self.queue):
+                if queued.coalesce_key == frame.coalesce_key:
+                    # Keep its place in line, carry the newer payload
+                    self.queue[i] = (frame, enqueued_at)
+                    m["coalesced"] += 1
+                    return True
+
+        now = time.perf_counter()
+        if len(self.queue) >= self.manager.max_queue:
+            if self.overflow_since is None:
+                self.overflow_since = now
+            elif now - self.overflow_since > self.manager.slow_consumer_seconds:
+                m["slow_disconnects"] += 1
+                print(f"⚠️  Disconnecting slow WebSocket consumer {self.user_id}")
+                self.close()
+                return False
+            self.queue.popleft()
+            m["dropped"] += 1
+
+        self.queue.append((frame, now))
+        m["enqueued"] += 1
+        m["max_queue_depth"] = max(m["max_queue_depth"], len(self.queue))
+        self.ready.set()
+        return True
+
+    async def writer(self):
+        m = self.manager.metrics
+        try:
+            while not self.closed:
+                if not self.queue:
+                    self.overflow_since = None
+                    self.ready.clear()
+                    await self.ready.wait()
+                    continue
+                frame, enqueued_at = self.queue.popleft()
+                started = time.perf_counter()
+                data = frame.binary if self.binary else None
+                send = self.websocket.send_bytes(data) if data is not None else self.websocket.send_text(frame.text)
+                await asyncio.wait_for(send, timeout=self.manager.send_timeout_seconds)
+                done = time.perf_counter()
+                self.manager.send_latency.record(done - started)
+                self.manager.queue_latency.record(done - enqueued_at)
+                m["sent"] += 1
+        except asyncio.CancelledError:
+            pass
+        except asyncio.TimeoutError:
+            m["send_timeouts"] += 1
+            print(f"⚠️  WebSocket send to {self.user_id} timed out")
+        except Exception as e:
+            m["send_errors"] += 1
+            print(f"Error sending message to {self.user_id}: {e}")
+        finally:
+            self.closed = True
+            self.manager._forget(self)
+
+    def close(self, code: int = 1013):
+        """Stop the writer and close the socket without waiting"""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        if self.task is not None and self.task is not asyncio.current_task():
+            self.task.cancel()
+        self.manager._forget(self)
+        asyncio.get_running_loop().create_task(self._close_socket(code))
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-    
-    async def connect(self, websocket: WebSocket, user_id: str):
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
-    
-    def disconnect(self, user_id: str):
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
-    
-    async def send_personal_message(self, message: str, user_id: str):
-        if user_id in self.active_connections:
-            await self.active_connections[user_id].send_text(message)
-    
-    async def broadcast(self, message: str):
-        for connection in self.active_connections.values():
-            await connection.send_text(message)
-
-manager = ConnectionManager()
-
-# In mainCode.py
-from fastapi import WebSocket
-from app.api.websocket import manager
+    """
+    WebSocket fan-out.
+
+    Sends never await the network: a message is JSON-encoded once,
+    put on each recipient's bounded queue, and written out by that
+    connection's writer task, so one slow client cannot hold up the rest.
+
+    With several workers, each socket lives in one of them. Every worker
+    subscribes to "user:<id>" for its sockets on the backplane; personal
+    messages are delivered locally and published there, broadcasts on
+    "broadcast". Other channels can be routed to services with on_channel().
+
+    A socket the client has not sent anything on for idle_timeout_seconds
+    is closed. Deadlines live in a timer wheel, so the reaper only looks
+    at the sockets due in each tick, never at every connection.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = 256,
+        send_timeout_seconds: float = 5.0,
+        slow_consumer_seconds: float = 10.0,
+        backplane: Optional[Backplane] = None,
+        idle_timeout_seconds: float = 0.0
+    ):
+        self.max_queue = max_queue
+        self.send_timeout_seconds = send_timeout_seconds
+        self.slow_consumer_seconds = slow_consumer_seconds
+        self.idle_timeout_seconds = idle_timeout_seconds
+        self._idle = TimerWheel(tick_seconds=1.0)
+        self._reaper: Optional[asyncio.Task] = None
+        self.backplane = backplane or Backplane()
+        self._channel_handlers: Dict[str, Callable[[bytes], None]] = {}
+        self.active_connections: Dict[str, Connection] = {}
+        self.send_latency = LatencyHistogram()
+        self.queue_latency = LatencyHistogram()
+        self.metrics = {
+            "encoded": 0, "enqueued": 0, "sent": 0, "coalesced": 0, "dropped": 0,
+            "slow_disconnects": 0, "send_timeouts": 0, "send_errors": 0, "max_queue_depth": 0,
+            "refused_private": 0, "remote_received": 0, "idle_disconnects": 0
+        }
+
+    # -------------------------
+    # BACKPLANE
+    # -------------------------
+    async def start(self):
+        await self.backplane.start(self._on_backplane)
+        self.backplane.subscribe(BROADCAST_CHANNEL)
+        for channel in self._channel_handlers:
+            self.backplane.subscribe(channel)
+        if self.idle_timeout_seconds > 0 and self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap_idle())
+
+    async def stop(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        await self.backplane.stop()
+
+    def on_channel(self, channel: str, handler: Callable[[bytes], None]):
+        """Hand messages other workers publish on channel to handler"""
+        self._channel_handlers[channel] = handler
+        self.backplane.subscribe(channel)
+
+    def publish(self, channel: str, payload: bytes):
+        self.backplane.publish(channel, payload)
+
+    def _on_backplane(self, channel: str, payload: bytes):
+        if channel.startswith("user:"):
+            connection = self.active_connections.get(channel[5:])
+            if connection is not None:
+                self.metrics["remote_received"] += 1
+                connection.put(Frame.from_envelope(payload))
+        elif channel == BROADCAST_CHANNEL:
+            self.metrics["remote_received"] += 1
+            self._put_all(Frame.from_envelope(payload))
+        else:
+            handler = self._channel_handlers.get(channel)
+            if handler is not None:
+                handler(payload)
+
+    def is_reachable(self, user_id: str) -> bool:
+        """Whether a personal message could reach the user from this worker"""
+        return user_id in self.active_connections or self.backplane.has_peers()
+
+    # -------------------------
+    # CONNECTIONS
+    # -------------------------
+    async def connect(self, websocket: WebSocket, user_id: str, authenticated: bool = False) -> Connection:
+        # Clients that offer the binary subprotocol get location/status frames as structs
+        binary = ws_binary.SUBPROTOCOL in websocket.scope.get("subprotocols", [])
+        await websocket.accept(subprotocol=ws_binary.SUBPROTOCOL if binary else None)
+        previous = self.active_connections.get(user_id)
+        if previous is not None:
+            previous.close()
+        connection = Connection(self, websocket, user_id, authenticated, binary)
+        connection.task = asyncio.create_task(connection.writer())
+        self.active_connections[user_id] = connection
+        self.backplane.subscribe(f"user:{user_id}")
+        self.touch(connection)
+        print(f"✅ User {user_id} connected. Active connections: {len(self.active_connections)}")
+        return connection
 
-@app.websocket("/ws/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: str):
-    await manager.connect(websocket, user_id)
-    try:
+    def disconnect(self, user_id: str, websocket: Optional[WebSocket] = None):
+        connection = self.active_connections.get(user_id)
+        if connection is None or (websocket is not None and connection.websocket is not websocket):
+            return
+        connection.closed = True
+        if connection.task is not None:
+            connection.task.cancel()
+        self._forget(connection)
+        print(f"❌ User {user_id} disconnected. Active connections: {len(self.active_connections)}")
+
+    def _forget(self, connection: Connection):
+        self._idle.cancel(connection)
+        if self.active_connections.get(connection.user_id) is connection:
+            del self.active_connections[connection.user_id]
+            self.backplane.unsubscribe(f"user:{connection.user_id}")
+
+    # -------------------------
+    # IDLE SOCKETS
+    # -------------------------
+    def touch(self, connection: Connection):
+        """The client sent something: push its idle deadline out"""
+        if self.idle_timeout_seconds > 0 and not connection.closed:
+            self._idle.schedule(connection, self.idle_timeout_seconds)
+
+    async def _reap_idle(self):
         while True:
-            data = await websocket.receive_text()
-            # Handle real-time updates
-            await manager.send_personal_message(f"Message received: {data}", user_id)
-    except WebSocketDisconnect:
-        manager.disconnect(user_id)
\ No newline at end of file
+            await asyncio.sleep(self._idle.tick_seconds)
+            for connection in self._idle.advance():
+                if connection.closed:
+                    continue
+                self.metrics["idle_disconnects"] += 1
+                print(f"⚠️  Closing idle WebSocket for {connection.user_id}")
+                connection.close(code=1001)
+
+    def is_connected(self, user_id: str) -> bool:
+        return user_id in self.active_connections
+
+    def encode(self, message: dict, coalesce_key: Optional[Hashable] = None, private: bool = False) -> Frame:
+        self.metrics["encoded"] += 1
+        return Frame(message, coalesce_key, private)
+
+    async def send_personal_message(
+        self,
+        message: dict,
+        user_id: str,
+        coalesce_key: Optional[Hashable] = None,
+        private: bool = False
+    ):
+        frame = self.encode(message, coalesce_key, private)
+        connection = self.active_connections.get(user_id)
+        if connection is not None:
+            connection.put(frame)
+        # The same user may also be connected to another worker
+        if self.backplane.has_peers():
+            self.backplane.publish(f"user:{user_id}", frame.to_envelope())
+
+    async def broadcast(self, message: dict):
+        frame = self.encode(message)
+        self._put_all(frame)
+        if self.backplane.has_peers():
+            self.backplane.publish(BROADCAST_CHANNEL, frame.to_envelope())
+
+    def _put_all(self, frame: Frame):
+        for connection in list(self.active_connections.values()):
+            connection.put(frame)
+
+    def get_metrics(self) -> Dict:
+        depths = [len(c.queue) for c in self.active_connections.values()]
+        return {
+            **self.metrics,
+            "connections": len(depths),
+            "queued_frames": sum(depths),
+            "deepest_queue": max(depths, default=0),
+            "max_queue": self.max_queue,
+            "send_latency": self.send_latency.snapshot(),
+            "queue_latency": self.queue_latency.snapshot(),
+            "backplane": self.backplane.get_metrics()
+        }
+
+
+manager = ConnectionManager(
+    max_queue=settings.WS_SEND_QUEUE_SIZE,
+    send_timeout_seconds=settings.WS_SEND_TIMEOUT_SECONDS,
+    slow_consumer_seconds=settings.WS_SLOW_CONSUMER_SECONDS,
+    backplane=create_backplane(settings.WS_BACKPLANE, settings.WS_BACKPLANE_SOCKET),
+    idle_timeout_seconds=settings.WS_IDLE_TIMEOUT_SECONDS
+)
@@ -19,6 +19,7 @@ class Settings:
     
     # Database
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./happyauto.db")
+    DATABASE_ECHO: bool = os.getenv("DATABASE_ECHO", "True").lower() == "true"  # log every statement
     
     # App Settings
     DEBUG: bool = os.getenv("DEBUG", "True").lower() == "true"
@@ -28,9 +29,94 @@ class Settings:
     
     # External APIs
     GOOGLE_MAPS_API_KEY: str = os.getenv("GOOGLE_MAPS_API_KEY", "")
+    GOOGLE_MAPS_BASE_URL: str = os.getenv("GOOGLE_MAPS_BASE_URL", "https://maps.googleapis.com")
+    HTTP_POOL_CONNECTIONS: int = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))
+    HTTP_POOL_MAXSIZE: int = int(os.getenv("HTTP_POOL_MAXSIZE", "32"))
+    
+    # Routing resilience (async Google calls)
+    ROUTING_DEADLINE_MS: float = float(os.getenv("ROUTING_DEADLINE_MS", "1500"))
+    ROUTING_SLOW_CALL_MS: float = float(os.getenv("ROUTING_SLOW_CALL_MS", "1000"))
+    ROUTING_BREAKER_FAILURES: int = int(os.getenv("ROUTING_BREAKER_FAILURES", "5"))
+    ROUTING_BREAKER_RESET_SECONDS: float = float(os.getenv("ROUTING_BREAKER_RESET_SECONDS", "30"))
+    # Hedging: if Google hasn't answered by its HEDGE_PERCENTILE latency, race the local providers
+    ROUTING_HEDGE_ENABLED: bool = os.getenv("ROUTING_HEDGE_ENABLED", "True").lower() == "true"
+    ROUTING_HEDGE_PERCENTILE: float = float(os.getenv("ROUTING_HEDGE_PERCENTILE", "95"))
+    ROUTING_HEDGE_MIN_MS: float = float(os.getenv("ROUTING_HEDGE_MIN_MS", "50"))
+    ROUTING_HEDGE_DEFAULT_MS: float = float(os.getenv("ROUTING_HEDGE_DEFAULT_MS", "400"))
+    ROUTING_HEDGE_MIN_SAMPLES: int = int(os.getenv("ROUTING_HEDGE_MIN_SAMPLES", "20"))
+    
+    # Offline routing graph (build with: python -m app.services.road_graph build city.osm city.hagr --ch)
+    ROAD_GRAPH_PATH: str = os.getenv("ROAD_GRAPH_PATH", "")
+    
+    # Route cache (in-process LRU + SQLite file shared by all workers)
+    ROUTE_CACHE_ENABLED: bool = os.getenv("ROUTE_CACHE_ENABLED", "True").lower() == "true"
+    ROUTE_CACHE_GRID_DEG: float = float(os.getenv("ROUTE_CACHE_GRID_DEG", "0.001"))  # ~110 m
+    ROUTE_CACHE_MAX_ENTRIES: int = int(os.getenv("ROUTE_CACHE_MAX_ENTRIES", "10000"))
+    ROUTE_CACHE_TTL_SECONDS: float = float(os.getenv("ROUTE_CACHE_TTL_SECONDS", "3600"))
+    ROUTE_CACHE_DB_PATH: str = os.getenv("ROUTE_CACHE_DB_PATH", "./route_cache.db")
+    ROUTE_CACHE_PERSISTENT_TTL_SECONDS: float = float(os.getenv("ROUTE_CACHE_PERSISTENT_TTL_SECONDS", "86400"))
+    
+    # Driver matching
+    DRIVER_INDEX_CELL_DEG: float = float(os.getenv("DRIVER_INDEX_CELL_DEG", "0.01"))  # ~1.1 km cells
+    # Drivers' unassigned feed: pickups within this radius of the driver
+    UNASSIGNED_RADIUS_KM: float = float(os.getenv("UNASSIGNED_RADIUS_KM", "10"))
+    UNASSIGNED_MAX_RADIUS_KM: float = float(os.getenv("UNASSIGNED_MAX_RADIUS_KM", "50"))
+    
+    # Batched dispatch
+    DISPATCH_ENABLED: bool = os.getenv("DISPATCH_ENABLED", "True").lower() == "true"
+    DISPATCH_WINDOW_SECONDS: float = float(os.getenv("DISPATCH_WINDOW_SECONDS", "3"))
+    DISPATCH_MAX_PICKUP_KM: float = float(os.getenv("DISPATCH_MAX_PICKUP_KM", "10"))
+    DISPATCH_BATCH_SIZE: int = int(os.getenv("DISPATCH_BATCH_SIZE", "500"))
+    DISPATCH_CANDIDATES_PER_DELIVERY: int = int(os.getenv("DISPATCH_CANDIDATES_PER_DELIVERY", "10"))
+    DISPATCH_AUTO_ASSIGN: bool = os.getenv("DISPATCH_AUTO_ASSIGN", "False").lower() == "true"
+    
+    # Write-behind driver location ingestion
+    LOCATION_FLUSH_INTERVAL_SECONDS: float = float(os.getenv("LOCATION_FLUSH_INTERVAL_SECONDS", "2"))
+    LOCATION_FLUSH_BATCH_SIZE: int = int(os.getenv("LOCATION_FLUSH_BATCH_SIZE", "500"))
+    LOCATION_MAX_LAG_SECONDS: float = float(os.getenv("LOCATION_MAX_LAG_SECONDS", "10"))
+    
+    # Driver location history (ring buffers in memory, append-only segments on disk)
+    LOCATION_HISTORY_DIR: str = os.getenv("LOCATION_HISTORY_DIR", "./location_history")
+    LOCATION_HISTORY_CAPACITY: int = int(os.getenv("LOCATION_HISTORY_CAPACITY", "1024"))  # points per driver
+    LOCATION_HISTORY_MIN_INTERVAL_SECONDS: float = float(os.getenv("LOCATION_HISTORY_MIN_INTERVAL_SECONDS", "5"))
+    LOCATION_HISTORY_MIN_DISTANCE_M: float = float(os.getenv("LOCATION_HISTORY_MIN_DISTANCE_M", "10"))
+    LOCATION_HISTORY_SPILL_POINTS: int = int(os.getenv("LOCATION_HISTORY_SPILL_POINTS", "256"))
+    LOCATION_HISTORY_SPILL_MAX_AGE_SECONDS: float = float(os.getenv("LOCATION_HISTORY_SPILL_MAX_AGE_SECONDS", "60"))
+    LOCATION_HISTORY_SEGMENT_MAX_MB: float = float(os.getenv("LOCATION_HISTORY_SEGMENT_MAX_MB", "16"))
+    LOCATION_HISTORY_RETENTION_DAYS: float = float(os.getenv("LOCATION_HISTORY_RETENTION_DAYS", "30"))
+    
+    # Trip metering from GPS (actual_distance / actual_time / actual_cost)
+    TRIP_METER_MAX_SPEED_KMH: float = float(os.getenv("TRIP_METER_MAX_SPEED_KMH", "120"))  # faster jumps are outliers
+    TRIP_METER_JITTER_M: float = float(os.getenv("TRIP_METER_JITTER_M", "15"))
+    TRIP_METER_MOVING_SPEED_KMH: float = float(os.getenv("TRIP_METER_MOVING_SPEED_KMH", "3"))
+    
+    # Live tracking pushes over /ws (per customer, coalesced)
+    TRACKING_PUSH_INTERVAL_SECONDS: float = float(os.getenv("TRACKING_PUSH_INTERVAL_SECONDS", "1"))
+    
+    # WebSocket fan-out
+    WS_SEND_QUEUE_SIZE: int = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))  # frames per connection
+    WS_SEND_TIMEOUT_SECONDS: float = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "5"))
+    WS_SLOW_CONSUMER_SECONDS: float = float(os.getenv("WS_SLOW_CONSUMER_SECONDS", "10"))  # overflowing this long -> disconnect
+    # Cross-worker delivery: "inprocess" (single worker), "unix" (broker on WS_BACKPLANE_SOCKET) or "none"
+    WS_BACKPLANE: str = os.getenv("WS_BACKPLANE", "inprocess")
+    WS_BACKPLANE_SOCKET: str = os.getenv("WS_BACKPLANE_SOCKET", "/tmp/happyauto-backplane.sock")
+    # Per-user replay log for reconnecting sockets
+    WS_EVENT_LOG_SIZE: int = int(os.getenv("WS_EVENT_LOG_SIZE", "256"))  # events kept per user
+    WS_EVENT_LOG_IDLE_HOURS: float = float(os.getenv("WS_EVENT_LOG_IDLE_HOURS", "24"))
+    WS_IDLE_TIMEOUT_SECONDS: float = float(os.getenv("WS_IDLE_TIMEOUT_SECONDS", "60"))  # no frame from the client -> close, 0 = never
+    # Driver presence from heartbeats (location pings, WebSocket frames)
+    PRESENCE_TTL_SECONDS: float = float(os.getenv("PRESENCE_TTL_SECONDS", "30"))  # silent this long -> offline
+    PRESENCE_TICK_SECONDS: float = float(os.getenv("PRESENCE_TICK_SECONDS", "1"))
     
     @property
     def is_sqlite(self):
         return self.DATABASE_URL.startswith("sqlite")
 
+    @property
+    def async_database_url(self) -> str:
+        """DATABASE_URL through its asyncio driver (aiosqlite for SQLite)"""
+        scheme, sep, rest = self.DATABASE_URL.partition("://")
+        drivers = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+        return drivers.get(scheme, scheme) + sep + rest
+
 settings = Settings()
\ No newline at end of file
@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
@@ -8,7 +9,15 @@ import os
 engine = create_engine(
     settings.DATABASE_URL,
     pool_pre_ping=True,
-    echo=True  # Set to False in production
+    echo=settings.DATABASE_ECHO
+)
+
+# Same database for the async routes; the sync engine stays for background
+# workers (location flush, dispatch, presence) and routes that run in the threadpool
+async_engine = create_async_engine(
+    settings.async_database_url,
+    pool_pre_ping=True,
+    echo=settings.DATABASE_ECHO
 )
 
 print("🔥 USING DB:", os.path.abspath("happyauto.db"))
@@ -16,6 +25,8 @@ print("🔥 USING DB:", os.path.abspath("happyauto.db"))
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Rows stay readable after commit: an AsyncSession cannot lazy-load expired attributes
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 # Create base class for models
 Base = declarative_base()
@@ -28,7 +39,13 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """Dependency for getting an async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
 def create_tables():
-    """Create all tables"""
-    Base.metadata.create_all(bind=engine)
-    print("✅ Database tables created!")
\ No newline at end of file
+    """Create or upgrade the schema (versioned scripts in app/migrations)"""
+    from app.migrations import current_version, upgrade
+    upgrade(engine)
+    print(f"✅ Database tables created! (schema version {current_version(engine)})")
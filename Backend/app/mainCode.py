@@ -1,56 +1,88 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.api import api_router
 from app.api import admin
-from app.core.database import create_tables
+from app.api.websocket import manager
+from app.core.database import async_engine, create_tables, SessionLocal
+from app.services.driver_index import driver_index
+from app.services.dispatch_service import dispatch_engine
+from app.services.location_ingest import DeviceClock, location_ingestor
+from app.services.presence import presence
+from app.services.pickup_index import pending_pickups
+from app.services.tracking_hub import tracking_hub
+from app.services.user_events import user_events
+from app.services.auth_service import AuthService
+from app.services.ai_service import init_ai_service, close_ai_service
+from app.core.config import settings
+from app.utils import ws_binary
 from app.models import user, driver, customer, delivery  # ensure models are loaded
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Optional
 import json
+import math
 
 
 
-# WebSocket Connection Manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: dict = {}
-    
-    async def connect(self, websocket: WebSocket, user_id: str):
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
-        print(f"✅ User {user_id} connected. Active connections: {len(self.active_connections)}")
-    
-    def disconnect(self, user_id: str):
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
-            print(f"❌ User {user_id} disconnected. Active connections: {len(self.active_connections)}")
-    
-    async def send_personal_message(self, message: dict, user_id: str):
-        if user_id in self.active_connections:
-            try:
-                await self.active_connections[user_id].send_json(message)
-            except Exception as e:
-                print(f"Error sending message to {user_id}: {e}")
-    
-    async def broadcast(self, message: dict):
-        for user_id, connection in self.active_connections.items():
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                print(f"Error broadcasting to {user_id}: {e}")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build process-wide components once at startup and tear them down on exit"""
+    create_tables()
+
+    db = SessionLocal()
+    try:
+        driver_index.load(db)
+        tracking_hub.load(db)
+        presence.load(db)
+        pending_pickups.load(db)
+    finally:
+        db.close()
+
+    await manager.start()
+    manager.on_channel("tracking", tracking_hub.apply_remote)
+    manager.on_channel("presence", presence.apply_remote)
+    presence.bind(replicate=lambda payload: manager.publish("presence", payload))
+    manager.on_channel("pickups", pending_pickups.apply_remote)
+    pending_pickups.bind(replicate=lambda payload: manager.publish("pickups", payload))
+    # Queued driver positions for the same delivery collapse into the newest;
+    # positions only go to sockets that connected with the user's own token
+    tracking_hub.bind(
+        lambda user_id, message: manager.send_personal_message(
+            message, user_id, coalesce_key=(message["type"], message["delivery_id"]), private=True
+        ),
+        reachable=manager.is_reachable,
+        replicate=lambda payload: manager.publish("tracking", payload)
+    )
+    # Delivery status changes are logged per user so reconnects can replay them
+    user_events.bind(lambda user_id, message: manager.send_personal_message(message, user_id, private=True))
+
+    init_ai_service()
+
+    if settings.DISPATCH_ENABLED:
+        dispatch_engine.start(SessionLocal)
+
+    location_ingestor.start(SessionLocal)
+    presence.start(SessionLocal)
+
+    yield
 
-# Create manager instance
-manager = ConnectionManager()
+    await dispatch_engine.stop()
+    await presence.stop()
+    await location_ingestor.stop()
+    await close_ai_service()
+    await manager.stop()
+    await async_engine.dispose()
 
 app = FastAPI(
     title="HappyAuto API",
     description="AI-Powered Auto Delivery Platform",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-@app.on_event("startup")
-def on_startup():
-    create_tables()
-    print("✅ Database tables created!")
-
 # CORS setup (keep your existing code)
 origins = [
     "http://localhost:3000",
@@ -65,6 +97,15 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+
+
+@app.exception_handler(RequestValidationError)
+async def validation_exception_handler(request: Request, exc: RequestValidationError):
+    """FastAPI's 422, except that NaN/Infinity inputs (which JSON bodies may carry) are echoed as text"""
+    errors = jsonable_encoder(exc.errors(), custom_encoder={float: lambda v: v if math.isfinite(v) else str(v)})
+    return JSONResponse(status_code=422, content={"detail": errors})
+
+
 # Include API routes
 app.include_router(api_router)
 app.include_router(admin.router)
@@ -72,56 +113,132 @@ app.include_router(admin.router)
 
 # WebSocket endpoint
 @app.websocket("/ws/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: str):
-    await manager.connect(websocket, user_id)
+async def websocket_endpoint(
+    websocket: WebSocket,
+    user_id: str,
+    token: Optional[str] = None,
+    epoch: Optional[str] = None,
+    since: Optional[int] = None
+):
+    # Location updates are only trusted from a driver's own token (?token=)
+    claims = AuthService.get_token_claims(token) if token else None
+    is_driver = bool(claims) and claims.get("user_id") == user_id and claims.get("user_type") == "driver"
+    device_clock = DeviceClock()
+
+    # Live tracking is pushed only to sockets that proved who they are
+    authenticated = bool(claims) and claims.get("user_id") == user_id
+    connection = await manager.connect(websocket, user_id, authenticated=authenticated)
+    if is_driver:
+        presence.heartbeat(user_id)
+    if authenticated:
+        # Catch up on what was missed since the client's last seen (epoch, since);
+        # queued before any live event can reach the new connection
+        for message in user_events.resume(user_id, epoch, since):
+            connection.put(manager.encode(message, private=True))
+        for frame in tracking_hub.attach(user_id):
+            await manager.send_personal_message(frame, user_id, private=True)
     try:
         while True:
-            data = await websocket.receive_text()
-            
+            received = await websocket.receive()
+            if received["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(received.get("code", 1000))
+
+            # Any frame keeps the socket open and, from a driver, counts as a heartbeat
+            manager.touch(connection)
+            if is_driver:
+                presence.heartbeat(user_id)
+
+            # Binary frames come from clients on the happyauto.bin.v1 subprotocol
             try:
-                message_data = json.loads(data)
-                message_type = message_data.get("type", "unknown")
-                
-                # Handle different message types
-                if message_type == "ping":
-                    await manager.send_personal_message({
-                        "type": "pong",
-                        "message": "WebSocket is working!",
-                        "user_id": user_id
-                    }, user_id)
-                
-                elif message_type == "location_update":
-                    lat = message_data.get("lat")
-                    lng = message_data.get("lng")
-                    print(f"📍 User {user_id} location: {lat}, {lng}")
-                    
-                    # Echo back with acknowledgment
+                if received.get("bytes") is not None:
+                    message_data = ws_binary.decode(received["bytes"])
+                else:
+                    message_data = json.loads(received.get("text") or "")
+                    if not isinstance(message_data, dict):
+                        raise ValueError("message must be an object")
+            except ws_binary.ProtocolError as e:
+                await manager.send_personal_message({"type": "error", "message": f"Bad frame: {e}"}, user_id)
+                continue
+            except ValueError:
+                await manager.send_personal_message({
+                    "type": "error",
+                    "message": "Invalid JSON format"
+                }, user_id)
+                continue
+
+            message_type = message_data.get("type", "unknown")
+
+            # Handle different message types
+            if message_type == "ping":
+                await manager.send_personal_message({
+                    "type": "pong",
+                    "message": "WebSocket is working!",
+                    "user_id": user_id
+                }, user_id)
+
+            elif message_type in ("location_update", "location_batch"):
+                if not is_driver:
                     await manager.send_personal_message({
-                        "type": "location_ack",
-                        "lat": lat,
-                        "lng": lng,
-                        "timestamp": "2024-01-01T12:00:00"  # Use datetime in real app
+                        "type": "error",
+                        "message": "Location updates require a driver token"
                     }, user_id)
-                
+                    continue
+
+                if message_type == "location_update":
+                    samples = [(message_data.get("lat"), message_data.get("lng"), None)]
                 else:
-                    # Echo the message back
+                    samples = message_data.get("samples") or []
+
+                try:
+                    samples = [
+                        (float(lat), float(lng), float(ts) if ts is not None else None)
+                        for lat, lng, ts in samples
+                    ]
+                    # json.loads accepts NaN and Infinity
+                    if not all(math.isfinite(value) for sample in samples for value in sample if value is not None):
+                        raise ValueError("non-finite value")
+                except (TypeError, ValueError):
                     await manager.send_personal_message({
-                        "type": "echo",
-                        "original_message": message_data,
-                        "user_id": user_id
+                        "type": "error",
+                        "message": "lat and lng must be finite numbers"
                     }, user_id)
-                    
-            except json.JSONDecodeError:
+                    continue
+
+                # Batched samples are applied oldest first with their own fix
+                # times, moved onto the server clock so they order against
+                # plain pings even when the phone's clock is off
+                fixes = [ts for _, _, ts in samples if ts is not None]
+                if fixes:
+                    device_clock.observe(max(fixes))
+                    samples = [(lat, lng, device_clock.to_server(ts) if ts is not None else None) for lat, lng, ts in samples]
+                samples.sort(key=lambda sample: sample[2] or 0)
+                accepted = sum(location_ingestor.ingest(user_id, lat, lng, ts) for lat, lng, ts in samples)
+
+                # Echo back with acknowledgment
+                ack = {
+                    "type": "location_ack",
+                    "accepted": accepted,
+                    "timestamp": datetime.now(timezone.utc).isoformat()
+                }
+                if message_type == "location_update":
+                    ack.update(lat=samples[0][0], lng=samples[0][1])
+                await manager.send_personal_message(ack, user_id)
+
+            else:
+                # Echo the message back
                 await manager.send_personal_message({
-                    "type": "error",
-                    "message": "Invalid JSON format"
+                    "type": "echo",
+                    "original_message": message_data,
+                    "user_id": user_id
                 }, user_id)
-                
+
     except WebSocketDisconnect:
-        manager.disconnect(user_id)
+        manager.disconnect(user_id, websocket)
+        tracking_hub.detach(user_id)
     except Exception as e:
         print(f"WebSocket error for user {user_id}: {e}")
-        manager.disconnect(user_id)
+        manager.disconnect(user_id, websocket)
+        tracking_hub.detach(user_id)
 
 # Your existing routes
 @app.get("/")
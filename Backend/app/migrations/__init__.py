@@ -0,0 +1,2 @@
+# File: app/migrations/__init__.py
+from app.migrations.runner import applied, available, current_version, upgrade
@@ -0,0 +1,24 @@
+# File: app/migrations/__main__.py
+"""
+Apply pending schema migrations, or list them.
+
+    python -m app.migrations            # upgrade to the latest version
+    python -m app.migrations status
+"""
+import sys
+
+from app.migrations import applied, available, upgrade
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "status":
+        done = set(applied())
+        for version, name, module in available():
+            print(f"{'✅' if version in done else '⏳'} {name}: {(module.__doc__ or '').strip().splitlines()[0]}")
+        return
+    ran = upgrade()
+    print(f"✅ Up to date ({len(ran)} migration(s) applied)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# File: app/migrations/runner.py
+import importlib
+import pkgutil
+from datetime import datetime, timezone
+from typing import List, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+
+from app.core.database import Base, engine as default_engine
+import app.models  # every table on Base.metadata
+from app.migrations import versions
+
+# -------------------------
+# VERSIONED SCHEMA MIGRATIONS
+# -------------------------
+# Scripts live in app/migrations/versions as NNNN_name.py with an
+# upgrade(conn) function; they run once each, in order, and are recorded
+# in schema_migrations. A new database is built straight from the models
+# and stamped with the latest version, so the models and the scripts must
+# describe the same schema (test_migrations.py checks that).
+
+VERSION_TABLE = "schema_migrations"
+
+
+def available() -> List[Tuple[int, str, object]]:
+    """(version, name, module) for every script, oldest first"""
+    found = []
+    for info in pkgutil.iter_modules(versions.__path__):
+        number, _, _ = info.name.partition("_")
+        if not number.isdigit():
+            continue
+        module = importlib.import_module(f"{versions.__name__}.{info.name}")
+        found.append((int(number), info.name, module))
+    found.sort(key=lambda item: item[0])
+    numbers = [number for number, _, _ in found]
+    if len(set(numbers)) != len(numbers):
+        raise RuntimeError(f"Duplicate migration versions: {numbers}")
+    return found
+
+
+def _ensure_version_table(conn):
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} ("
+        "version INTEGER PRIMARY KEY, name VARCHAR(200) NOT NULL, applied_at VARCHAR(40) NOT NULL)"
+    ))
+
+
+def applied(engine=None) -> List[int]:
+    engine = engine or default_engine
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+        return [row[0] for row in conn.execute(text(f"SELECT version FROM {VERSION_TABLE} ORDER BY version"))]
+
+
+def current_version(engine=None) -> int:
+    done = applied(engine)
+    return done[-1] if done else 0
+
+
+def _record(conn, version: int, name: str):
+    conn.execute(
+        text(f"INSERT INTO {VERSION_TABLE} (version, name, applied_at) VALUES (:version, :name, :applied_at)"),
+        {"version": version, "name": name, "applied_at": datetime.now(timezone.utc).isoformat()}
+    )
+
+
+def upgrade(engine=None) -> List[str]:
+    """Bring the database to the latest version; returns the scripts applied"""
+    engine = engine or default_engine
+    scripts = available()
+    done = set(applied(engine))
+
+    app_tables = {table.name for table in Base.metadata.sorted_tables}
+    if not done and not app_tables & set(inspect(engine).get_table_names()):
+        # Empty database: the models already are the latest schema
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            for version, name, _ in scripts:
+                _record(conn, version, name)
+        print(f"✅ Database created at schema version {scripts[-1][0] if scripts else 0}")
+        return []
+
+    ran = []
+    for version, name, module in scripts:
+        if version in done:
+            continue
+        try:
+            with engine.begin() as conn:
+                module.upgrade(conn)
+                _record(conn, version, name)
+        except IntegrityError:
+            # Another worker applied it first; its transaction won
+            continue
+        ran.append(name)
+        print(f"✅ Applied migration {name}")
+    return ran
@@ -0,0 +1,149 @@
+# File: app/migrations/versions/0001_baseline.py
+"""Tables and nullable columns the models had before schema versioning"""
+from sqlalchemy import inspect, text
+
+# Frozen as the pre-versioning SQLite databases had it - never edit this to
+# follow the models; schema changes go in a new script
+TABLES = [
+    """CREATE TABLE IF NOT EXISTS users (
+        id VARCHAR(36) NOT NULL,
+        name VARCHAR(100) NOT NULL,
+        email VARCHAR(100) NOT NULL,
+        phone VARCHAR(15) NOT NULL,
+        password_hash VARCHAR(255) NOT NULL,
+        user_type VARCHAR(20) NOT NULL,
+        is_active BOOLEAN,
+        is_verified BOOLEAN,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+        updated_at DATETIME,
+        address VARCHAR,
+        city VARCHAR,
+        state VARCHAR,
+        zip_code VARCHAR,
+        PRIMARY KEY (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS drivers (
+        id VARCHAR(36) NOT NULL,
+        license_number VARCHAR(50),
+        vehicle_number VARCHAR(20),
+        vehicle_type VARCHAR(50),
+        vehicle_model VARCHAR(100),
+        vehicle_color VARCHAR(50),
+        license_image TEXT,
+        rc_image TEXT,
+        insurance_image TEXT,
+        bank_account_number VARCHAR(50),
+        bank_ifsc_code VARCHAR(20),
+        bank_account_holder VARCHAR(100),
+        overall_rating FLOAT,
+        total_ratings INTEGER,
+        total_deliveries INTEGER,
+        total_earnings FLOAT,
+        acceptance_rate FLOAT,
+        is_available BOOLEAN,
+        current_location_lat FLOAT,
+        current_location_lng FLOAT,
+        current_status VARCHAR(20),
+        PRIMARY KEY (id),
+        FOREIGN KEY(id) REFERENCES users (id),
+        UNIQUE (license_number),
+        UNIQUE (vehicle_number)
+    )""",
+    """CREATE TABLE IF NOT EXISTS customers (
+        id VARCHAR(36) NOT NULL,
+        total_bookings INTEGER,
+        total_spent FLOAT,
+        member_since VARCHAR(20),
+        preferred_payment VARCHAR(50),
+        notification_preferences VARCHAR,
+        PRIMARY KEY (id),
+        FOREIGN KEY(id) REFERENCES users (id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS deliveries (
+        id VARCHAR(36) NOT NULL,
+        customer_id VARCHAR(36) NOT NULL,
+        driver_id VARCHAR(36),
+        pickup_address VARCHAR(500) NOT NULL,
+        pickup_lat FLOAT NOT NULL,
+        pickup_lng FLOAT NOT NULL,
+        dropoff_address VARCHAR(500) NOT NULL,
+        dropoff_lat FLOAT NOT NULL,
+        dropoff_lng FLOAT NOT NULL,
+        vehicle_make VARCHAR(100),
+        vehicle_model VARCHAR(100),
+        vehicle_year INTEGER,
+        vehicle_vin VARCHAR,
+        status VARCHAR(20),
+        estimated_distance FLOAT,
+        estimated_time FLOAT,
+        estimated_cost FLOAT,
+        actual_distance FLOAT,
+        actual_time FLOAT,
+        actual_cost FLOAT,
+        suggested_driver_id VARCHAR(36),
+        optimal_route VARCHAR,
+        route_geometry BLOB,
+        predicted_traffic VARCHAR(50),
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        scheduled_pickup DATETIME,
+        actual_pickup DATETIME,
+        actual_delivery DATETIME,
+        new_payment_status VARCHAR(20),
+        PRIMARY KEY (id),
+        FOREIGN KEY(customer_id) REFERENCES users (id),
+        FOREIGN KEY(driver_id) REFERENCES drivers (id),
+        UNIQUE (vehicle_vin),
+        FOREIGN KEY(suggested_driver_id) REFERENCES drivers (id)
+    )""",
+]
+
+INDEXES = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email ON users (email)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_phone ON users (phone)",
+]
+
+# Nullable columns a table created before they existed may lack. The old
+# patch-up added them bare (SQLite cannot ADD COLUMN ... UNIQUE)
+COLUMNS = {
+    "users": [
+        ("is_active", "BOOLEAN"), ("is_verified", "BOOLEAN"), ("updated_at", "DATETIME"),
+        ("address", "VARCHAR"), ("city", "VARCHAR"), ("state", "VARCHAR"), ("zip_code", "VARCHAR"),
+    ],
+    "drivers": [
+        ("license_number", "VARCHAR(50)"), ("vehicle_number", "VARCHAR(20)"), ("vehicle_type", "VARCHAR(50)"),
+        ("vehicle_model", "VARCHAR(100)"), ("vehicle_color", "VARCHAR(50)"), ("license_image", "TEXT"),
+        ("rc_image", "TEXT"), ("insurance_image", "TEXT"), ("bank_account_number", "VARCHAR(50)"),
+        ("bank_ifsc_code", "VARCHAR(20)"), ("bank_account_holder", "VARCHAR(100)"), ("overall_rating", "FLOAT"),
+        ("total_ratings", "INTEGER"), ("total_deliveries", "INTEGER"), ("total_earnings", "FLOAT"),
+        ("acceptance_rate", "FLOAT"), ("is_available", "BOOLEAN"), ("current_location_lat", "FLOAT"),
+        ("current_location_lng", "FLOAT"), ("current_status", "VARCHAR(20)"),
+    ],
+    "customers": [
+        ("total_bookings", "INTEGER"), ("total_spent", "FLOAT"), ("member_since", "VARCHAR(20)"),
+        ("preferred_payment", "VARCHAR(50)"), ("notification_preferences", "VARCHAR"),
+    ],
+    "deliveries": [
+        ("driver_id", "VARCHAR(36)"), ("vehicle_make", "VARCHAR(100)"), ("vehicle_model", "VARCHAR(100)"),
+        ("vehicle_year", "INTEGER"), ("vehicle_vin", "VARCHAR"), ("status", "VARCHAR(20)"),
+        ("estimated_distance", "FLOAT"), ("estimated_time", "FLOAT"), ("estimated_cost", "FLOAT"),
+        ("actual_distance", "FLOAT"), ("actual_time", "FLOAT"), ("actual_cost", "FLOAT"),
+        ("suggested_driver_id", "VARCHAR(36)"), ("optimal_route", "VARCHAR"), ("route_geometry", "BLOB"),
+        ("predicted_traffic", "VARCHAR(50)"), ("created_at", "DATETIME"), ("scheduled_pickup", "DATETIME"),
+        ("actual_pickup", "DATETIME"), ("actual_delivery", "DATETIME"), ("new_payment_status", "VARCHAR(20)"),
+    ],
+}
+
+
+def upgrade(conn):
+    # Databases from before versioning were kept current by create_all()
+    # plus adding new nullable columns; finish that job once
+    for statement in TABLES + INDEXES:
+        conn.execute(text(statement))
+    inspector = inspect(conn)
+    for table, columns in COLUMNS.items():
+        existing = {column["name"] for column in inspector.get_columns(table)}
+        for name, column_type in columns:
+            if name in existing:
+                continue
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}"))
+            print(f"✅ Added column {table}.{name}")
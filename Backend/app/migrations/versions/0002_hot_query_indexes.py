@@ -0,0 +1,28 @@
+# File: app/migrations/versions/0002_hot_query_indexes.py
+"""Composite and partial indexes for the list pages, dispatch and startup loads"""
+from sqlalchemy import text
+
+# Same definitions as the Index() entries on the models
+INDEXES = [
+    # Keyset pages, newest first
+    "CREATE INDEX IF NOT EXISTS ix_deliveries_customer_created ON deliveries (customer_id, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_deliveries_driver_created ON deliveries (driver_id, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_users_created ON users (created_at, id)",
+    # A customer's / driver's deliveries in one status; the driver's completed page orders on actual_delivery
+    "CREATE INDEX IF NOT EXISTS ix_deliveries_customer_status ON deliveries (customer_id, status, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_deliveries_driver_status ON deliveries (driver_id, status, actual_delivery, id)",
+    # Busy drivers (dispatch) and tracked deliveries (tracking hub load)
+    "CREATE INDEX IF NOT EXISTS ix_deliveries_status_driver ON deliveries (status, driver_id)",
+    # Pending pickups without a driver (dispatch batches, pickup index load)
+    "CREATE INDEX IF NOT EXISTS ix_deliveries_unassigned ON deliveries (status, created_at) WHERE driver_id IS NULL",
+    # Available drivers with a known position (driver index load)
+    "CREATE INDEX IF NOT EXISTS ix_drivers_available_located ON drivers (is_available) "
+    "WHERE current_location_lat IS NOT NULL AND current_location_lng IS NOT NULL",
+]
+
+
+def upgrade(conn):
+    for statement in INDEXES:
+        conn.execute(text(statement))
+    # Superseded by ix_deliveries_driver_status
+    conn.execute(text("DROP INDEX IF EXISTS ix_deliveries_driver_delivered"))
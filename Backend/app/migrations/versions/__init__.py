@@ -0,0 +1,2 @@
+# File: app/migrations/versions/__init__.py
+# One module per schema version: NNNN_name.py defining upgrade(conn)
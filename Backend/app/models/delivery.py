@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Float, Integer, DateTime, ForeignKey
+from sqlalchemy import Column, String, Float, Integer, DateTime, ForeignKey, Index, LargeBinary, text
 from datetime import datetime, timezone
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -17,6 +17,20 @@ class DeliveryStatus(str, enum.Enum):
 
 class Delivery(Base):
     __tablename__ = "deliveries"
+    # Added to existing databases by app/migrations/versions/0002_hot_query_indexes.py
+    __table_args__ = (
+        # Keyset pages of the list endpoints, newest first
+        Index("ix_deliveries_customer_created", "customer_id", "created_at", "id"),
+        Index("ix_deliveries_driver_created", "driver_id", "created_at", "id"),
+        Index("ix_deliveries_customer_status", "customer_id", "status", "created_at", "id"),
+        Index("ix_deliveries_driver_status", "driver_id", "status", "actual_delivery", "id"),
+        Index("ix_deliveries_status_driver", "status", "driver_id"),
+        # Waiting for a driver: dispatch batches and the pickup index load
+        Index(
+            "ix_deliveries_unassigned", "status", "created_at",
+            sqlite_where=text("driver_id IS NULL"), postgresql_where=text("driver_id IS NULL")
+        ),
+    )
 
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
 
@@ -49,7 +63,10 @@ class Delivery(Base):
 
     suggested_driver_id = Column(String(36), ForeignKey("drivers.id"), nullable=True)
 
+    # Legacy JSON-quoted polyline string; new bookings store route_geometry
     optimal_route = Column(String)
+    # Packed route points (app.utils.polyline.pack_geometry)
+    route_geometry = Column(LargeBinary, nullable=True)
     predicted_traffic = Column(String(50))
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
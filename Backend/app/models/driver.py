@@ -1,9 +1,17 @@
-from sqlalchemy import Column, String, Float, Integer, Boolean, ForeignKey, Text
+from sqlalchemy import Column, String, Float, Integer, Boolean, ForeignKey, Index, Text, text
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 
 class Driver(Base):
     __tablename__ = "drivers"
+    __table_args__ = (
+        # Available drivers with a known position (driver index load)
+        Index(
+            "ix_drivers_available_located", "is_available",
+            sqlite_where=text("current_location_lat IS NOT NULL AND current_location_lng IS NOT NULL"),
+            postgresql_where=text("current_location_lat IS NOT NULL AND current_location_lng IS NOT NULL")
+        ),
+    )
     
     id = Column(String(36), ForeignKey('users.id'), primary_key=True)
     license_number = Column(String(50), unique=True, nullable=True)
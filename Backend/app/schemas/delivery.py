@@ -1,6 +1,6 @@
 # File: app/schemas/delivery.py
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from enum import Enum
 
@@ -30,6 +30,10 @@ class AssignedDriver(BaseModel):
     vehicle_number: Optional[str] = None
     phone: str | None = None
 
+class CustomerInfo(BaseModel):
+    name: str
+    phone: str | None = None
+
 class DeliveryResponse(BaseModel):
     id: str
     customer_id: str
@@ -45,6 +49,9 @@ class DeliveryResponse(BaseModel):
     scheduled_pickup: Optional[datetime] 
     estimated_time: Optional[float]
     estimated_cost: Optional[float]
+    actual_distance: Optional[float] = None
+    actual_time: Optional[float] = None
+    actual_cost: Optional[float] = None
     created_at: datetime
     assigned_driver: AssignedDriver | None = None
     customer: CustomerInfo | None
@@ -54,6 +61,13 @@ class DeliveryResponse(BaseModel):
 class Config:
     from_attributes = True
 
-class CustomerInfo(BaseModel):
-    name: str
-    phone: str | None = None
+class DeliveryPage(BaseModel):
+    items: List[DeliveryResponse]
+    next_cursor: Optional[str] = None  # pass back as ?cursor= for the next page
+
+class UnassignedDelivery(DeliveryResponse):
+    distance_km: float  # from the driver to the pickup
+
+class UnassignedDeliveryPage(BaseModel):
+    items: List[UnassignedDelivery]
+    next_cursor: Optional[str] = None
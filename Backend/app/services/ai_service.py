@@ -1,21 +1,79 @@
 # File: app/services/ai_service.py
+import asyncio
 import json
 import math
+import threading
+import time
 from typing import Dict, List, Tuple, Optional
+import numpy as np
 from app.core.config import settings
+from app.utils.geo import haversine_matrix, haversine_pairs, rank_by_distance
+from app.utils.polyline import encode as encode_polyline
+from app.utils.single_flight import SingleFlight
+from app.services.road_graph import load_road_graph
+from app.services.route_cache import route_cache
+from app.services.routing import CircuitBreaker, GoogleDirectionsProvider, LatencyHistogram, call_with_deadline, parse_directions
 from datetime import datetime
 
+# Distance Matrix API limits per request
+GOOGLE_MATRIX_MAX_ORIGINS = 25
+GOOGLE_MATRIX_MAX_DESTINATIONS = 25
+GOOGLE_MATRIX_MAX_ELEMENTS = 100
+
+# Straight-line estimates assume 30 km/h average speed in city traffic
+FALLBACK_SPEED_KMH = 30
+
+def build_http_session():
+    """Keep-alive HTTP session with a connection pool sized for concurrent bookings"""
+    import requests
+    from requests.adapters import HTTPAdapter
+    
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=settings.HTTP_POOL_CONNECTIONS,
+        pool_maxsize=settings.HTTP_POOL_MAXSIZE
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
 class AIService:
-    def __init__(self):
+    def __init__(self, http_session=None):
         self.use_real_api = False
         self.gmaps = None
         self.api_error = None
+        self.http_session = None
+        self.google_async = None
+        self.google_breaker = CircuitBreaker(
+            failure_threshold=settings.ROUTING_BREAKER_FAILURES,
+            reset_timeout_seconds=settings.ROUTING_BREAKER_RESET_SECONDS,
+            slow_call_seconds=settings.ROUTING_SLOW_CALL_MS / 1000
+        )
+        # Successful-call latency per routing provider; Google's feeds the hedge delay
+        self.latency = {
+            name: LatencyHistogram()
+            for name in ("google_maps", "road_graph", "fallback_calculation")
+        }
+        self.hedge_metrics = {"hedged": 0, "primary_wins": 0, "secondary_wins": 0, "late_primary_results": 0}
+        self._late_primaries = set()
+        # Concurrent identical route / quote lookups share one computation
+        self.route_flights = SingleFlight()
+        self.quote_flights = SingleFlight()
         
         # Try to use real Google Maps if API key is available
         if settings.GOOGLE_MAPS_API_KEY and settings.GOOGLE_MAPS_API_KEY.strip():
             try:
                 import googlemaps
-                self.gmaps = googlemaps.Client(key=settings.GOOGLE_MAPS_API_KEY)
+                self.http_session = http_session or build_http_session()
+                self.gmaps = googlemaps.Client(
+                    key=settings.GOOGLE_MAPS_API_KEY,
+                    requests_session=self.http_session,
+                    base_url=settings.GOOGLE_MAPS_BASE_URL
+                )
+                self.google_async = GoogleDirectionsProvider(
+                    settings.GOOGLE_MAPS_API_KEY,
+                    base_url=settings.GOOGLE_MAPS_BASE_URL
+                )
                 self.use_real_api = True
                 print("✅ Google Maps API initialized successfully")
             except ImportError:
@@ -27,23 +85,208 @@ class AIService:
         else:
             self.api_error = "No Google Maps API key configured"
             print(f"⚠️  {self.api_error}")
+        
+        # Offline road network, shared by every instance in the process
+        self.road_graph = load_road_graph(settings.ROAD_GRAPH_PATH)
+    
+    async def aclose(self):
+        """Release pooled HTTP connections"""
+        for task in list(self._late_primaries):
+            task.cancel()
+        if self.http_session is not None:
+            self.http_session.close()
+            self.http_session = None
+        if self.google_async is not None:
+            await self.google_async.aclose()
+            self.google_async = None
     
     def calculate_route(
         self, 
         origin: Tuple[float, float], 
         destination: Tuple[float, float]
     ) -> Dict:
-        """Calculate optimal route - uses Google Maps API if available, otherwise fallback"""
+        """Calculate optimal route - Google Maps, then the offline road graph, then straight line"""
         
-        if self.use_real_api and self.gmaps:
+        cached = self._cached_route(origin, destination)
+        if cached:
+            return cached
+        
+        if self.use_real_api and self.gmaps and self.google_breaker.allow():
+            started = time.monotonic()
             try:
-                return self._calculate_route_google(origin, destination)
+                route = self._calculate_route_google(origin, destination)
+                elapsed = time.monotonic() - started
+                self.google_breaker.record_success(elapsed)
+                self.latency["google_maps"].record(elapsed)
+                self._remember_route(origin, destination, route)
+                return route
             except Exception as e:
+                self.google_breaker.record_failure()
                 print(f"⚠️  Google Maps API error during calculation: {e}")
-                # Fall back to calculation
-                return self._calculate_route_fallback(origin, destination)
+        
+        route = self._calculate_route_local(origin, destination)
+        self._remember_local_route(origin, destination, route)
+        return route
+    
+    async def calculate_route_async(
+        self, 
+        origin: Tuple[float, float], 
+        destination: Tuple[float, float]
+    ) -> Dict:
+        """Non-blocking calculate_route for async routes
+        
+        Google is called over the async client under ROUTING_DEADLINE_MS and
+        behind the circuit breaker; anything else runs in a worker thread so
+        the event loop never waits on routing. With hedging on, a Google call
+        slower than its usual percentile races the local providers. The
+        result records the winning provider and whether the call was hedged.
+        
+        Concurrent calls for exactly the same pair are coalesced into one
+        computation (not the cache grid cell: a nearby pair must get its
+        own polyline and endpoints).
+        """
+        route = await self.route_flights.do(
+            ("route", tuple(origin), tuple(destination)),
+            lambda: self._route_async(origin, destination)
+        )
+        return dict(route)
+    
+    async def _route_async(
+        self, 
+        origin: Tuple[float, float], 
+        destination: Tuple[float, float]
+    ) -> Dict:
+        cached = self._cached_route(origin, destination)
+        if cached:
+            return self._annotate_route(cached, "route_cache")
+        
+        if self.use_real_api and self.google_async:
+            primary = asyncio.create_task(call_with_deadline(
+                self.google_async,
+                self.google_breaker,
+                origin,
+                destination,
+                settings.ROUTING_DEADLINE_MS / 1000,
+                histogram=self.latency["google_maps"]
+            ))
+            if settings.ROUTING_HEDGE_ENABLED:
+                done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay())
+                if not done:
+                    return await self._hedge(primary, origin, destination)
+            route = await primary
+            if route:
+                self._remember_route(origin, destination, route)
+                return self._annotate_route(route, "google_maps")
+        
+        route = await asyncio.to_thread(self._calculate_route_local, origin, destination)
+        self._remember_local_route(origin, destination, route)
+        return self._annotate_route(route, route["source"])
+    
+    def hedge_delay(self) -> float:
+        """Seconds to wait on Google before hedging: its latency percentile, clamped"""
+        histogram = self.latency["google_maps"]
+        if histogram.count < settings.ROUTING_HEDGE_MIN_SAMPLES:
+            delay_ms = settings.ROUTING_HEDGE_DEFAULT_MS
         else:
-            return self._calculate_route_fallback(origin, destination)
+            delay_ms = histogram.percentile(settings.ROUTING_HEDGE_PERCENTILE) * 1000
+        return max(settings.ROUTING_HEDGE_MIN_MS, min(delay_ms, settings.ROUTING_DEADLINE_MS)) / 1000
+    
+    async def _hedge(
+        self, 
+        primary: asyncio.Task, 
+        origin: Tuple[float, float], 
+        destination: Tuple[float, float]
+    ) -> Dict:
+        """Race a slow Google call against the local providers; first good answer wins"""
+        self.hedge_metrics["hedged"] += 1
+        secondary = asyncio.create_task(asyncio.to_thread(self._calculate_route_local, origin, destination))
+        done, _ = await asyncio.wait({primary, secondary}, return_when=asyncio.FIRST_COMPLETED)
+        
+        if primary in done and primary.result():
+            # The losing secondary keeps running in its thread; it caches nothing
+            route = primary.result()
+            self.hedge_metrics["primary_wins"] += 1
+            self._remember_route(origin, destination, route)
+            return self._annotate_route(route, "google_maps", hedged=True)
+        
+        route = await secondary
+        self.hedge_metrics["secondary_wins"] += 1
+        self._remember_local_route(origin, destination, route)
+        if not primary.done():
+            # Let Google finish in the background: its latency still belongs in
+            # the histogram, the breaker needs the outcome and a late answer
+            # upgrades the cache entry for the next booking on this pair
+            self._late_primaries.add(primary)
+            primary.add_done_callback(lambda task: self._late_primary_done(task, origin, destination))
+        return self._annotate_route(route, route["source"], hedged=True)
+    
+    def _late_primary_done(self, task: asyncio.Task, origin: Tuple[float, float], destination: Tuple[float, float]):
+        self._late_primaries.discard(task)
+        if task.cancelled() or task.exception() is not None:
+            return
+        route = task.result()
+        if route:
+            self.hedge_metrics["late_primary_results"] += 1
+            self._remember_route(origin, destination, route)
+    
+    @staticmethod
+    def _annotate_route(route: Dict, provider: str, hedged: bool = False) -> Dict:
+        return {**route, "provider": provider, "hedged": hedged}
+    
+    def _calculate_route_local(
+        self, 
+        origin: Tuple[float, float], 
+        destination: Tuple[float, float]
+    ) -> Dict:
+        """Offline providers: road graph if loaded, otherwise straight line (callers cache)"""
+        if self.road_graph:
+            started = time.monotonic()
+            try:
+                route = self._calculate_route_road_graph(origin, destination)
+                if route:
+                    self.latency["road_graph"].record(time.monotonic() - started)
+                    return route
+            except Exception as e:
+                print(f"⚠️  Road graph routing error: {e}")
+        
+        started = time.monotonic()
+        route = self._calculate_route_fallback(origin, destination)
+        self.latency["fallback_calculation"].record(time.monotonic() - started)
+        return route
+    
+    def routing_metrics(self) -> Dict:
+        return {
+            "google_enabled": self.use_real_api,
+            "road_graph_loaded": self.road_graph is not None,
+            "deadline_ms": settings.ROUTING_DEADLINE_MS,
+            "breaker": self.google_breaker.snapshot(),
+            "hedging": {
+                "enabled": settings.ROUTING_HEDGE_ENABLED,
+                "percentile": settings.ROUTING_HEDGE_PERCENTILE,
+                "current_delay_ms": round(self.hedge_delay() * 1000, 2),
+                "in_flight_late_primaries": len(self._late_primaries),
+                **self.hedge_metrics
+            },
+            "latency": {name: histogram.snapshot() for name, histogram in self.latency.items()},
+            "single_flight": {
+                "route": self.route_flights.snapshot(),
+                "quote": self.quote_flights.snapshot()
+            }
+        }
+    
+    def _cached_route(self, origin: Tuple[float, float], destination: Tuple[float, float]) -> Optional[Dict]:
+        if settings.ROUTE_CACHE_ENABLED:
+            return route_cache.get(origin, destination)
+        return None
+    
+    def _remember_route(self, origin: Tuple[float, float], destination: Tuple[float, float], route: Dict):
+        if settings.ROUTE_CACHE_ENABLED:
+            route_cache.put(origin, destination, route)
+    
+    def _remember_local_route(self, origin: Tuple[float, float], destination: Tuple[float, float], route: Dict):
+        # Straight-line estimates are cheap and should not outlive a provider outage
+        if route["source"] == "road_graph":
+            self._remember_route(origin, destination, route)
     
     def _calculate_route_google(
         self, 
@@ -59,55 +302,53 @@ class AIService:
                 alternatives=True
             )
             
-            if not directions:
-                raise ValueError("No directions returned from Google Maps")
-            
             # Choose best route (shortest distance)
-            best_route = min(directions, key=lambda x: x['legs'][0]['distance']['value'])
-            
-            return {
-                "distance_km": best_route['legs'][0]['distance']['value'] / 1000,
-                "duration_min": best_route['legs'][0]['duration']['value'] / 60,
-                "polyline": best_route['overview_polyline']['points'],
-                "steps": [
-                    {
-                        "instruction": step['html_instructions'],
-                        "distance": step['distance']['text'],
-                        "duration": step['duration']['text']
-                    }
-                    for step in best_route['legs'][0]['steps']
-                ],
-                "source": "google_maps"
-            }
+            return parse_directions(directions)
         except Exception as e:
             print(f"⚠️  Google Maps API error: {e}")
             # Re-raise to be caught by calculate_route
             raise
     
+    def _calculate_route_road_graph(
+        self, 
+        origin: Tuple[float, float], 
+        destination: Tuple[float, float]
+    ) -> Optional[Dict]:
+        """Calculate route on the local road graph; None if the points are not connected"""
+        path = self.road_graph.shortest_path(origin, destination)
+        if not path:
+            return None
+        
+        distance_km = path['distance_km']
+        duration_min = path['duration_min']
+        
+        return {
+            "distance_km": round(distance_km, 2),
+            "duration_min": round(duration_min, 2),
+            "polyline": encode_polyline(path['coordinates']),
+            "steps": [
+                {
+                    "instruction": f"Follow the road network from {origin} to {destination}",
+                    "distance": f"{round(distance_km, 2)} km",
+                    "duration": f"{round(duration_min, 1)} mins"
+                }
+            ],
+            "source": "road_graph"
+        }
+    
     def _calculate_route_fallback(
         self, 
         origin: Tuple[float, float], 
         destination: Tuple[float, float]
     ) -> Dict:
         """Fallback route calculation using Haversine formula"""
-        lat1, lon1 = origin
-        lat2, lon2 = destination
-        
-        # Haversine formula for distance
-        R = 6371  # Earth's radius in km
-        
-        dlat = math.radians(lat2 - lat1)
-        dlon = math.radians(lon2 - lon1)
-        
-        a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-        distance_km = R * c
+        distance_km = float(haversine_pairs(origin[0], origin[1], destination[0], destination[1]))
         
         # Estimate time (assume 30 km/h average speed in city traffic)
-        duration_min = (distance_km / 30) * 60
+        duration_min = (distance_km / FALLBACK_SPEED_KMH) * 60
         
-        # Generate a simple polyline (for demo purposes)
-        polyline = self._generate_simple_polyline(origin, destination)
+        # Straight segment as a proper encoded polyline
+        polyline = encode_polyline([origin, destination])
         
         return {
             "distance_km": round(distance_km, 2),
@@ -128,48 +369,132 @@ class AIService:
             "source": "fallback_calculation"
         }
     
-    def _generate_simple_polyline(self, origin: Tuple[float, float], destination: Tuple[float, float]) -> str:
-        """Generate a simple encoded polyline for demonstration"""
-        # This is a very simplified version - real polyline encoding is complex
-        lat1, lon1 = origin
-        lat2, lon2 = destination
+    def distance_matrix(
+        self,
+        origins: List[Tuple[float, float]],
+        destinations: List[Tuple[float, float]]
+    ) -> Dict:
+        """Distances/durations between every origin and destination in one batched call
+        
+        Same provider order as calculate_route. Pairs a provider cannot
+        route are filled in from the straight-line estimate and counted
+        in "fallback_cells".
+        """
+        origins = [tuple(point) for point in origins]
+        destinations = [tuple(point) for point in destinations]
+        distance_km = duration_min = None
+        source = "fallback_calculation"
+        
+        if origins and destinations:
+            if self.use_real_api and self.gmaps:
+                try:
+                    distance_km, duration_min = self._distance_matrix_google(origins, destinations)
+                    source = "google_maps"
+                except Exception as e:
+                    print(f"⚠️  Google Maps distance matrix error: {e}")
+            
+            if distance_km is None and self.road_graph:
+                try:
+                    distance_km, duration_min = self.road_graph.distance_matrix(origins, destinations)
+                    source = "road_graph"
+                except Exception as e:
+                    print(f"⚠️  Road graph distance matrix error: {e}")
+        
+        straight_km, straight_min = self._distance_matrix_fallback(origins, destinations)
+        if distance_km is None:
+            distance_km, duration_min = straight_km, straight_min
+            fallback_cells = 0
+        else:
+            missing = np.isnan(distance_km) | np.isnan(duration_min)
+            distance_km = np.where(missing, straight_km, distance_km)
+            duration_min = np.where(missing, straight_min, duration_min)
+            fallback_cells = int(missing.sum())
+        
+        return {
+            "origins": [list(point) for point in origins],
+            "destinations": [list(point) for point in destinations],
+            "distance_km": np.round(distance_km, 3).tolist(),
+            "duration_min": np.round(duration_min, 2).tolist(),
+            "source": source,
+            "fallback_cells": fallback_cells
+        }
+    
+    def _distance_matrix_google(
+        self,
+        origins: List[Tuple[float, float]],
+        destinations: List[Tuple[float, float]]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Distance Matrix API, chunked to its per-request origin/destination/element limits"""
+        distance_km = np.full((len(origins), len(destinations)), np.nan)
+        duration_min = np.full((len(origins), len(destinations)), np.nan)
+        
+        dest_chunk = min(GOOGLE_MATRIX_MAX_DESTINATIONS, len(destinations))
+        origin_chunk = max(1, min(GOOGLE_MATRIX_MAX_ORIGINS, GOOGLE_MATRIX_MAX_ELEMENTS // dest_chunk))
+        
+        for i0 in range(0, len(origins), origin_chunk):
+            for j0 in range(0, len(destinations), dest_chunk):
+                response = self.gmaps.distance_matrix(
+                    origins=origins[i0:i0 + origin_chunk],
+                    destinations=destinations[j0:j0 + dest_chunk],
+                    mode="driving"
+                )
+                for di, row in enumerate(response.get('rows', [])):
+                    for dj, element in enumerate(row.get('elements', [])):
+                        if element.get('status') == 'OK':
+                            distance_km[i0 + di, j0 + dj] = element['distance']['value'] / 1000
+                            duration_min[i0 + di, j0 + dj] = element['duration']['value'] / 60
         
-        # For demo, just return coordinates as string
-        return f"{lat1},{lon1};{lat2},{lon2}"
+        return distance_km, duration_min
+    
+    def _distance_matrix_fallback(
+        self,
+        origins: List[Tuple[float, float]],
+        destinations: List[Tuple[float, float]]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Straight-line matrix from the haversine kernel"""
+        if not origins or not destinations:
+            empty = np.zeros((len(origins), len(destinations)))
+            return empty, empty
+        distance_km = haversine_matrix(origins, destinations)
+        return distance_km, distance_km / FALLBACK_SPEED_KMH * 60
     
     def find_nearest_drivers(
         self, 
         pickup_location: Tuple[float, float], 
-        drivers: List[Dict],
-        max_distance_km: float = 10.0
+        drivers: Optional[List[Dict]] = None,
+        max_distance_km: float = 10.0,
+        limit: Optional[int] = None
     ) -> List[Dict]:
-        """Find nearest available drivers within max_distance_km"""
+        """Find nearest available drivers within max_distance_km
+
+        Without an explicit drivers list the process-wide driver index
+        is queried instead of scanning every driver.
+        """
+        if drivers is None:
+            from app.services.driver_index import driver_index
+            return driver_index.nearest(pickup_location, k=limit or 5, max_distance_km=max_distance_km)
         
-        pickup_lat, pickup_lng = pickup_location
+        if not drivers:
+            return []
         
-        for driver in drivers:
-            if not (driver.get('current_location_lat') and driver.get('current_location_lng')):
-                driver['distance_km'] = float('inf')
-                continue
-            
-            lat1, lon1 = math.radians(pickup_lat), math.radians(pickup_lng)
-            lat2, lon2 = math.radians(driver['current_location_lat']), math.radians(driver['current_location_lng'])
-            
-            dlat = lat2 - lat1
-            dlon = lon2 - lon1
-            
-            a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-            c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-            
-            driver['distance_km'] = 6371 * c  # Distance in km
+        # One vectorized pass over all candidates; drivers without a fix rank as inf
+        coords = np.array([
+            (
+                driver['current_location_lat'] if driver.get('current_location_lat') is not None else np.nan,
+                driver['current_location_lng'] if driver.get('current_location_lng') is not None else np.nan
+            )
+            for driver in drivers
+        ], dtype=np.float64)
+        available = np.fromiter((bool(d.get('is_available', False)) for d in drivers), dtype=bool, count=len(drivers))
+        coords[~available] = np.nan
         
-        # Filter available drivers within range and sort by distance
-        available_drivers = [
-            d for d in drivers 
-            if d.get('is_available', False) and d.get('distance_km', float('inf')) <= max_distance_km
-        ]
+        distances, order = rank_by_distance([pickup_location], coords, k=limit, max_distance_km=max_distance_km)
         
-        return sorted(available_drivers, key=lambda x: x['distance_km'])
+        return [
+            {**drivers[i], 'distance_km': float(distance)}
+            for distance, i in zip(distances[0], order[0])
+            if np.isfinite(distance)
+        ]
     
     def estimate_delivery_cost(
         self,
@@ -213,4 +538,59 @@ class AIService:
             "currency": "₹",
             "vehicle_type": vehicle,
             "distance_km": round(distance_km, 2)
-        }
\ No newline at end of file
+        }
+
+    
+    async def quote_async(
+        self,
+        origin: Tuple[float, float],
+        destination: Tuple[float, float],
+        vehicle_type: str = "auto"
+    ) -> Dict:
+        """Fare quote for a trip; concurrent identical quotes share one computation"""
+        quote = await self.quote_flights.do(
+            ("quote", tuple(origin), tuple(destination), vehicle_type.lower()),
+            lambda: self._quote_async(origin, destination, vehicle_type)
+        )
+        return dict(quote)
+    
+    async def _quote_async(
+        self,
+        origin: Tuple[float, float],
+        destination: Tuple[float, float],
+        vehicle_type: str
+    ) -> Dict:
+        route = await self.calculate_route_async(origin, destination)
+        quote = self.estimate_delivery_cost(route['distance_km'], vehicle_type)
+        quote["duration_min"] = round(route['duration_min'], 1)
+        quote["route_source"] = route['source']
+        return quote
+
+
+# -------------------------
+# PROCESS-WIDE INSTANCE
+# -------------------------
+_ai_service: Optional[AIService] = None
+_ai_service_lock = threading.Lock()
+
+
+def init_ai_service() -> AIService:
+    """Create the shared AIService (called once from the app lifespan)"""
+    global _ai_service
+    with _ai_service_lock:
+        if _ai_service is None:
+            _ai_service = AIService()
+        return _ai_service
+
+
+def get_ai_service() -> AIService:
+    """FastAPI dependency returning the shared AIService, created lazily if needed"""
+    return _ai_service or init_ai_service()
+
+
+async def close_ai_service():
+    global _ai_service
+    with _ai_service_lock:
+        service, _ai_service = _ai_service, None
+    if service is not None:
+        await service.aclose()
@@ -1,5 +1,9 @@
+import asyncio
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from datetime import timedelta
+from typing import Dict, Optional
 from app.models.user import User
 from app.models.driver import Driver
 from app.models.customer import Customer
@@ -14,29 +18,29 @@ from app.core.config import settings
 class AuthService:
     
     @staticmethod
-    def register_user(db: Session, user_data: dict):
+    async def register_user(db: AsyncSession, user_data: dict):
         """Register a new user with proper validation"""
         # Check if user exists
-        existing_user = db.query(User).filter(
-            (User.email == user_data["email"]) | (User.phone == user_data["phone"])
-        ).first()
+        existing_user = await db.scalar(select(User).where(
+            or_(User.email == user_data["email"], User.phone == user_data["phone"])
+        ).limit(1))
         
         if existing_user:
             return None, "Email or phone already registered"
         
-        # Create user
+        # Create user; bcrypt is deliberately slow, keep it off the event loop
         user = User(
             name=user_data["name"],
             email=user_data["email"],
             phone=user_data["phone"],
-            password_hash=get_password_hash(user_data["password"]),
+            password_hash=await asyncio.to_thread(get_password_hash, user_data["password"]),
             user_type=user_data["user_type"]
         )
         
         
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
         
         # Create profile based on user type
         if user_data["user_type"] == "driver":
@@ -46,7 +50,7 @@ class AuthService:
             customer = Customer(id=user.id)
             db.add(customer)
         
-        db.commit()
+        await db.commit()
         
         # Create token
         token_data = {"sub": user.email, "user_id": user.id, "user_type": user.user_type}
@@ -66,11 +70,11 @@ class AuthService:
         }, None
     
     @staticmethod
-    def login_user(db: Session, email: str, password: str):
+    async def login_user(db: AsyncSession, email: str, password: str):
         """Authenticate user"""
-        user = db.query(User).filter(User.email == email).first()
+        user = await db.scalar(select(User).where(User.email == email).limit(1))
         
-        if not user or not verify_password(password, user.password_hash):
+        if not user or not await asyncio.to_thread(verify_password, password, user.password_hash):
             return None, "Invalid credentials"
         
         if not user.is_active:
@@ -94,14 +98,36 @@ class AuthService:
         }, None
     
     @staticmethod
-    def get_current_user(db: Session, token: str):
+    def get_token_claims(token: str) -> Optional[Dict]:
+        """Verified token claims (user_id, user_type) without a database lookup"""
+        payload = decode_token(token)
+        if not payload or not payload.get("user_id"):
+            return None
+        return payload
+
+    @staticmethod
+    async def get_current_user(db: AsyncSession, token: str):
         """Get user from token"""
         payload = decode_token(token)
         if not payload:
             return None, "Invalid token"
         
         user_id = payload.get("user_id")
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await db.get(User, user_id) if user_id else None
+        
+        if not user:
+            return None, "User not found"
+        
+        return user, None
+
+    @staticmethod
+    def get_current_user_sync(db: Session, token: str):
+        """get_current_user() for routes that run in the threadpool on a sync session"""
+        payload = decode_token(token)
+        if not payload:
+            return None, "Invalid token"
+        
+        user = db.query(User).filter(User.id == payload.get("user_id")).first()
         
         if not user:
             return None, "User not found"
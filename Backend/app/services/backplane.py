@@ -0,0 +1,339 @@
+# File: app/services/backplane.py
+import asyncio
+import fcntl
+import os
+import struct
+from typing import Callable, Dict, Optional, Set
+
+# Frame on the broker socket: op, channel length, payload length, channel, payload
+HEADER = struct.Struct("<BHI")
+OP_SUB, OP_UNSUB, OP_PUB, OP_MSG = 1, 2, 3, 4
+
+# A worker that falls this far behind on reading loses messages instead
+# of making the broker buffer without bound
+MAX_SUBSCRIBER_BUFFER = 8 * 1024 * 1024
+
+Handler = Callable[[str, bytes], None]
+
+
+class Backplane:
+    """
+    Pub/sub between workers.
+
+    Channels are plain strings ("user:<id>", "broadcast", ...). A message
+    published by one worker reaches every other worker subscribed to the
+    channel, never the publisher itself: it has already delivered to its
+    own sockets. subscribe/publish only buffer, they never wait.
+    """
+
+    name = "none"
+
+    async def start(self, handler: Handler):
+        self._handler = handler
+
+    def has_peers(self) -> bool:
+        """Whether other workers may hold sockets this one cannot see"""
+        return False
+
+    def subscribe(self, channel: str):
+        pass
+
+    def unsubscribe(self, channel: str):
+        pass
+
+    def publish(self, channel: str, payload: bytes):
+        pass
+
+    async def stop(self):
+        pass
+
+    def get_metrics(self) -> Dict:
+        return {"backend": self.name}
+
+
+# -------------------------
+# IN-PROCESS
+# -------------------------
+class InProcessBus:
+    """Shared by InProcessBackplane instances; each instance plays one worker"""
+
+    def __init__(self):
+        self.members: Set["InProcessBackplane"] = set()
+        self.subscribers: Dict[str, Set["InProcessBackplane"]] = {}
+
+
+default_bus = InProcessBus()
+
+
+class InProcessBackplane(Backplane):
+    name = "inprocess"
+
+    def __init__(self, bus: Optional[InProcessBus] = None):
+        self.bus = bus or default_bus
+        self.channels: Set[str] = set()
+        self._handler: Optional[Handler] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.metrics = {"published": 0, "delivered": 0}
+
+    async def start(self, handler: Handler):
+        self._handler = handler
+        self._loop = asyncio.get_running_loop()
+        self.bus.members.add(self)
+
+    def has_peers(self) -> bool:
+        return len(self.bus.members) > 1
+
+    def subscribe(self, channel: str):
+        self.channels.add(channel)
+        self.bus.subscribers.setdefault(channel, set()).add(self)
+
+    def unsubscribe(self, channel: str):
+        self.channels.discard(channel)
+        members = self.bus.subscribers.get(channel)
+        if members is not None:
+            members.discard(self)
+            if not members:
+                del self.bus.subscribers[channel]
+
+    def publish(self, channel: str, payload: bytes):
+        self.metrics["published"] += 1
+        for member in self.bus.subscribers.get(channel, ()):
+            if member is not self and member._handler is not None:
+                member._loop.call_soon_threadsafe(member._deliver, channel, payload)
+
+    def _deliver(self, channel: str, payload: bytes):
+        self.metrics["delivered"] += 1
+        self._handler(channel, payload)
+
+    async def stop(self):
+        self.bus.members.discard(self)
+        for channel in list(self.channels):
+            self.unsubscribe(channel)
+
+    def get_metrics(self) -> Dict:
+        return {"backend": self.name, **self.metrics, "channels": len(self.channels)}
+
+
+# -------------------------
+# UNIX SOCKET BROKER
+# -------------------------
+def _frame(op: int, channel: str, payload: bytes = b"") -> bytes:
+    name = channel.encode()
+    return HEADER.pack(op, len(name), len(payload)) + name + payload
+
+
+async def _read_frames(reader: asyncio.StreamReader):
+    while True:
+        header = await reader.readexactly(HEADER.size)
+        op, name_len, payload_len = HEADER.unpack(header)
+        body = await reader.readexactly(name_len + payload_len)
+        yield op, body[:name_len].decode(), body[name_len:]
+
+
+class UnixSocketBroker:
+    """Routes frames between worker connections on one host"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.subscribers: Dict[str, Set[asyncio.StreamWriter]] = {}
+        self._workers: Dict[asyncio.StreamWriter, asyncio.Task] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.metrics = {"workers": 0, "routed": 0, "dropped": 0}
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._serve, path=self.path)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._workers[writer] = asyncio.current_task()
+        self.metrics["workers"] += 1
+        channels: Set[str] = set()
+        try:
+            async for op, channel, payload in _read_frames(reader):
+                if op == OP_PUB:
+                    self._route(writer, channel, payload)
+                elif op == OP_SUB:
+                    channels.add(channel)
+                    self.subscribers.setdefault(channel, set()).add(writer)
+                elif op == OP_UNSUB:
+                    channels.discard(channel)
+                    self._drop_subscriber(channel, writer)
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._workers.pop(writer, None)
+            self.metrics["workers"] -= 1
+            for channel in channels:
+                self._drop_subscriber(channel, writer)
+            writer.close()
+
+    def _route(self, origin: asyncio.StreamWriter, channel: str, payload: bytes):
+        members = self.subscribers.get(channel)
+        if not members:
+            return
+        data = _frame(OP_MSG, channel, payload)
+        for member in members:
+            if member is origin:
+                continue
+            if member.transport.get_write_buffer_size() > MAX_SUBSCRIBER_BUFFER:
+                self.metrics["dropped"] += 1
+                continue
+            member.write(data)
+            self.metrics["routed"] += 1
+
+    def _drop_subscriber(self, channel: str, writer: asyncio.StreamWriter):
+        members = self.subscribers.get(channel)
+        if members is not None:
+            members.discard(writer)
+            if not members:
+                del self.subscribers[channel]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            for task in list(self._workers.values()):
+                task.cancel()
+            await asyncio.gather(*self._workers.values(), return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+
+class UnixSocketBackplane(Backplane):
+    """
+    Backplane through a broker on a Unix socket.
+
+    Workers share one broker per host. The first worker to take the
+    lock file next to the socket hosts it; the rest connect. If the host
+    worker exits, a survivor takes the lock over and every worker
+    reconnects and re-subscribes.
+    """
+
+    name = "unix"
+
+    def __init__(self, path: str, reconnect_seconds: float = 0.5):
+        self.path = path
+        self.reconnect_seconds = reconnect_seconds
+        self.channels: Set[str] = set()
+        self.broker: Optional[UnixSocketBroker] = None
+        self._handler: Optional[Handler] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock_fd: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._connected = asyncio.Event()
+        self.metrics = {"published": 0, "delivered": 0, "dropped_disconnected": 0, "reconnects": 0}
+
+    def has_peers(self) -> bool:
+        return True
+
+    async def start(self, handler: Handler):
+        self._handler = handler
+        self._connected = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            print(f"⚠️  Backplane broker at {self.path} not reachable yet, retrying in background")
+
+    async def _become_broker(self) -> bool:
+        if self.broker is not None:
+            return True
+        fd = os.open(self.path + ".lock", os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        self.broker = UnixSocketBroker(self.path)
+        await self.broker.start()
+        print(f"✅ Backplane broker listening on {self.path} (pid {os.getpid()})")
+        return True
+
+    async def _run(self):
+        while True:
+            try:
+                await self._become_broker()
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except (FileNotFoundError, ConnectionRefusedError):
+                await asyncio.sleep(self.reconnect_seconds)
+                continue
+
+            self._writer = writer
+            for channel in self.channels:
+                writer.write(_frame(OP_SUB, channel))
+            self._connected.set()
+            try:
+                async for op, channel, payload in _read_frames(reader):
+                    if op == OP_MSG:
+                        self.metrics["delivered"] += 1
+                        self._handler(channel, payload)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                pass
+            finally:
+                self._writer = None
+                self._connected.clear()
+                writer.close()
+            self.metrics["reconnects"] += 1
+            print("⚠️  Backplane connection lost, reconnecting")
+            await asyncio.sleep(self.reconnect_seconds)
+
+    def _send(self, data: bytes) -> bool:
+        if self._writer is None or self._writer.is_closing():
+            return False
+        self._writer.write(data)
+        return True
+
+    def subscribe(self, channel: str):
+        if channel not in self.channels:
+            self.channels.add(channel)
+            self._send(_frame(OP_SUB, channel))
+
+    def unsubscribe(self, channel: str):
+        if channel in self.channels:
+            self.channels.discard(channel)
+            self._send(_frame(OP_UNSUB, channel))
+
+    def publish(self, channel: str, payload: bytes):
+        if self._send(_frame(OP_PUB, channel, payload)):
+            self.metrics["published"] += 1
+        else:
+            self.metrics["dropped_disconnected"] += 1
+
+    async def flush(self):
+        """Wait until buffered frames are handed to the socket"""
+        if self._writer is not None:
+            await self._writer.drain()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.broker is not None:
+            await self.broker.stop()
+            self.broker = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def get_metrics(self) -> Dict:
+        return {
+            "backend": self.name,
+            **self.metrics,
+            "connected": self._writer is not None,
+            "hosts_broker": self.broker is not None,
+            "broker": self.broker.metrics if self.broker is not None else None,
+            "channels": len(self.channels)
+        }
+
+
+def create_backplane(kind: str, path: str) -> Backplane:
+    if kind == "unix":
+        return UnixSocketBackplane(path)
+    if kind == "inprocess":
+        return InProcessBackplane()
+    return Backplane()
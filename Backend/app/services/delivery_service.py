@@ -1,64 +1,93 @@
 # File: app/services/delivery_service.py
-from sqlalchemy.orm import Session
+import asyncio
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
 from fastapi import HTTPException, status
 from app.models.delivery import Delivery, DeliveryStatus
 from app.models.driver import Driver
 from app.models.customer import Customer
-from app.services.ai_service import AIService
-from typing import Tuple, Dict, Optional 
+from app.services.ai_service import AIService, get_ai_service
+from app.services.location_history import location_history
+from app.services.trip_meter import trip_meters
+from app.services.tracking_hub import tracking_hub
+from app.services.pickup_index import pending_pickups
+from app.services.user_events import publish_delivery_update
+from app.utils.polyline import pack_geometry, parse_polyline, unpack_geometry
+from typing import Tuple, Dict, List, Optional 
 import uuid
 from datetime import datetime, timedelta, timezone
-from sqlalchemy import update
+from sqlalchemy import select, update
 import json
 
+BASE_FARE = 50  # ₹50 base
+PER_KM_FARE = 15  # ₹15 per km
+
+
+def fare_for(distance_km: float) -> float:
+    return round(BASE_FARE + distance_km * PER_KM_FARE, 2)
+
+
+def epoch_seconds(value: datetime) -> float:
+    # Trip timestamps are stored as naive UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+# Everything attach_assigned_driver() reads, joined into the same query: an
+# AsyncSession cannot lazy-load, and on lists lazy loads would cost up to
+# three SELECTs per delivery
+DELIVERY_DETAIL = (
+    joinedload(Delivery.driver).joinedload(Driver.user),
+    joinedload(Delivery.customer),
+)
+
+
+async def load_delivery(db: AsyncSession, *criteria) -> Optional[Delivery]:
+    """One delivery with DELIVERY_DETAIL, refreshed from the database"""
+    return await db.scalar(
+        select(Delivery)
+        .options(*DELIVERY_DETAIL)
+        .where(*criteria)
+        .execution_options(populate_existing=True)
+    )
+
 
 class DeliveryService:
     
     @staticmethod
-    def book_delivery(db: Session, customer_id: str, delivery_data: Dict) -> Tuple[Optional[Delivery], str]:
+    async def book_delivery(
+        db: AsyncSession,
+        customer_id: str,
+        delivery_data: Dict,
+        ai_service: Optional[AIService] = None,
+        route_info: Optional[Dict] = None
+    ) -> Tuple[Optional[Delivery], str]:
         """Book a new delivery with AI driver assignment"""
         try:
             # 1. Get customer
-            customer = db.query(Customer).filter(Customer.id == customer_id).first()
+            customer = await db.get(Customer, customer_id)
             if not customer:
                 return None, "Customer not found"
             
-            # 2. Calculate route using AI
-            ai_service = AIService()
-            route_info = ai_service.calculate_route(
-                (delivery_data['pickup_lat'], delivery_data['pickup_lng']),
-                (delivery_data['dropoff_lat'], delivery_data['dropoff_lng'])
-            )
-            
-            # 3. Find nearest available driver
-            available_drivers = db.query(Driver).filter(
-                Driver.is_available == True,
-                Driver.current_location_lat.isnot(None),
-                Driver.current_location_lng.isnot(None)
-            ).all()
-            
-            drivers_list = [
-                {
-                    'id': driver.id,
-                    'current_location_lat': driver.current_location_lat,
-                    'current_location_lng': driver.current_location_lng,
-                    'is_available': driver.is_available,
-                    'rating': driver.overall_rating
-                }
-                for driver in available_drivers
-            ]
+            # 2. Calculate route using AI (shared, process-wide service),
+            #    unless the caller already routed it
+            ai_service = ai_service or get_ai_service()
+            if route_info is None:
+                route_info = await ai_service.calculate_route_async(
+                    (delivery_data['pickup_lat'], delivery_data['pickup_lng']),
+                    (delivery_data['dropoff_lat'], delivery_data['dropoff_lng'])
+                )
             
+            # 3. Find nearest available driver (served from the in-memory driver index)
             nearest_drivers = ai_service.find_nearest_drivers(
-                (delivery_data['pickup_lat'], delivery_data['pickup_lng']),
-                drivers_list
+                (delivery_data['pickup_lat'], delivery_data['pickup_lng'])
             )
             
             suggested_driver_id = nearest_drivers[0]['id'] if nearest_drivers else None
             
             # 4. Calculate estimated cost
-            base_rate = 50  # ₹50 base
-            distance_rate = 15  # ₹15 per km
-            estimated_cost = round(base_rate + (route_info['distance_km'] * distance_rate),2)
+            estimated_cost = fare_for(route_info['distance_km'])
             vin = delivery_data.get("vehicle_vin")
             if vin in ("TBD", "", None):
                 vin = None
@@ -80,18 +109,20 @@ class DeliveryService:
                 estimated_distance=route_info['distance_km'],
                 estimated_time=route_info['duration_min'],
                 estimated_cost=estimated_cost,
-                optimal_route=json.dumps(route_info['polyline']),
+                route_geometry=pack_geometry(parse_polyline(route_info['polyline'])),
                 scheduled_pickup=delivery_data.get('scheduled_pickup') or datetime.utcnow() + timedelta(minutes=30)
             )
             
             db.add(delivery)
-            db.commit()
-            db.refresh(delivery)
-            
+            await db.commit()
+            delivery = await load_delivery(db, Delivery.id == delivery.id)
+
+            pending_pickups.sync(delivery)
+            publish_delivery_update(delivery, "booked")
             return delivery, None
             
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             return None, str(e)
         
     @staticmethod
@@ -107,13 +138,25 @@ class DeliveryService:
             ).all()
 
         return []
+
     @staticmethod
-    def get_delivery_by_id(db, delivery_id: str, user_id: str):
-        delivery = (
-        db.query(Delivery)
-        .filter(Delivery.id == delivery_id)
-        .first()
-    )
+    def route_points(delivery: Delivery) -> List[Tuple[float, float]]:
+        """Stored route geometry, else the legacy polyline, else a straight line"""
+        if delivery.route_geometry:
+            return unpack_geometry(delivery.route_geometry)
+        if delivery.optimal_route:
+            try:
+                return parse_polyline(json.loads(delivery.optimal_route))
+            except ValueError:
+                pass
+        return [
+            (delivery.pickup_lat, delivery.pickup_lng),
+            (delivery.dropoff_lat, delivery.dropoff_lng)
+        ]
+
+    @staticmethod
+    async def get_delivery_by_id(db: AsyncSession, delivery_id: str, user_id: str):
+        delivery = await load_delivery(db, Delivery.id == delivery_id)
 
         if not delivery:
             raise HTTPException(
@@ -131,10 +174,8 @@ class DeliveryService:
         return delivery
     
     @staticmethod
-    def assign_driver(db, delivery_id: str, driver_id: str):
-        delivery = db.query(Delivery).filter(
-            Delivery.id == delivery_id
-        ).first()
+    async def assign_driver(db: AsyncSession, delivery_id: str, driver_id: str):
+        delivery = await db.get(Delivery, delivery_id)
 
         if not delivery:
             return None, "Delivery not found"
@@ -146,13 +187,16 @@ class DeliveryService:
         delivery.status = "assigned"
 
         db.add(delivery)
-        db.commit()
-        db.refresh(delivery)
+        await db.commit()
+        delivery = await load_delivery(db, Delivery.id == delivery_id)
 
+        tracking_hub.open(delivery.id, driver_id, delivery.customer_id)
+        pending_pickups.sync(delivery)
+        publish_delivery_update(delivery, "assigned")
         return delivery, None
     @staticmethod
-    def force_assign_driver(db, delivery_id: str, driver_id: str):
-        result = db.execute(
+    async def force_assign_driver(db: AsyncSession, delivery_id: str, driver_id: str):
+        result = await db.execute(
             update(Delivery)
             .where(Delivery.id == delivery_id)
             .values(
@@ -164,21 +208,22 @@ class DeliveryService:
         if result.rowcount == 0:
             return None, "Delivery not found"
 
-        db.commit()
+        await db.commit()
 
-        delivery = db.query(Delivery).filter(
-            Delivery.id == delivery_id
-        ).first()
+        delivery = await load_delivery(db, Delivery.id == delivery_id)
 
+        tracking_hub.open(delivery.id, driver_id, delivery.customer_id)
+        pending_pickups.sync(delivery)
+        publish_delivery_update(delivery, "assigned")
         return delivery, None
     
 
     @staticmethod
-    def start_trip(db, delivery_id: str, driver_id: str):
-        delivery = db.query(Delivery).filter(
+    async def start_trip(db: AsyncSession, delivery_id: str, driver_id: str):
+        delivery = await db.scalar(select(Delivery).where(
             Delivery.id == delivery_id,
             Delivery.driver_id == driver_id
-        ).first()
+        ))
 
         if not delivery:
             return None, "Delivery not found or not assigned to you"
@@ -190,22 +235,24 @@ class DeliveryService:
         delivery.status = DeliveryStatus.IN_TRANSIT.value
         delivery.actual_pickup = datetime.utcnow()
 
-        db.commit()
-        db.refresh(delivery)
+        await db.commit()
+        delivery = await load_delivery(db, Delivery.id == delivery_id)
+
+        # Meter the trip from the driver's pings as they arrive
+        trip_meters.start(delivery.id, driver_id, epoch_seconds(delivery.actual_pickup))
+        publish_delivery_update(delivery, "started")
 
         return delivery, None
 
     @staticmethod
-    def complete_trip(db, delivery_id: str, driver_id: str):
-        delivery = db.query(Delivery).filter(
+    async def complete_trip(db: AsyncSession, delivery_id: str, driver_id: str):
+        delivery = await db.scalar(select(Delivery).where(
             Delivery.id == delivery_id,
             Delivery.driver_id == driver_id
-        ).first()
+        ).execution_options(populate_existing=True))
 
         if not delivery:
             return None, "Delivery not found or not assigned to you"
-        
-        db.refresh(delivery)
 
         if delivery.status != "in_transit":
             return None, f"Trip cannot be completed (current status: {delivery.status})"
@@ -213,7 +260,27 @@ class DeliveryService:
         delivery.status = DeliveryStatus.COMPLETED.value
         delivery.actual_delivery = datetime.utcnow()
 
-        db.commit()
-        db.refresh(delivery)
+        started = epoch_seconds(delivery.actual_pickup) if delivery.actual_pickup else None
+        ended = epoch_seconds(delivery.actual_delivery)
+        totals = trip_meters.finish(delivery.id, driver_id)
+        if totals is None and started is not None:
+            # Not metered in this process (restart, other worker): use the stored trail
+            trail = await asyncio.to_thread(location_history.trail, driver_id, started, ended)
+            totals = trip_meters.measure(trail)
+
+        if totals and totals["points"] >= 2:
+            delivery.actual_distance = totals["distance_km"]
+            delivery.actual_cost = fare_for(totals["distance_km"])
+        else:
+            # No usable GPS trace: charge the quoted fare
+            delivery.actual_cost = delivery.estimated_cost
+        if started is not None:
+            delivery.actual_time = round((ended - started) / 60, 2)
+
+        await db.commit()
+        delivery = await load_delivery(db, Delivery.id == delivery_id)
+
+        tracking_hub.close(delivery.id)
+        publish_delivery_update(delivery, "completed")
 
         return delivery, None
\ No newline at end of file
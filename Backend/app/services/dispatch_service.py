@@ -0,0 +1,276 @@
+# File: app/services/dispatch_service.py
+import asyncio
+import threading
+import time
+from typing import Dict, List, Optional
+import numpy as np
+from sqlalchemy import bindparam, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.delivery import Delivery, DeliveryStatus
+from app.services.driver_index import driver_index
+from app.services.tracking_hub import tracking_hub
+from app.services.pickup_index import pending_pickups
+from app.services.user_events import publish_delivery_update
+from app.utils.assignment import linear_sum_assignment
+from app.utils.geo import haversine_matrix
+
+# Cost used for pairs further apart than the pickup limit; such pairs
+# are dropped after solving so they never turn into suggestions.
+INFEASIBLE_COST = 1e6
+
+
+class DispatchEngine:
+    """
+    Batched global dispatcher.
+
+    Every window it collects PENDING deliveries and available drivers,
+    solves one min-cost assignment over pickup distance and writes the
+    results back in a single executemany.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float = 3.0,
+        max_pickup_km: float = 10.0,
+        batch_size: int = 500,
+        candidates_per_delivery: int = 10,
+        auto_assign: bool = False
+    ):
+        self.window_seconds = window_seconds
+        self.max_pickup_km = max_pickup_km
+        self.batch_size = batch_size
+        self.candidates_per_delivery = candidates_per_delivery
+        self.auto_assign = auto_assign
+        self._task: Optional[asyncio.Task] = None
+        self._started_at: Optional[float] = None
+        # One round at a time: the loop and the admin endpoint both run rounds
+        self._round_lock = threading.Lock()
+        self.metrics = {
+            "rounds": 0,
+            "skipped_rounds": 0,
+            "deliveries_considered": 0,
+            "assignments": 0,
+            "unmatched": 0,
+            "total_pickup_km": 0.0,
+            "greedy_pickup_km": 0.0,
+            "greedy_conflicts": 0,
+            "last_round_ms": 0.0,
+            "last_solve_ms": 0.0,
+            "last_batch_size": 0,
+            "errors": 0
+        }
+
+    # -------------------------
+    # SOLVER
+    # -------------------------
+    def _pending_deliveries(self, db: Session) -> List:
+        return (
+            db.query(Delivery.id, Delivery.pickup_lat, Delivery.pickup_lng, Delivery.suggested_driver_id)
+            .filter(
+                Delivery.driver_id.is_(None),
+                Delivery.status == DeliveryStatus.PENDING.value
+            )
+            .order_by(Delivery.created_at)
+            .limit(self.batch_size)
+            .all()
+        )
+
+    def _busy_driver_ids(self, db: Session) -> set:
+        rows = (
+            db.query(Delivery.driver_id)
+            .filter(
+                Delivery.driver_id.isnot(None),
+                Delivery.status.in_([
+                    DeliveryStatus.ASSIGNED.value,
+                    DeliveryStatus.IN_TRANSIT.value
+                ])
+            )
+            .all()
+        )
+        # No DISTINCT: the set dedups, and SQL would sort for it
+        return {driver_id for (driver_id,) in rows}
+
+    def _candidate_drivers(self, pickups: np.ndarray, busy: set) -> List[Dict]:
+        """Union of the nearest idle drivers around every pickup"""
+        candidates: Dict[str, Dict] = {}
+        for lat, lng in pickups:
+            # Busy drivers are skipped inside the ring search, so k stays
+            # the same however many drivers are on a trip
+            for driver in driver_index.nearest(
+                (lat, lng),
+                k=self.candidates_per_delivery,
+                max_distance_km=self.max_pickup_km,
+                exclude=busy
+            ):
+                candidates.setdefault(driver["id"], driver)
+        return list(candidates.values())
+
+    def solve(self, pickups: np.ndarray, drivers: List[Dict]) -> Dict:
+        """Assign drivers to pickups; returns matched pairs plus quality stats"""
+        if len(pickups) == 0 or not drivers:
+            return {"pairs": [], "pickup_km": 0.0, "greedy_km": 0.0, "greedy_conflicts": 0}
+
+        driver_coords = np.array(
+            [(d["current_location_lat"], d["current_location_lng"]) for d in drivers],
+            dtype=np.float64
+        )
+        distances = haversine_matrix(pickups, driver_coords)
+        feasible = distances <= self.max_pickup_km
+
+        rows, cols = linear_sum_assignment(np.where(feasible, distances, INFEASIBLE_COST))
+        keep = feasible[rows, cols]
+        rows, cols = rows[keep], cols[keep]
+
+        # Per-booking greedy baseline on the same matrix, for comparison
+        greedy_choice = np.where(feasible.any(axis=1), distances.argmin(axis=1), -1)
+        greedy_rows = greedy_choice >= 0
+        greedy_km = float(distances[greedy_rows, greedy_choice[greedy_rows]].sum())
+        chosen = greedy_choice[greedy_rows]
+        greedy_conflicts = int(len(chosen) - len(np.unique(chosen)))
+
+        return {
+            "pairs": [(int(r), int(c), float(distances[r, c])) for r, c in zip(rows, cols)],
+            "pickup_km": float(distances[rows, cols].sum()),
+            "greedy_km": greedy_km,
+            "greedy_conflicts": greedy_conflicts
+        }
+
+    def run_once(self, db: Session) -> Dict:
+        """Run one dispatch round against the given session, unless one is already running"""
+        if not self._round_lock.acquire(blocking=False):
+            self.metrics["skipped_rounds"] += 1
+            return {"skipped": True, "reason": "a dispatch round is already running"}
+        try:
+            return self._run_round(db)
+        finally:
+            self._round_lock.release()
+
+    def _run_round(self, db: Session) -> Dict:
+        started = time.perf_counter()
+
+        pending = self._pending_deliveries(db)
+        if not pending:
+            self._record(started, 0.0, 0, {"pairs": [], "pickup_km": 0.0, "greedy_km": 0.0, "greedy_conflicts": 0})
+            return {"deliveries": 0, "assignments": 0}
+
+        pickups = np.array([(d.pickup_lat, d.pickup_lng) for d in pending], dtype=np.float64)
+        drivers = self._candidate_drivers(pickups, self._busy_driver_ids(db))
+
+        solve_started = time.perf_counter()
+        result = self.solve(pickups, drivers)
+        solve_ms = (time.perf_counter() - solve_started) * 1000
+
+        updates = [
+            {"b_id": pending[row].id, "b_driver_id": drivers[col]["id"]}
+            for row, col, _ in result["pairs"]
+            if self.auto_assign or pending[row].suggested_driver_id != drivers[col]["id"]
+        ]
+
+        if updates:
+            table = Delivery.__table__
+            values = {"suggested_driver_id": bindparam("b_driver_id")}
+            if self.auto_assign:
+                values.update(driver_id=bindparam("b_driver_id"), status=DeliveryStatus.ASSIGNED.value)
+            db.execute(
+                update(table)
+                .where(
+                    table.c.id == bindparam("b_id"),
+                    table.c.driver_id.is_(None),
+                    # Cancelled since the pending SELECT: cancel also clears driver_id
+                    table.c.status == DeliveryStatus.PENDING.value
+                )
+                .values(**values),
+                updates
+            )
+            db.commit()
+            if self.auto_assign:
+                self._open_tracking(db, updates)
+
+        self._record(started, solve_ms, len(pending), result)
+        return {
+            "deliveries": len(pending),
+            "drivers": len(drivers),
+            "assignments": len(result["pairs"]),
+            "written": len(updates),
+            "pickup_km": round(result["pickup_km"], 3),
+            "solve_ms": round(solve_ms, 3)
+        }
+
+    def _open_tracking(self, db: Session, updates: List[Dict]):
+        # Rows taken by a driver or cancelled in the meantime were skipped by the update
+        wanted = {u["b_id"]: u["b_driver_id"] for u in updates}
+        rows = (
+            db.query(Delivery.id, Delivery.driver_id, Delivery.customer_id, Delivery.status)
+            .filter(Delivery.id.in_(list(wanted)))
+            .all()
+        )
+        for row in rows:
+            if row.driver_id == wanted[row.id]:
+                tracking_hub.open(row.id, row.driver_id, row.customer_id)
+                pending_pickups.sync(row)
+                publish_delivery_update(row, "assigned")
+
+    def _record(self, started: float, solve_ms: float, batch: int, result: Dict):
+        m = self.metrics
+        m["rounds"] += 1
+        m["deliveries_considered"] += batch
+        m["assignments"] += len(result["pairs"])
+        m["unmatched"] += batch - len(result["pairs"])
+        m["total_pickup_km"] += result["pickup_km"]
+        m["greedy_pickup_km"] += result["greedy_km"]
+        m["greedy_conflicts"] += result["greedy_conflicts"]
+        m["last_batch_size"] = batch
+        m["last_solve_ms"] = round(solve_ms, 3)
+        m["last_round_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+    def get_metrics(self) -> Dict:
+        m = dict(self.metrics)
+        uptime = time.monotonic() - self._started_at if self._started_at else 0.0
+        m["running"] = self._task is not None and not self._task.done()
+        m["window_seconds"] = self.window_seconds
+        m["auto_assign"] = self.auto_assign
+        m["assignments_per_second"] = round(m["assignments"] / uptime, 3) if uptime else 0.0
+        m["mean_pickup_km"] = round(m["total_pickup_km"] / m["assignments"], 3) if m["assignments"] else None
+        m["match_rate"] = round(m["assignments"] / m["deliveries_considered"], 3) if m["deliveries_considered"] else None
+        return m
+
+    # -------------------------
+    # BACKGROUND LOOP
+    # -------------------------
+    async def _loop(self, session_factory):
+        while True:
+            await asyncio.sleep(self.window_seconds)
+            db = session_factory()
+            try:
+                await asyncio.to_thread(self.run_once, db)
+            except Exception as e:
+                self.metrics["errors"] += 1
+                print(f"⚠️  Dispatch round failed: {e}")
+                db.rollback()
+            finally:
+                db.close()
+
+    def start(self, session_factory):
+        if self._task is None or self._task.done():
+            self._started_at = time.monotonic()
+            self._task = asyncio.create_task(self._loop(session_factory))
+            print(f"✅ Dispatch engine running every {self.window_seconds}s")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+dispatch_engine = DispatchEngine(
+    window_seconds=settings.DISPATCH_WINDOW_SECONDS,
+    max_pickup_km=settings.DISPATCH_MAX_PICKUP_KM,
+    batch_size=settings.DISPATCH_BATCH_SIZE,
+    candidates_per_delivery=settings.DISPATCH_CANDIDATES_PER_DELIVERY,
+    auto_assign=settings.DISPATCH_AUTO_ASSIGN
+)
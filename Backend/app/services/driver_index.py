@@ -0,0 +1,285 @@
+# File: app/services/driver_index.py
+import math
+import threading
+from typing import Container, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.utils.geo import KM_PER_DEGREE, haversine_km
+
+
+class GeoGridIndex:
+    """
+    Uniform lat/lng grid of points keyed by id.
+
+    Each point lives in exactly one cell, so moves are O(1) and
+    queries only look at the rings of cells around the query point.
+    """
+
+    def __init__(self, cell_size_deg: float = 0.01):
+        self.cell_size_deg = cell_size_deg
+        self._cells: Dict[Tuple[int, int], Dict[str, Tuple[float, float]]] = {}
+        self._points: Dict[str, Tuple[float, float, Tuple[int, int]]] = {}
+        self._payloads: Dict[str, Dict] = {}
+        # Bounding box of every cell ever occupied since the last clear
+        self._bounds: Optional[List[int]] = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, point_id: str):
+        return point_id in self._points
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_size_deg), math.floor(lng / self.cell_size_deg))
+
+    def upsert(self, point_id: str, lat: float, lng: float, payload: Optional[Dict] = None):
+        """Insert a point or move it to a new position"""
+        cell = self._cell(lat, lng)
+        with self._lock:
+            previous = self._points.get(point_id)
+            if previous and previous[2] != cell:
+                self._discard_from_cell(point_id, previous[2])
+            self._cells.setdefault(cell, {})[point_id] = (lat, lng)
+            self._extend_bounds(cell)
+            self._points[point_id] = (lat, lng, cell)
+            if payload is not None:
+                self._payloads[point_id] = payload
+
+    def move(self, point_id: str, lat: float, lng: float) -> bool:
+        """Move an existing point, returns False if it is not indexed"""
+        with self._lock:
+            if point_id not in self._points:
+                return False
+            self.upsert(point_id, lat, lng)
+            return True
+
+    def remove(self, point_id: str):
+        with self._lock:
+            previous = self._points.pop(point_id, None)
+            self._payloads.pop(point_id, None)
+            if previous:
+                self._discard_from_cell(point_id, previous[2])
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._points.clear()
+            self._payloads.clear()
+            self._bounds = None
+
+    def get(self, point_id: str) -> Optional[Dict]:
+        with self._lock:
+            point = self._points.get(point_id)
+            if not point:
+                return None
+            return {**self._payloads.get(point_id, {}), "id": point_id, "lat": point[0], "lng": point[1]}
+
+    def _extend_bounds(self, cell: Tuple[int, int]):
+        i, j = cell
+        if self._bounds is None:
+            self._bounds = [i, i, j, j]
+        else:
+            b = self._bounds
+            b[0], b[1], b[2], b[3] = min(b[0], i), max(b[1], i), min(b[2], j), max(b[3], j)
+
+    def _discard_from_cell(self, point_id: str, cell: Tuple[int, int]):
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.pop(point_id, None)
+            if not bucket:
+                del self._cells[cell]
+
+    def _ring(self, center: Tuple[int, int], r: int):
+        ci, cj = center
+        if r == 0:
+            yield center
+            return
+        for j in range(cj - r, cj + r + 1):
+            yield (ci - r, j)
+            yield (ci + r, j)
+        for i in range(ci - r + 1, ci + r):
+            yield (i, cj - r)
+            yield (i, cj + r)
+
+    def _ring_lower_bound_km(self, lat: float, r: int) -> float:
+        """Smallest possible distance from the query to any point in ring r or beyond"""
+        # Longitude cells are narrowest at the highest latitude the ring reaches
+        far_lat = min(abs(lat) + (r + 1) * self.cell_size_deg, 89.0)
+        return max(r - 1, 0) * self.cell_size_deg * KM_PER_DEGREE * math.cos(math.radians(far_lat))
+
+    def _max_ring(self, center: Tuple[int, int]) -> int:
+        """Ring radius that covers every occupied cell"""
+        if self._bounds is None:
+            return -1
+        ci, cj = center
+        min_i, max_i, min_j, max_j = self._bounds
+        return max(ci - min_i, max_i - ci, cj - min_j, max_j - cj, 0)
+
+    def nearest(
+        self,
+        lat: float,
+        lng: float,
+        k: int = 5,
+        max_distance_km: Optional[float] = None,
+        after: Optional[Tuple[float, str]] = None,
+        exclude: Optional[Container[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Return up to k (id, distance_km) pairs sorted by distance.
+
+        With after=(distance_km, id) only points ordered past it are
+        returned, so a caller can page through the neighbourhood. Ids in
+        exclude are skipped and do not count towards k.
+        """
+        if k <= 0:
+            return []
+
+        center = self._cell(lat, lng)
+        found: List[Tuple[float, str]] = []
+
+        with self._lock:
+            if not self._points:
+                return []
+            max_ring = self._max_ring(center)
+
+            r = 0
+            while r <= max_ring:
+                for cell in self._ring(center, r):
+                    for point_id, (plat, plng) in self._cells.get(cell, {}).items():
+                        if exclude is not None and point_id in exclude:
+                            continue
+                        distance = haversine_km(lat, lng, plat, plng)
+                        if max_distance_km is not None and distance > max_distance_km:
+                            continue
+                        if after is not None and (distance, point_id) <= after:
+                            continue
+                        found.append((distance, point_id))
+
+                bound = self._ring_lower_bound_km(lat, r + 1)
+                if max_distance_km is not None and bound > max_distance_km:
+                    break
+                if len(found) >= k:
+                    found.sort()
+                    del found[k:]
+                    if found[-1][0] <= bound:
+                        break
+                r += 1
+
+        found.sort()
+        return [(point_id, distance) for distance, point_id in found[:k]]
+
+    def within_radius(self, lat: float, lng: float, radius_km: float) -> List[Tuple[str, float]]:
+        """Return every (id, distance_km) pair within radius_km, sorted by distance"""
+        center = self._cell(lat, lng)
+        found: List[Tuple[float, str]] = []
+
+        with self._lock:
+            max_ring = self._max_ring(center)
+            r = 0
+            while r <= max_ring and self._ring_lower_bound_km(lat, r) <= radius_km:
+                for cell in self._ring(center, r):
+                    for point_id, (plat, plng) in self._cells.get(cell, {}).items():
+                        distance = haversine_km(lat, lng, plat, plng)
+                        if distance <= radius_km:
+                            found.append((distance, point_id))
+                r += 1
+
+        found.sort()
+        return [(point_id, distance) for distance, point_id in found]
+
+
+class DriverIndex:
+    """
+    Process-wide index of available drivers with a known location.
+
+    Kept current by the driver status/location endpoints so booking
+    never has to scan the drivers table.
+    """
+
+    def __init__(self, cell_size_deg: float = 0.01):
+        self._grid = GeoGridIndex(cell_size_deg)
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._grid)
+
+    def load(self, db):
+        """(Re)build the index from the drivers table"""
+        from app.models.driver import Driver
+
+        drivers = db.query(
+            Driver.id,
+            Driver.current_location_lat,
+            Driver.current_location_lng,
+            Driver.overall_rating
+        ).filter(
+            Driver.is_available == True,
+            Driver.current_location_lat.isnot(None),
+            Driver.current_location_lng.isnot(None)
+        ).all()
+
+        self._grid.clear()
+        for driver_id, lat, lng, rating in drivers:
+            self._grid.upsert(driver_id, lat, lng, {"rating": rating})
+        self.loaded = True
+        print(f"✅ Driver index loaded with {len(self._grid)} available drivers")
+
+    def set_status(
+        self,
+        driver_id: str,
+        is_available: bool,
+        lat: Optional[float] = None,
+        lng: Optional[float] = None,
+        rating: Optional[float] = None
+    ):
+        """Add a driver that went available, drop one that did not"""
+        if is_available and lat is not None and lng is not None:
+            self._grid.upsert(driver_id, lat, lng, {"rating": rating})
+        else:
+            self._grid.remove(driver_id)
+
+    def update_location(self, driver_id: str, lat: float, lng: float) -> bool:
+        """Move an indexed driver; unavailable drivers are ignored"""
+        return self._grid.move(driver_id, lat, lng)
+
+    def remove(self, driver_id: str):
+        self._grid.remove(driver_id)
+
+    def get(self, driver_id: str) -> Optional[Dict]:
+        """Indexed position and rating of an available driver, or None"""
+        return self._grid.get(driver_id)
+
+    def _as_driver(self, driver_id: str, distance_km: float) -> Dict:
+        point = self._grid.get(driver_id) or {}
+        return {
+            "id": driver_id,
+            "current_location_lat": point.get("lat"),
+            "current_location_lng": point.get("lng"),
+            "is_available": True,
+            "rating": point.get("rating"),
+            "distance_km": distance_km
+        }
+
+    def nearest(
+        self,
+        location: Tuple[float, float],
+        k: int = 5,
+        max_distance_km: Optional[float] = 10.0,
+        exclude: Optional[Container[str]] = None
+    ) -> List[Dict]:
+        """k nearest available drivers not in exclude, same shape as find_nearest_drivers output"""
+        lat, lng = location
+        return [
+            self._as_driver(driver_id, distance)
+            for driver_id, distance in self._grid.nearest(lat, lng, k, max_distance_km, exclude=exclude)
+        ]
+
+    def within_radius(self, location: Tuple[float, float], radius_km: float) -> List[Dict]:
+        lat, lng = location
+        return [
+            self._as_driver(driver_id, distance)
+            for driver_id, distance in self._grid.within_radius(lat, lng, radius_km)
+        ]
+
+
+driver_index = DriverIndex(settings.DRIVER_INDEX_CELL_DEG)
@@ -0,0 +1,363 @@
+# File: app/services/location_history.py
+import glob
+import os
+import struct
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.utils.geo import haversine_km
+
+COORD_SCALE = 1e6
+# uint32 millisecond offsets from a track's base time cover ~49 days
+MAX_OFFSET_MS = 2 ** 32 - 1
+# A parked driver still gets one point this often
+STATIONARY_KEEP_SECONDS = 60
+INITIAL_TRACK_POINTS = 64
+
+# Segment block: magic, version, driver id length, point count, base time (ms),
+# span (ms); followed by the id, then lat int32[n], lng int32[n], offset uint32[n]
+SEGMENT_MAGIC = b"HALS"
+SEGMENT_VERSION = 1
+_BLOCK_HEADER = struct.Struct("<4sBBIqI")
+
+
+class DriverTrack:
+    """
+    Ring buffer of one driver's recent positions: int32 microdegrees and
+    uint32 millisecond offsets, 12 bytes per point. Arrays start small and
+    double up to the configured capacity, so quiet drivers stay cheap.
+    """
+
+    __slots__ = ("driver_id", "base_ms", "lat", "lng", "offset", "head", "count", "unspilled", "last_ms", "last_lat", "last_lng")
+
+    def __init__(self, driver_id: str, base_ms: int, capacity: int):
+        size = min(INITIAL_TRACK_POINTS, capacity)
+        self.driver_id = driver_id
+        self.base_ms = base_ms
+        self.lat = np.zeros(size, dtype=np.int32)
+        self.lng = np.zeros(size, dtype=np.int32)
+        self.offset = np.zeros(size, dtype=np.uint32)
+        self.head = 0        # next slot to write
+        self.count = 0       # valid points in the ring
+        self.unspilled = 0   # newest points not yet on disk
+        self.last_ms = None
+        self.last_lat = None
+        self.last_lng = None
+
+    @property
+    def nbytes(self) -> int:
+        return self.lat.nbytes + self.lng.nbytes + self.offset.nbytes
+
+    def _grow(self, capacity: int):
+        # Only called before the ring has wrapped, so slots are in time order
+        size = min(len(self.lat) * 2, capacity)
+        for name in ("lat", "lng", "offset"):
+            old = getattr(self, name)
+            new = np.zeros(size, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def append(self, lat: float, lng: float, ts_ms: int, capacity: int) -> bool:
+        """Add a point; returns False when it overwrote a point not yet spilled"""
+        if self.count == len(self.lat) and len(self.lat) < capacity:
+            self._grow(capacity)
+        size = len(self.lat)
+        self.lat[self.head] = int(round(lat * COORD_SCALE))
+        self.lng[self.head] = int(round(lng * COORD_SCALE))
+        self.offset[self.head] = ts_ms - self.base_ms
+        self.head = (self.head + 1) % size
+        self.count = min(self.count + 1, size)
+        self.last_ms, self.last_lat, self.last_lng = ts_ms, lat, lng
+        lost = self.unspilled == size
+        self.unspilled = min(self.unspilled + 1, size)
+        return not lost
+
+    def _ordered(self, n: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """The newest n points, oldest first"""
+        size = len(self.lat)
+        idx = (np.arange(self.head - n, self.head)) % size
+        return self.lat[idx], self.lng[idx], self.offset[idx]
+
+    def oldest_unspilled_ms(self) -> Optional[int]:
+        if not self.unspilled:
+            return None
+        return int(self.offset[(self.head - self.unspilled) % len(self.offset)]) + self.base_ms
+
+    def points(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        lat, lng, offset = self._ordered(self.count)
+        return lat, lng, offset.astype(np.int64) + self.base_ms
+
+    def take_unspilled(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        lat, lng, offset = self._ordered(self.unspilled)
+        self.unspilled = 0
+        return lat.copy(), lng.copy(), offset.astype(np.int64) + self.base_ms
+
+
+class LocationHistory:
+    """
+    Time series of driver positions.
+
+    record() thins pings (at most one point per min_interval_seconds,
+    and only after moving min_distance_m unless parked for a minute) into
+    per-driver ring buffers. spill() appends unspilled points to
+    append-only segment files in history_dir, one file per worker
+    process, rotated at segment_max_bytes and deleted after
+    retention_days. trail() merges disk and memory.
+    """
+
+    def __init__(
+        self,
+        history_dir: Optional[str] = None,
+        capacity: int = 1024,
+        min_interval_seconds: float = 5.0,
+        min_distance_m: float = 10.0,
+        spill_points: int = 256,
+        spill_max_age_seconds: float = 60.0,
+        segment_max_bytes: int = 16 * 1024 * 1024,
+        retention_days: float = 30.0
+    ):
+        self.history_dir = history_dir
+        self.capacity = capacity
+        self.min_interval_ms = int(min_interval_seconds * 1000)
+        self.min_distance_km = min_distance_m / 1000
+        self.spill_points = spill_points
+        self.spill_max_age_ms = int(spill_max_age_seconds * 1000)
+        self.segment_max_bytes = segment_max_bytes
+        self.retention_seconds = retention_days * 86400
+
+        self._tracks: Dict[str, DriverTrack] = {}
+        self._lock = threading.Lock()
+        # Segment files and their block index; never taken while holding _lock
+        self._disk_lock = threading.Lock()
+        self._segment_path: Optional[str] = None
+        # path -> (bytes indexed so far, [(driver_id, base_ms, span_ms, payload offset, count)])
+        self._segment_index: Dict[str, Tuple[int, List[Tuple]]] = {}
+        self.metrics = {
+            "received": 0,
+            "recorded": 0,
+            "thinned": 0,
+            "overwritten_unspilled": 0,
+            "spills": 0,
+            "points_spilled": 0,
+            "bytes_spilled": 0,
+            "segments_deleted": 0,
+            "spill_errors": 0
+        }
+
+    # -------------------------
+    # RECORDING
+    # -------------------------
+    def record(self, driver_id: str, lat: float, lng: float, ts: Optional[float] = None):
+        ts_ms = int((ts if ts is not None else time.time()) * 1000)
+        rebased = None
+        with self._lock:
+            self.metrics["received"] += 1
+            track = self._tracks.get(driver_id)
+            if track is not None and track.last_ms is not None:
+                elapsed = ts_ms - track.last_ms
+                if elapsed < self.min_interval_ms:
+                    self.metrics["thinned"] += 1
+                    return
+                moved = haversine_km(track.last_lat, track.last_lng, lat, lng)
+                if moved < self.min_distance_km and elapsed < STATIONARY_KEEP_SECONDS * 1000:
+                    self.metrics["thinned"] += 1
+                    return
+                if ts_ms - track.base_ms > MAX_OFFSET_MS:
+                    # Offsets would overflow: persist what is left and start over
+                    rebased = self._collect([track])
+                    track = None
+            if track is None:
+                track = self._tracks[driver_id] = DriverTrack(driver_id, ts_ms, self.capacity)
+            if not track.append(lat, lng, ts_ms, self.capacity):
+                self.metrics["overwritten_unspilled"] += 1
+            self.metrics["recorded"] += 1
+        if rebased:
+            self._write(*rebased)
+
+    # -------------------------
+    # SEGMENTS
+    # -------------------------
+    def _segment_files(self) -> List[str]:
+        if not self.history_dir:
+            return []
+        return sorted(glob.glob(os.path.join(self.history_dir, "*.seg")))
+
+    def _current_segment(self) -> str:
+        path = self._segment_path
+        if path is None or not os.path.exists(path) or os.path.getsize(path) >= self.segment_max_bytes:
+            os.makedirs(self.history_dir, exist_ok=True)
+            path = os.path.join(self.history_dir, f"{int(time.time() * 1000):015d}-{os.getpid()}.seg")
+            self._segment_path = path
+            self._expire_segments()
+        return path
+
+    def _expire_segments(self):
+        cutoff = time.time() - self.retention_seconds
+        for path in self._segment_files():
+            if path != self._segment_path and os.path.getmtime(path) < cutoff:
+                try:
+                    os.remove(path)
+                    self._segment_index.pop(path, None)
+                    self.metrics["segments_deleted"] += 1
+                except OSError:
+                    pass
+
+    def _collect(self, tracks: List[DriverTrack]) -> Optional[Tuple[bytes, int]]:
+        """Take the unspilled points of each track as one block per driver (lock held)"""
+        blocks = []
+        points = 0
+        for track in tracks:
+            if not track.unspilled:
+                continue
+            driver_id = track.driver_id
+            lat, lng, ts_ms = track.take_unspilled()
+            if not self.history_dir:
+                continue
+            base_ms = int(ts_ms[0])
+            key = driver_id.encode()
+            blocks.append(_BLOCK_HEADER.pack(
+                SEGMENT_MAGIC, SEGMENT_VERSION, len(key), len(lat), base_ms, int(ts_ms[-1]) - base_ms
+            ))
+            blocks.append(key)
+            blocks.append(lat.tobytes())
+            blocks.append(lng.tobytes())
+            blocks.append((ts_ms - base_ms).astype(np.uint32).tobytes())
+            points += len(lat)
+        return (b"".join(blocks), points) if blocks else None
+
+    def _write(self, payload: bytes, points: int):
+        with self._disk_lock:
+            try:
+                with open(self._current_segment(), "ab") as segment:
+                    segment.write(payload)
+            except OSError as e:
+                self.metrics["spill_errors"] += 1
+                print(f"⚠️  Location history spill failed: {e}")
+                return
+        self.metrics["spills"] += 1
+        self.metrics["points_spilled"] += points
+        self.metrics["bytes_spilled"] += len(payload)
+
+    def spill(self, force: bool = False):
+        """Persist tracks with spill_points pending or a point older than spill_max_age"""
+        now_ms = int(time.time() * 1000)
+        with self._lock:
+            due = [
+                track for track in self._tracks.values()
+                if track.unspilled and (
+                    force
+                    or track.unspilled >= self.spill_points
+                    or now_ms - track.oldest_unspilled_ms() >= self.spill_max_age_ms
+                )
+            ]
+            collected = self._collect(due)
+        if collected:
+            self._write(*collected)
+
+    def _index(self, path: str) -> List[Tuple]:
+        """Block directory of a segment, extended incrementally as writers append"""
+        scanned, entries = self._segment_index.get(path, (0, []))
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return entries
+        if size > scanned:
+            with open(path, "rb") as segment:
+                segment.seek(scanned)
+                data = segment.read(size - scanned)
+            pos = 0
+            while pos + _BLOCK_HEADER.size <= len(data):
+                magic, version, key_len, count, base_ms, span_ms = _BLOCK_HEADER.unpack_from(data, pos)
+                if magic != SEGMENT_MAGIC or version != SEGMENT_VERSION:
+                    print(f"⚠️  Corrupt location history block in {path} at {scanned + pos}")
+                    pos = len(data)
+                    break
+                block_len = _BLOCK_HEADER.size + key_len + count * 12
+                if pos + block_len > len(data):
+                    break  # writer is mid-append; pick it up next time
+                key = data[pos + _BLOCK_HEADER.size:pos + _BLOCK_HEADER.size + key_len].decode()
+                entries.append((key, base_ms, span_ms, scanned + pos + _BLOCK_HEADER.size + key_len, count))
+                pos += block_len
+            scanned += pos
+        self._segment_index[path] = (scanned, entries)
+        return entries
+
+    def _read_disk(self, driver_id: str, start_ms: int, end_ms: int) -> List[Tuple[float, float, int]]:
+        points = []
+        for path in self._segment_files():
+            try:
+                # Nothing in a segment is newer than its last write
+                if os.path.getmtime(path) * 1000 < start_ms:
+                    continue
+            except OSError:
+                continue
+            wanted = [
+                entry for entry in self._index(path)
+                if entry[0] == driver_id and entry[1] <= end_ms and entry[1] + entry[2] >= start_ms
+            ]
+            if not wanted:
+                continue
+            with open(path, "rb") as segment:
+                for _, base_ms, _, offset, count in wanted:
+                    segment.seek(offset)
+                    raw = segment.read(count * 12)
+                    lat = np.frombuffer(raw, dtype=np.int32, count=count)
+                    lng = np.frombuffer(raw, dtype=np.int32, count=count, offset=count * 4)
+                    ts = np.frombuffer(raw, dtype=np.uint32, count=count, offset=count * 8).astype(np.int64) + base_ms
+                    points.extend(zip(lat.tolist(), lng.tolist(), ts.tolist()))
+        return points
+
+    # -------------------------
+    # QUERIES
+    # -------------------------
+    def trail(self, driver_id: str, start: float, end: float) -> List[Tuple[float, float, float]]:
+        """(lat, lng, epoch seconds) for a driver between start and end, oldest first"""
+        start_ms, end_ms = int(start * 1000), int(end * 1000)
+        with self._disk_lock:
+            disk = self._read_disk(driver_id, start_ms, end_ms)
+        with self._lock:
+            track = self._tracks.get(driver_id)
+            memory = track.points() if track is not None and track.count else None
+
+        # The ring holds the newest points (spilled or not); disk fills in before it
+        memory_from = int(memory[2][0]) if memory is not None else None
+        merged = {}
+        for lat, lng, ts in disk:
+            if start_ms <= ts <= end_ms and (memory_from is None or ts < memory_from):
+                merged[ts] = (lat, lng)
+        if memory is not None:
+            for lat, lng, ts in zip(*(a.tolist() for a in memory)):
+                if start_ms <= ts <= end_ms:
+                    merged[ts] = (lat, lng)
+
+        return [
+            (lat / COORD_SCALE, lng / COORD_SCALE, ts / 1000)
+            for ts, (lat, lng) in sorted(merged.items())
+        ]
+
+    def get_metrics(self) -> Dict:
+        with self._lock:
+            tracks = len(self._tracks)
+            memory_bytes = sum(track.nbytes for track in self._tracks.values())
+            points = sum(track.count for track in self._tracks.values())
+        m = dict(self.metrics)
+        m["tracked_drivers"] = tracks
+        m["points_in_memory"] = points
+        m["memory_bytes"] = memory_bytes
+        m["bytes_per_driver"] = round(memory_bytes / tracks) if tracks else 0
+        m["segments"] = len(self._segment_files())
+        return m
+
+
+location_history = LocationHistory(
+    history_dir=settings.LOCATION_HISTORY_DIR or None,
+    capacity=settings.LOCATION_HISTORY_CAPACITY,
+    min_interval_seconds=settings.LOCATION_HISTORY_MIN_INTERVAL_SECONDS,
+    min_distance_m=settings.LOCATION_HISTORY_MIN_DISTANCE_M,
+    spill_points=settings.LOCATION_HISTORY_SPILL_POINTS,
+    spill_max_age_seconds=settings.LOCATION_HISTORY_SPILL_MAX_AGE_SECONDS,
+    segment_max_bytes=int(settings.LOCATION_HISTORY_SEGMENT_MAX_MB * 1024 * 1024),
+    retention_days=settings.LOCATION_HISTORY_RETENTION_DAYS
+)
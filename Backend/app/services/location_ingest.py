@@ -0,0 +1,267 @@
+# File: app/services/location_ingest.py
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import bindparam, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.driver import Driver
+from app.services.driver_index import driver_index
+from app.services.location_history import location_history
+from app.services.presence import presence
+from app.services.trip_meter import trip_meters
+from app.services.tracking_hub import tracking_hub
+
+
+class DeviceClock:
+    """
+    Per-connection estimate of how far a driver's phone clock is off.
+
+    A fix cannot be newer than the frame that carries it, so server
+    receive time minus the newest fix in a frame is the clock offset
+    plus however long that fix waited on the phone. The smallest value
+    seen on the connection is the best estimate of the offset.
+    """
+
+    def __init__(self):
+        self.offset: Optional[float] = None
+
+    def observe(self, newest_fix: float, received_at: Optional[float] = None):
+        offset = (received_at if received_at is not None else time.time()) - newest_fix
+        if self.offset is None or offset < self.offset:
+            self.offset = offset
+
+    def to_server(self, recorded_at: float) -> float:
+        """A device fix time on the server clock"""
+        return recorded_at + (self.offset or 0.0)
+
+
+class LocationIngestor:
+    """
+    Write-behind pipeline for driver GPS pings.
+
+    ingest() updates the in-memory fleet state (and the driver index)
+    right away; a background loop writes the latest position of every
+    driver that moved since the last flush in batched transactions, so
+    a driver pinging ten times between flushes costs one row update.
+    """
+
+    def __init__(self, flush_interval_seconds: float = 2.0, batch_size: int = 500, max_lag_seconds: float = 10.0):
+        self.flush_interval_seconds = flush_interval_seconds
+        self.batch_size = batch_size
+        self.max_lag_seconds = max_lag_seconds
+        # driver_id -> (lat, lng, received_at epoch seconds)
+        self._fleet: Dict[str, Tuple[float, float, float]] = {}
+        # driver_id -> received_at (monotonic) of the oldest unflushed ping
+        self._dirty: "OrderedDict[str, float]" = OrderedDict()
+        # Drivers not in the driver index yet; availability is checked at flush time
+        self._unindexed: set = set()
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self.metrics = {
+            "received": 0,
+            "rejected": 0,
+            "stale": 0,
+            "flushes": 0,
+            "rows_written": 0,
+            "coalesced": 0,
+            "last_flush_rows": 0,
+            "last_flush_ms": 0.0,
+            "last_flush_lag_ms": 0.0,
+            "max_flush_lag_ms": 0.0,
+            "lag_breaches": 0,
+            "errors": 0
+        }
+
+    # -------------------------
+    # FLEET STATE
+    # -------------------------
+    def ingest(self, driver_id: str, lat: float, lng: float, recorded_at: Optional[float] = None):
+        """
+        Record a GPS ping; visible to readers immediately, persisted on the next flush.
+
+        recorded_at is the fix time of a batched sample, already on the
+        server clock (see DeviceClock) so it orders against plain pings;
+        it is never allowed to lie in the future, and a sample older than
+        the driver's latest fix is dropped. Returns whether it was applied.
+
+        Out-of-range or non-finite coordinates are rejected here, before
+        anything downstream (index, history, trip meter) can see them.
+        """
+        # Comparisons are False for NaN
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180) or (recorded_at is not None and not math.isfinite(recorded_at)):
+            self.metrics["rejected"] += 1
+            return False
+        received_at = time.time()
+        if recorded_at is not None:
+            received_at = min(recorded_at, received_at)
+        with self._lock:
+            latest = self._fleet.get(driver_id)
+            if latest is not None and received_at < latest[2]:
+                self.metrics["stale"] += 1
+                return False
+            self._fleet[driver_id] = (lat, lng, received_at)
+            if driver_id in self._dirty:
+                self.metrics["coalesced"] += 1
+            else:
+                self._dirty[driver_id] = time.monotonic()
+            self.metrics["received"] += 1
+
+        # Back in matching first if they had gone silent, then moved below
+        presence.heartbeat(driver_id, lat, lng)
+        location_history.record(driver_id, lat, lng, received_at)
+        trip_meters.observe(driver_id, lat, lng, received_at)
+        tracking_hub.publish(driver_id, lat, lng, received_at)
+
+        if not driver_index.update_location(driver_id, lat, lng):
+            with self._lock:
+                self._unindexed.add(driver_id)
+        return True
+
+    def position(self, driver_id: str) -> Optional[Dict]:
+        """Latest known position for a driver, or None if nothing was ingested"""
+        entry = self._fleet.get(driver_id)
+        if entry is None:
+            return None
+        lat, lng, received_at = entry
+        return {"lat": lat, "lng": lng, "received_at": received_at}
+
+    # -------------------------
+    # WRITE-BEHIND FLUSH
+    # -------------------------
+    def _take_batch(self) -> Tuple[List[Dict], float]:
+        with self._lock:
+            batch, oldest = [], None
+            while self._dirty and len(batch) < self.batch_size:
+                driver_id, received = self._dirty.popitem(last=False)
+                lat, lng, _ = self._fleet[driver_id]
+                batch.append({"b_id": driver_id, "b_lat": lat, "b_lng": lng})
+                oldest = received if oldest is None else min(oldest, received)
+            return batch, oldest
+
+    def _requeue(self, batch: List[Dict], received: float):
+        with self._lock:
+            for row in batch:
+                self._dirty.setdefault(row["b_id"], received)
+
+    def _index_new_drivers(self, db: Session):
+        with self._lock:
+            pending, self._unindexed = self._unindexed, set()
+        if not pending:
+            return
+        rows = (
+            db.query(Driver.id, Driver.is_available, Driver.overall_rating)
+            .filter(Driver.id.in_(pending))
+            .all()
+        )
+        for driver_id, is_available, rating in rows:
+            position = self.position(driver_id)
+            if is_available and position:
+                # Available driver sending a first fix: start matching them now
+                driver_index.set_status(driver_id, True, position["lat"], position["lng"], rating)
+
+    def flush(self, db: Session) -> int:
+        """Write every pending position in batch_size transactions; returns rows written"""
+        started = time.perf_counter()
+        written = 0
+        table = Driver.__table__
+        statement = (
+            update(table)
+            .where(table.c.id == bindparam("b_id"))
+            .values(current_location_lat=bindparam("b_lat"), current_location_lng=bindparam("b_lng"))
+        )
+
+        while True:
+            batch, oldest = self._take_batch()
+            if not batch:
+                break
+            try:
+                db.execute(statement, batch)
+                db.commit()
+            except Exception:
+                db.rollback()
+                self._requeue(batch, oldest)
+                raise
+            written += len(batch)
+            lag = time.monotonic() - oldest
+            self.metrics["last_flush_lag_ms"] = round(lag * 1000, 3)
+            self.metrics["max_flush_lag_ms"] = round(max(self.metrics["max_flush_lag_ms"], lag * 1000), 3)
+            if lag > self.max_lag_seconds:
+                self.metrics["lag_breaches"] += 1
+                print(f"⚠️  Location flush lag {lag:.1f}s exceeds {self.max_lag_seconds}s")
+
+        self._index_new_drivers(db)
+        location_history.spill()
+        trip_meters.process_pending()
+
+        if written:
+            self.metrics["flushes"] += 1
+            self.metrics["rows_written"] += written
+            self.metrics["last_flush_rows"] = written
+            self.metrics["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return written
+
+    def get_metrics(self) -> Dict:
+        with self._lock:
+            pending = len(self._dirty)
+            oldest = next(iter(self._dirty.values()), None)
+            tracked = len(self._fleet)
+        m = dict(self.metrics)
+        m["running"] = self._task is not None and not self._task.done()
+        m["flush_interval_seconds"] = self.flush_interval_seconds
+        m["batch_size"] = self.batch_size
+        m["max_lag_seconds"] = self.max_lag_seconds
+        m["tracked_drivers"] = tracked
+        m["pending_rows"] = pending
+        # Age of the oldest ping not yet in the database
+        m["current_lag_ms"] = round((time.monotonic() - oldest) * 1000, 3) if oldest is not None else 0.0
+        return m
+
+    # -------------------------
+    # BACKGROUND LOOP
+    # -------------------------
+    async def _flush_with(self, session_factory):
+        db = session_factory()
+        try:
+            await asyncio.to_thread(self.flush, db)
+        except Exception as e:
+            self.metrics["errors"] += 1
+            print(f"⚠️  Location flush failed: {e}")
+        finally:
+            db.close()
+
+    async def _loop(self, session_factory):
+        # Wake every interval, or at once when stopping, and always finish the
+        # flush in progress: cancelling it would close the session under the
+        # worker thread still using it
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.flush_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            await self._flush_with(session_factory)
+
+    def start(self, session_factory):
+        if self._task is None or self._task.done():
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self._loop(session_factory))
+            print(f"✅ Location ingestor flushing every {self.flush_interval_seconds}s")
+
+    async def stop(self):
+        """Stop the loop after a final flush of whatever is still pending"""
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+        await asyncio.to_thread(location_history.spill, True)
+
+
+location_ingestor = LocationIngestor(
+    flush_interval_seconds=settings.LOCATION_FLUSH_INTERVAL_SECONDS,
+    batch_size=settings.LOCATION_FLUSH_BATCH_SIZE,
+    max_lag_seconds=settings.LOCATION_MAX_LAG_SECONDS
+)
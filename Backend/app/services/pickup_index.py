@@ -0,0 +1,105 @@
+# File: app/services/pickup_index.py
+import asyncio
+import json
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.delivery import Delivery, DeliveryStatus
+from app.services.driver_index import GeoGridIndex
+
+
+class PendingPickupIndex:
+    """
+    Process-wide index of pickup points still waiting for a driver.
+
+    Kept current on book, accept and cancel (sync()), so the drivers'
+    unassigned feed reads only the cells around the driver and its cost
+    does not grow with the backlog elsewhere in the city.
+
+    With several workers, changes are replicated to the others
+    (bind(replicate=...)), which feed them to apply_remote().
+    """
+
+    def __init__(self, cell_size_deg: float = 0.01):
+        self._grid = GeoGridIndex(cell_size_deg)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._replicate: Optional[Callable[[bytes], None]] = None
+        self.metrics = {"added": 0, "removed": 0, "queries": 0, "served": 0}
+
+    def __len__(self):
+        return len(self._grid)
+
+    def __contains__(self, delivery_id: str):
+        return delivery_id in self._grid
+
+    def load(self, db: Session):
+        """(Re)build the index from the deliveries table"""
+        rows = (
+            db.query(Delivery.id, Delivery.pickup_lat, Delivery.pickup_lng)
+            .filter(Delivery.status == DeliveryStatus.PENDING.value, Delivery.driver_id.is_(None))
+            .all()
+        )
+        self._grid.clear()
+        for delivery_id, lat, lng in rows:
+            self._grid.upsert(delivery_id, lat, lng)
+        print(f"✅ Pickup index loaded with {len(self._grid)} pending deliveries")
+
+    def bind(self, replicate: Optional[Callable[[bytes], None]] = None):
+        self._loop = asyncio.get_running_loop()
+        self._replicate = replicate
+
+    # -------------------------
+    # UPDATES
+    # -------------------------
+    def sync(self, delivery):
+        """Index the delivery if it is waiting for a driver, drop it otherwise"""
+        if delivery.status == DeliveryStatus.PENDING.value and delivery.driver_id is None:
+            self._add(delivery.id, delivery.pickup_lat, delivery.pickup_lng)
+            self._share({"op": "add", "id": delivery.id, "lat": delivery.pickup_lat, "lng": delivery.pickup_lng})
+        elif delivery.id in self._grid:
+            self._remove(delivery.id)
+            self._share({"op": "remove", "id": delivery.id})
+
+    def _add(self, delivery_id: str, lat: float, lng: float):
+        self._grid.upsert(delivery_id, lat, lng)
+        self.metrics["added"] += 1
+
+    def _remove(self, delivery_id: str):
+        self._grid.remove(delivery_id)
+        self.metrics["removed"] += 1
+
+    def _share(self, change: Dict):
+        if self._replicate is None or self._loop is None or self._loop.is_closed():
+            return
+        # sync() also runs in threadpool workers; the backplane belongs to the loop
+        self._loop.call_soon_threadsafe(self._replicate, json.dumps(change).encode())
+
+    def apply_remote(self, payload: bytes):
+        change = json.loads(payload)
+        if change["op"] == "add":
+            self._add(change["id"], change["lat"], change["lng"])
+        elif change["op"] == "remove":
+            self._remove(change["id"])
+
+    # -------------------------
+    # QUERIES
+    # -------------------------
+    def page(
+        self,
+        lat: float,
+        lng: float,
+        radius_km: float,
+        limit: int,
+        after: Optional[Tuple[float, str]] = None
+    ) -> List[Tuple[str, float]]:
+        """Up to limit (delivery_id, distance_km) within radius_km, nearest first, past the after key"""
+        found = self._grid.nearest(lat, lng, limit, radius_km, after=after)
+        self.metrics["queries"] += 1
+        self.metrics["served"] += len(found)
+        return found
+
+    def get_metrics(self) -> Dict:
+        return {**self.metrics, "pending": len(self._grid)}
+
+
+pending_pickups = PendingPickupIndex(settings.DRIVER_INDEX_CELL_DEG)
@@ -0,0 +1,209 @@
+# File: app/services/presence.py
+import asyncio
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from sqlalchemy import bindparam, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.driver import Driver
+from app.services.driver_index import driver_index
+from app.utils.timer_wheel import TimerWheel
+
+
+class PresenceTracker:
+    """
+    Driver presence from heartbeats instead of the app's own status calls.
+
+    Every location ping and every WebSocket frame from a driver pushes
+    their deadline ttl_seconds out in a timer wheel. A driver who was
+    available and goes silent past it is dropped from matching at once
+    and written offline on the next tick; the next heartbeat puts them
+    back, so a dead app stops getting suggested within seconds and a
+    brief network gap costs the driver nothing.
+
+    With several workers, the drivers heard in each tick are shared over
+    the backplane (bind(replicate=...)), so a worker that never sees a
+    driver's pings does not expire them.
+    """
+
+    def __init__(self, ttl_seconds: float = 30.0, tick_seconds: float = 1.0):
+        self.ttl_seconds = ttl_seconds
+        self.tick_seconds = tick_seconds
+        self._wheel = TimerWheel(tick_seconds)
+        # Drivers that said they are available (status endpoint or table)
+        self._available: Set[str] = set()
+        # Expired drivers -> last indexed (lat, lng, rating), to restore on return
+        self._away: Dict[str, Optional[Tuple[float, float, Optional[float]]]] = {}
+        # driver_id -> availability still to be written to the table
+        self._pending: Dict[str, bool] = {}
+        self._heard: Set[str] = set()
+        self._lock = threading.Lock()
+        self._replicate: Optional[Callable[[bytes], None]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self.metrics = {"heartbeats": 0, "expired": 0, "restored": 0, "rows_written": 0, "remote_heartbeats": 0, "errors": 0}
+
+    def load(self, db: Session):
+        """Give every driver the table calls available one TTL to show up"""
+        rows = db.query(Driver.id).filter(Driver.is_available == True).all()
+        with self._lock:
+            for (driver_id,) in rows:
+                self._available.add(driver_id)
+                self._wheel.schedule(driver_id, self.ttl_seconds)
+        print(f"✅ Presence tracking {len(rows)} available drivers (ttl {self.ttl_seconds}s)")
+
+    def bind(self, replicate: Optional[Callable[[bytes], None]] = None):
+        self._replicate = replicate
+
+    # -------------------------
+    # HEARTBEATS
+    # -------------------------
+    def heartbeat(self, driver_id: str, lat: Optional[float] = None, lng: Optional[float] = None):
+        """The driver is alive; safe to call from worker threads"""
+        with self._lock:
+            self.metrics["heartbeats"] += 1
+            self._heard.add(driver_id)
+            self._touch(driver_id, lat, lng)
+
+    def apply_remote(self, payload: bytes):
+        """Heartbeats another worker received"""
+        driver_ids = json.loads(payload)
+        with self._lock:
+            self.metrics["remote_heartbeats"] += len(driver_ids)
+            for driver_id in driver_ids:
+                self._touch(driver_id)
+
+    def _touch(self, driver_id: str, lat: Optional[float] = None, lng: Optional[float] = None):
+        self._wheel.schedule(driver_id, self.ttl_seconds)
+        if driver_id not in self._away:
+            return
+        point = self._away.pop(driver_id)
+        self.metrics["restored"] += 1
+        self._pending[driver_id] = True
+        if point is not None:
+            driver_index.set_status(
+                driver_id, True, point[0] if lat is None else lat, point[1] if lng is None else lng, point[2]
+            )
+
+    def status_changed(self, driver_id: str, is_available: bool):
+        """The driver set their status themselves; that wins over anything pending"""
+        with self._lock:
+            self._away.pop(driver_id, None)
+            self._pending.pop(driver_id, None)
+            if is_available:
+                self._available.add(driver_id)
+                self._wheel.schedule(driver_id, self.ttl_seconds)
+            else:
+                self._available.discard(driver_id)
+                self._wheel.cancel(driver_id)
+
+    def is_present(self, driver_id: str) -> bool:
+        with self._lock:
+            return driver_id in self._wheel
+
+    # -------------------------
+    # EXPIRY
+    # -------------------------
+    def expire(self, now: Optional[float] = None) -> List[str]:
+        """Advance the wheel; silent available drivers leave matching. Returns them"""
+        gone = []
+        with self._lock:
+            for driver_id in self._wheel.advance(now):
+                point = driver_index.get(driver_id)
+                if driver_id not in self._available and point is None:
+                    continue
+                driver_index.remove(driver_id)
+                self._away[driver_id] = (point["lat"], point["lng"], point.get("rating")) if point else None
+                self._pending[driver_id] = False
+                gone.append(driver_id)
+            self.metrics["expired"] += len(gone)
+        for driver_id in gone:
+            print(f"⚠️  Driver {driver_id} silent for {self.ttl_seconds}s, marked offline")
+        return gone
+
+    def flush(self, db: Session) -> int:
+        """Write pending availability changes in one batch; returns rows written"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        table = Driver.__table__
+        statement = (
+            update(table)
+            .where(table.c.id == bindparam("b_id"))
+            .values(is_available=bindparam("b_available"), current_status=bindparam("b_status"))
+        )
+        try:
+            db.execute(statement, [
+                {"b_id": driver_id, "b_available": available, "b_status": "online" if available else "offline"}
+                for driver_id, available in pending.items()
+            ])
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._lock:
+                for driver_id, available in pending.items():
+                    self._pending.setdefault(driver_id, available)
+            raise
+        self.metrics["rows_written"] += len(pending)
+        return len(pending)
+
+    def get_metrics(self) -> Dict:
+        with self._lock:
+            m = dict(self.metrics)
+            m["tracked"] = len(self._wheel)
+            m["available"] = len(self._available)
+            m["away"] = len(self._away)
+            m["pending_rows"] = len(self._pending)
+        m["ttl_seconds"] = self.ttl_seconds
+        m["running"] = self._task is not None and not self._task.done()
+        return m
+
+    # -------------------------
+    # BACKGROUND LOOP
+    # -------------------------
+    def _share_heard(self):
+        with self._lock:
+            heard, self._heard = self._heard, set()
+        if heard and self._replicate is not None:
+            self._replicate(json.dumps(sorted(heard)).encode())
+
+    async def _flush_with(self, session_factory):
+        db = session_factory()
+        try:
+            await asyncio.to_thread(self.flush, db)
+        except Exception as e:
+            self.metrics["errors"] += 1
+            print(f"⚠️  Presence flush failed: {e}")
+        finally:
+            db.close()
+
+    async def _loop(self, session_factory):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.tick_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._share_heard()
+            self.expire()
+            await self._flush_with(session_factory)
+
+    def start(self, session_factory):
+        if self._task is None or self._task.done():
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self._loop(session_factory))
+            print(f"✅ Presence expiring drivers after {self.ttl_seconds}s of silence")
+
+    async def stop(self):
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+
+
+presence = PresenceTracker(
+    ttl_seconds=settings.PRESENCE_TTL_SECONDS,
+    tick_seconds=settings.PRESENCE_TICK_SECONDS
+)
@@ -0,0 +1,631 @@
+# File: app/services/road_graph.py
+"""
+Offline road-network routing.
+
+Graphs are built once from an OSM XML extract and written to a compact
+binary file (CSR adjacency arrays, little-endian, 8-byte aligned
+sections) that is mmap'ed at load time, so every worker shares the same
+pages and startup costs nothing beyond opening the file.
+
+Usage:
+    python -m app.services.road_graph build city.osm city.hagr [--ch]
+"""
+import heapq
+import math
+import mmap
+import struct
+import sys
+import threading
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from app.utils.geo import haversine_km
+
+MAGIC = b"HAGR"
+VERSION = 1
+FLAG_CH = 1
+HEADER_FORMAT = "<4sHHIIIIf"
+HEADER_SIZE = 64
+COORD_SCALE = 1e6
+NO_MIDDLE = 0xFFFFFFFF
+
+# Default speeds in km/h when a way has no usable maxspeed tag
+HIGHWAY_SPEEDS = {
+    "motorway": 80, "trunk": 60, "primary": 45, "secondary": 35, "tertiary": 30,
+    "motorway_link": 40, "trunk_link": 35, "primary_link": 30, "secondary_link": 30,
+    "tertiary_link": 25, "unclassified": 25, "residential": 20, "living_street": 10,
+    "service": 15, "road": 20
+}
+
+# Off-network legs between a coordinate and its nearest graph node
+SNAP_SPEED_KMH = 15
+SNAP_CELL_DEG = 0.005
+
+
+# -------------------------
+# BUILDING
+# -------------------------
+def _parse_maxspeed(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    value = value.strip().lower()
+    try:
+        if value.endswith("mph"):
+            return float(value[:-3].strip()) * 1.609
+        return float(value.replace("km/h", "").strip())
+    except ValueError:
+        return None
+
+
+def parse_osm(osm_path: str) -> Tuple[List[Tuple[float, float]], List[Tuple[int, int, float, float]]]:
+    """Read an OSM XML extract into (nodes, edges) with edges as (u, v, seconds, meters)"""
+    coords: Dict[str, Tuple[float, float]] = {}
+    ways: List[Tuple[List[str], float, int]] = []
+
+    for _, element in ET.iterparse(osm_path, events=("end",)):
+        if element.tag == "node":
+            coords[element.get("id")] = (float(element.get("lat")), float(element.get("lon")))
+            element.clear()
+        elif element.tag == "way":
+            tags = {t.get("k"): t.get("v") for t in element.findall("tag")}
+            highway = tags.get("highway")
+            if highway in HIGHWAY_SPEEDS and tags.get("access") not in ("no", "private"):
+                speed = _parse_maxspeed(tags.get("maxspeed")) or HIGHWAY_SPEEDS[highway]
+                oneway = tags.get("oneway", "")
+                if oneway in ("yes", "1", "true") or highway == "motorway" or tags.get("junction") == "roundabout":
+                    direction = 1
+                elif oneway == "-1":
+                    direction = -1
+                else:
+                    direction = 0
+                refs = [nd.get("ref") for nd in element.findall("nd")]
+                ways.append((refs, speed, direction))
+            element.clear()
+
+    node_ids: Dict[str, int] = {}
+    nodes: List[Tuple[float, float]] = []
+    edges: List[Tuple[int, int, float, float]] = []
+
+    def node_index(ref: str) -> int:
+        if ref not in node_ids:
+            node_ids[ref] = len(nodes)
+            nodes.append(coords[ref])
+        return node_ids[ref]
+
+    for refs, speed, direction in ways:
+        refs = [r for r in refs if r in coords]
+        for a, b in zip(refs, refs[1:]):
+            u, v = node_index(a), node_index(b)
+            meters = haversine_km(*nodes[u], *nodes[v]) * 1000
+            seconds = meters / (speed / 3.6)
+            if direction >= 0:
+                edges.append((u, v, seconds, meters))
+            if direction <= 0:
+                edges.append((v, u, seconds, meters))
+
+    return nodes, edges
+
+
+def _witness_search(out_edges, contracted, source: int, skip: int, limit: float, max_settled: int = 60) -> Dict[int, float]:
+    """Bounded Dijkstra from source over uncontracted nodes, avoiding skip"""
+    dist = {source: 0.0}
+    heap = [(0.0, source)]
+    settled = 0
+    while heap and settled < max_settled:
+        d, node = heapq.heappop(heap)
+        if d > limit:
+            break
+        if d > dist[node]:
+            continue
+        settled += 1
+        for nxt, (seconds, _, _) in out_edges[node].items():
+            if nxt == skip or contracted[nxt]:
+                continue
+            nd = d + seconds
+            if nd <= limit and nd < dist.get(nxt, math.inf):
+                dist[nxt] = nd
+                heapq.heappush(heap, (nd, nxt))
+    return dist
+
+
+def contract(n: int, edges: List[Tuple[int, int, float, float]]):
+    """
+    Contraction-hierarchy preprocessing.
+
+    Returns (rank, up_edges, down_edges) where up edges go from a node to
+    a higher-ranked node and down edges are stored at their lower-ranked
+    head; both are (u, v, seconds, meters, middle) tuples.
+    """
+    out_edges: List[Dict[int, Tuple[float, float, int]]] = [dict() for _ in range(n)]
+    in_edges: List[Dict[int, Tuple[float, float, int]]] = [dict() for _ in range(n)]
+    for u, v, seconds, meters in edges:
+        if u != v and seconds < out_edges[u].get(v, (math.inf,))[0]:
+            out_edges[u][v] = (seconds, meters, NO_MIDDLE)
+            in_edges[v][u] = (seconds, meters, NO_MIDDLE)
+
+    contracted = [False] * n
+    contracted_neighbours = [0] * n
+
+    def shortcuts_for(v: int):
+        found = []
+        heads = [(w, edge) for w, edge in out_edges[v].items() if not contracted[w]]
+        if not heads:
+            return found
+        max_out = max(edge[0] for _, edge in heads)
+        for u, (s_in, m_in, _) in in_edges[v].items():
+            if contracted[u]:
+                continue
+            # One witness search per in-neighbour covers every out-neighbour
+            witness = _witness_search(out_edges, contracted, u, v, s_in + max_out)
+            for w, (s_out, m_out, _) in heads:
+                if w != u and witness.get(w, math.inf) > s_in + s_out:
+                    found.append((u, w, s_in + s_out, m_in + m_out))
+        return found
+
+    def priority(v: int) -> int:
+        degree = sum(1 for u in in_edges[v] if not contracted[u]) + sum(1 for w in out_edges[v] if not contracted[w])
+        return len(shortcuts_for(v)) - degree + contracted_neighbours[v]
+
+    heap = [(priority(v), v) for v in range(n)]
+    heapq.heapify(heap)
+    rank = [0] * n
+    order = 0
+
+    while heap:
+        _, v = heapq.heappop(heap)
+        if contracted[v]:
+            continue
+        # Lazy update: re-queue if the node got worse since it was pushed
+        current = priority(v)
+        if heap and current > heap[0][0]:
+            heapq.heappush(heap, (current, v))
+            continue
+
+        for u, w, seconds, meters in shortcuts_for(v):
+            if seconds < out_edges[u].get(w, (math.inf,))[0]:
+                out_edges[u][w] = (seconds, meters, v)
+                in_edges[w][u] = (seconds, meters, v)
+
+        contracted[v] = True
+        rank[v] = order
+        order += 1
+        for neighbour in set(in_edges[v]) | set(out_edges[v]):
+            contracted_neighbours[neighbour] += 1
+
+    up_edges, down_edges = [], []
+    for u in range(n):
+        for v, (seconds, meters, middle) in out_edges[u].items():
+            if rank[v] > rank[u]:
+                up_edges.append((u, v, seconds, meters, middle))
+            else:
+                down_edges.append((u, v, seconds, meters, middle))
+    return rank, up_edges, down_edges
+
+
+def _csr(n: int, rows: List[int], columns: List[Tuple]):
+    """Sort edge columns by row and return (offsets, *column arrays)"""
+    order = np.argsort(np.asarray(rows, dtype=np.int64), kind="stable")
+    offsets = np.zeros(n + 1, dtype=np.uint32)
+    np.cumsum(np.bincount(np.asarray(rows, dtype=np.int64), minlength=n), out=offsets[1:])
+    return offsets, [np.asarray(col)[order] for col in columns]
+
+
+def write_graph(path: str, nodes, edges, with_ch: bool = False):
+    """Serialize a graph (optionally with CH shortcuts) to the binary format"""
+    n, e = len(nodes), len(edges)
+    coords = np.asarray(nodes, dtype=np.float64).reshape(-1, 2)
+    sections = [
+        np.round(coords[:, 0] * COORD_SCALE).astype("<i4"),
+        np.round(coords[:, 1] * COORD_SCALE).astype("<i4"),
+    ]
+
+    offsets, (targets, seconds, meters) = _csr(
+        n, [u for u, _, _, _ in edges],
+        [[v for _, v, _, _ in edges], [s for _, _, s, _ in edges], [m for _, _, _, m in edges]]
+    )
+    sections += [offsets.astype("<u4"), targets.astype("<u4"), seconds.astype("<f4"), meters.astype("<f4")]
+
+    max_speed = max((m / s for _, _, s, m in edges if s > 0), default=1.0)
+    n_up = n_down = 0
+    flags = 0
+
+    if with_ch:
+        rank, up_edges, down_edges = contract(n, edges)
+        n_up, n_down = len(up_edges), len(down_edges)
+        flags |= FLAG_CH
+        sections.append(np.asarray(rank, dtype="<u4"))
+        up_offsets, (up_targets, up_seconds, up_meters, up_middle) = _csr(
+            n, [u for u, *_ in up_edges],
+            [[x[1] for x in up_edges], [x[2] for x in up_edges], [x[3] for x in up_edges], [x[4] for x in up_edges]]
+        )
+        # Down edges are grouped by their (lower-ranked) head for the backward search
+        down_offsets, (down_sources, down_seconds, down_meters, down_middle) = _csr(
+            n, [x[1] for x in down_edges],
+            [[x[0] for x in down_edges], [x[2] for x in down_edges], [x[3] for x in down_edges], [x[4] for x in down_edges]]
+        )
+        sections += [
+            up_offsets.astype("<u4"), up_targets.astype("<u4"), up_seconds.astype("<f4"),
+            up_meters.astype("<f4"), up_middle.astype("<u4"),
+            down_offsets.astype("<u4"), down_sources.astype("<u4"), down_seconds.astype("<f4"),
+            down_meters.astype("<f4"), down_middle.astype("<u4"),
+        ]
+
+    with open(path, "wb") as f:
+        header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, flags, n, e, n_up, n_down, max_speed)
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        for section in sections:
+            f.write(section.tobytes())
+            f.write(b"\0" * (-section.nbytes % 8))
+
+
+def build_from_osm(osm_path: str, out_path: str, with_ch: bool = False) -> Dict:
+    nodes, edges = parse_osm(osm_path)
+    write_graph(out_path, nodes, edges, with_ch=with_ch)
+    return {"nodes": len(nodes), "edges": len(edges), "contraction_hierarchy": with_ch}
+
+
+# -------------------------
+# QUERYING
+# -------------------------
+class RoadGraph:
+    """Read-only, mmap-backed road graph answering shortest-time queries"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, flags, n, e, n_up, n_down, max_speed = struct.unpack_from(HEADER_FORMAT, self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a HappyAuto road graph (v{VERSION})")
+
+        self.node_count = n
+        self.edge_count = e
+        self.has_ch = bool(flags & FLAG_CH)
+        self.max_speed_mps = max_speed
+        self._cursor = HEADER_SIZE
+
+        self.lat = self._section("i", n)
+        self.lng = self._section("i", n)
+        self.offsets = self._section("I", n + 1)
+        self.targets = self._section("I", e)
+        self.seconds = self._section("f", e)
+        self.meters = self._section("f", e)
+
+        if self.has_ch:
+            self.rank = self._section("I", n)
+            self.up = tuple(self._section(code, count) for code, count in
+                            (("I", n + 1), ("I", n_up), ("f", n_up), ("f", n_up), ("I", n_up)))
+            self.down = tuple(self._section(code, count) for code, count in
+                              (("I", n + 1), ("I", n_down), ("f", n_down), ("f", n_down), ("I", n_down)))
+
+        self._snap_index = None
+        self._snap_lock = threading.Lock()
+
+    def _section(self, code: str, count: int) -> memoryview:
+        """Zero-copy typed view over the next section of the file"""
+        size = struct.calcsize(code) * count
+        view = memoryview(self._mmap)[self._cursor:self._cursor + size].cast(code)
+        self._cursor += size + (-size % 8)
+        return view
+
+    def coord(self, node: int) -> Tuple[float, float]:
+        return self.lat[node] / COORD_SCALE, self.lng[node] / COORD_SCALE
+
+    # ---- snapping -----------------------------------------------------
+    def _build_snap_index(self):
+        lat = np.frombuffer(self.lat, dtype="<i4") / COORD_SCALE
+        lng = np.frombuffer(self.lng, dtype="<i4") / COORD_SCALE
+        keys = self._cell_key(np.floor(lat / SNAP_CELL_DEG), np.floor(lng / SNAP_CELL_DEG))
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        unique, starts = np.unique(sorted_keys, return_index=True)
+        ends = np.append(starts[1:], len(sorted_keys))
+        return {"keys": unique, "starts": starts, "ends": ends, "order": order, "lat": lat, "lng": lng}
+
+    @staticmethod
+    def _cell_key(ci, cj):
+        return (np.asarray(ci, dtype=np.int64) + (1 << 20)) * (1 << 21) + (np.asarray(cj, dtype=np.int64) + (1 << 20))
+
+    def nearest_node(self, lat: float, lng: float, max_rings: int = 4) -> Optional[int]:
+        """Closest graph node within a few snap cells of the coordinate"""
+        if self._snap_index is None:
+            with self._snap_lock:
+                if self._snap_index is None:
+                    self._snap_index = self._build_snap_index()
+        index = self._snap_index
+
+        ci, cj = math.floor(lat / SNAP_CELL_DEG), math.floor(lng / SNAP_CELL_DEG)
+        best, best_distance, first_hit = None, math.inf, None
+        for r in range(max_rings + 1):
+            cells = [(i, j) for i in range(ci - r, ci + r + 1) for j in range(cj - r, cj + r + 1)
+                     if max(abs(i - ci), abs(j - cj)) == r]
+            keys = self._cell_key([c[0] for c in cells], [c[1] for c in cells])
+            positions = np.searchsorted(index["keys"], keys)
+            members = [
+                index["order"][index["starts"][p]:index["ends"][p]]
+                for p, key in zip(positions, keys)
+                if p < len(index["keys"]) and index["keys"][p] == key
+            ]
+            if members:
+                candidates = np.concatenate(members)
+                d_lat = np.radians(index["lat"][candidates] - lat)
+                d_lng = np.radians(index["lng"][candidates] - lng) * math.cos(math.radians(lat))
+                distances = d_lat ** 2 + d_lng ** 2
+                i = int(np.argmin(distances))
+                if distances[i] < best_distance:
+                    best, best_distance = int(candidates[i]), float(distances[i])
+            # A hit in ring r can still be beaten by ring r + 1; beyond that the
+            # gain is a fraction of a cell, which is close enough for snapping
+            if best is not None:
+                if first_hit is None:
+                    first_hit = r
+                elif r > first_hit:
+                    break
+        return best
+
+    # ---- searches -----------------------------------------------------
+    def _astar(self, source: int, target: int) -> Optional[List[int]]:
+        offsets, targets, seconds = self.offsets, self.targets, self.seconds
+        target_lat, target_lng = self.coord(target)
+        speed = self.max_speed_mps or 1.0
+
+        def heuristic(node: int) -> float:
+            return haversine_km(*self.coord(node), target_lat, target_lng) * 1000 / speed
+
+        dist = {source: 0.0}
+        parent = {source: -1}
+        heap = [(heuristic(source), 0.0, source)]
+        while heap:
+            _, d, node = heapq.heappop(heap)
+            if node == target:
+                path = []
+                while node != -1:
+                    path.append(node)
+                    node = parent[node]
+                return path[::-1]
+            if d > dist[node]:
+                continue
+            for i in range(offsets[node], offsets[node + 1]):
+                nxt = targets[i]
+                nd = d + seconds[i]
+                if nd < dist.get(nxt, math.inf):
+                    dist[nxt] = nd
+                    parent[nxt] = node
+                    heapq.heappush(heap, (nd + heuristic(nxt), nd, nxt))
+        return None
+
+    def _ch_query(self, source: int, target: int) -> Optional[List[int]]:
+        """Bidirectional upward Dijkstra over the contraction hierarchy"""
+        graphs = (self.up, self.down)
+        dist = ({source: 0.0}, {target: 0.0})
+        parent = ({source: (-1, -1)}, {target: (-1, -1)})
+        heaps = ([(0.0, source)], [(0.0, target)])
+        best, meeting = math.inf, None
+
+        while heaps[0] or heaps[1]:
+            if min(h[0][0] if h else math.inf for h in heaps) >= best:
+                break
+            side = 0 if heaps[0] and (not heaps[1] or heaps[0][0][0] <= heaps[1][0][0]) else 1
+            d, node = heapq.heappop(heaps[side])
+            if d > dist[side][node]:
+                continue
+            other = dist[1 - side].get(node)
+            if other is not None and d + other < best:
+                best, meeting = d + other, node
+            offsets, heads, seconds, _, _ = graphs[side]
+            for i in range(offsets[node], offsets[node + 1]):
+                nxt = heads[i]
+                nd = d + seconds[i]
+                if nd < dist[side].get(nxt, math.inf):
+                    dist[side][nxt] = nd
+                    parent[side][nxt] = (node, i)
+                    heapq.heappush(heaps[side], (nd, nxt))
+
+        if meeting is None:
+            return None
+
+        forward_edges, node = [], meeting
+        while parent[0][node][0] != -1:
+            previous, edge = parent[0][node]
+            forward_edges.append((previous, node, self.up[4][edge]))
+            node = previous
+        forward_edges.reverse()
+
+        backward_edges, node = [], meeting
+        while parent[1][node][0] != -1:
+            following, edge = parent[1][node]
+            backward_edges.append((node, following, self.down[4][edge]))
+            node = following
+
+        path = [source]
+        for u, v, middle in forward_edges + backward_edges:
+            path.extend(self._unpack(u, v, middle))
+        return path
+
+    def _unpack(self, u: int, v: int, middle: int) -> List[int]:
+        """Expand a (possibly shortcut) edge u->v into the nodes after u"""
+        if middle == NO_MIDDLE:
+            return [v]
+        return self._unpack(u, middle, self._edge_middle(u, middle)) + \
+            self._unpack(middle, v, self._edge_middle(middle, v))
+
+    def _edge_middle(self, u: int, v: int) -> int:
+        """Middle node of the cheapest hierarchy edge u->v"""
+        if self.rank[v] > self.rank[u]:
+            offsets, heads, seconds, _, middles = self.up
+            anchor, other = u, v
+        else:
+            offsets, heads, seconds, _, middles = self.down
+            anchor, other = v, u
+        best, middle = math.inf, NO_MIDDLE
+        for i in range(offsets[anchor], offsets[anchor + 1]):
+            if heads[i] == other and seconds[i] < best:
+                best, middle = seconds[i], middles[i]
+        return middle
+
+    def _leg(self, u: int, v: int) -> Tuple[float, float]:
+        """(seconds, meters) of the cheapest original edge u->v"""
+        best = (math.inf, 0.0)
+        for i in range(self.offsets[u], self.offsets[u + 1]):
+            if self.targets[i] == v and self.seconds[i] < best[0]:
+                best = (self.seconds[i], self.meters[i])
+        return best
+
+    def shortest_path(self, origin: Tuple[float, float], destination: Tuple[float, float]) -> Optional[Dict]:
+        """Fastest path between two coordinates, or None when unreachable"""
+        source = self.nearest_node(*origin)
+        target = self.nearest_node(*destination)
+        if source is None or target is None:
+            return None
+
+        path = self._ch_query(source, target) if self.has_ch else self._astar(source, target)
+        if path is None:
+            return None
+
+        seconds = meters = 0.0
+        for u, v in zip(path, path[1:]):
+            leg_seconds, leg_meters = self._leg(u, v)
+            seconds += leg_seconds
+            meters += leg_meters
+
+        # Straight-line legs from the requested points onto the network
+        snap_km = haversine_km(*origin, *self.coord(source)) + haversine_km(*self.coord(target), *destination)
+        meters += snap_km * 1000
+        seconds += snap_km / SNAP_SPEED_KMH * 3600
+
+        return {
+            "distance_km": meters / 1000,
+            "duration_min": seconds / 60,
+            "coordinates": [origin] + [self.coord(node) for node in path] + [destination]
+        }
+
+    # ---- many-to-many -------------------------------------------------
+    def _one_to_many(self, source: int, targets: set) -> Dict[int, Tuple[float, float]]:
+        """Plain Dijkstra from source until every target is settled"""
+        offsets, heads, seconds, meters = self.offsets, self.targets, self.seconds, self.meters
+        dist = {source: (0.0, 0.0)}
+        heap = [(0.0, 0.0, source)]
+        settled, remaining = {}, set(targets)
+        while heap and remaining:
+            d, m, node = heapq.heappop(heap)
+            if node in settled:
+                continue
+            settled[node] = (d, m)
+            remaining.discard(node)
+            for i in range(offsets[node], offsets[node + 1]):
+                nxt = heads[i]
+                nd = d + seconds[i]
+                if nxt not in settled and nd < dist.get(nxt, (math.inf,))[0]:
+                    dist[nxt] = (nd, m + meters[i])
+                    heapq.heappush(heap, (nd, m + meters[i], nxt))
+        return {t: settled[t] for t in targets if t in settled}
+
+    def _upward_search(self, source: int, graph) -> Dict[int, Tuple[float, float]]:
+        """Full Dijkstra over one direction of the hierarchy"""
+        offsets, heads, seconds, meters, _ = graph
+        dist = {source: (0.0, 0.0)}
+        heap = [(0.0, 0.0, source)]
+        settled = {}
+        while heap:
+            d, m, node = heapq.heappop(heap)
+            if node in settled:
+                continue
+            settled[node] = (d, m)
+            for i in range(offsets[node], offsets[node + 1]):
+                nxt = heads[i]
+                nd = d + seconds[i]
+                if nxt not in settled and nd < dist.get(nxt, (math.inf,))[0]:
+                    dist[nxt] = (nd, m + meters[i])
+                    heapq.heappush(heap, (nd, m + meters[i], nxt))
+        return settled
+
+    def _node_matrix(self, sources: List[int], targets: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """(seconds, meters) matrices between graph nodes; inf when unreachable"""
+        seconds = np.full((len(sources), len(targets)), np.inf)
+        meters = np.full((len(sources), len(targets)), np.inf)
+
+        if self.has_ch:
+            # Bucket many-to-many: one backward upward search per target
+            # fills buckets, one forward upward search per source scans them
+            buckets: Dict[int, List[Tuple[int, float, float]]] = {}
+            for target in dict.fromkeys(targets):
+                for node, (d, m) in self._upward_search(target, self.down).items():
+                    buckets.setdefault(node, []).append((target, d, m))
+            columns = {}
+            for j, target in enumerate(targets):
+                columns.setdefault(target, []).append(j)
+            for i, source in enumerate(sources):
+                best: Dict[int, Tuple[float, float]] = {}
+                for node, (d, m) in self._upward_search(source, self.up).items():
+                    for target, bd, bm in buckets.get(node, ()):
+                        if d + bd < best.get(target, (math.inf,))[0]:
+                            best[target] = (d + bd, m + bm)
+                for target, (d, m) in best.items():
+                    seconds[i, columns[target]] = d
+                    meters[i, columns[target]] = m
+        else:
+            wanted = set(targets)
+            for i, source in enumerate(sources):
+                reached = self._one_to_many(source, wanted)
+                for j, target in enumerate(targets):
+                    if target in reached:
+                        seconds[i, j], meters[i, j] = reached[target]
+        return seconds, meters
+
+    def distance_matrix(
+        self,
+        origins: List[Tuple[float, float]],
+        destinations: List[Tuple[float, float]]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """(distance_km, duration_min) matrices; NaN where no route exists"""
+        source_nodes = [self.nearest_node(*point) for point in origins]
+        target_nodes = [self.nearest_node(*point) for point in destinations]
+        distance_km = np.full((len(origins), len(destinations)), np.nan)
+        duration_min = np.full((len(origins), len(destinations)), np.nan)
+
+        rows = [i for i, node in enumerate(source_nodes) if node is not None]
+        cols = [j for j, node in enumerate(target_nodes) if node is not None]
+        if not rows or not cols:
+            return distance_km, duration_min
+
+        seconds, meters = self._node_matrix([source_nodes[i] for i in rows], [target_nodes[j] for j in cols])
+
+        snap_out = np.array([haversine_km(*origins[i], *self.coord(source_nodes[i])) for i in rows])
+        snap_in = np.array([haversine_km(*self.coord(target_nodes[j]), *destinations[j]) for j in cols])
+        snap_km = snap_out[:, None] + snap_in[None, :]
+
+        reachable = np.isfinite(seconds)
+        block_km = np.where(reachable, meters / 1000 + snap_km, np.nan)
+        block_min = np.where(reachable, seconds / 60 + snap_km / SNAP_SPEED_KMH * 60, np.nan)
+        distance_km[np.ix_(rows, cols)] = block_km
+        duration_min[np.ix_(rows, cols)] = block_min
+        return distance_km, duration_min
+
+
+_graphs: Dict[str, Optional[RoadGraph]] = {}
+_graphs_lock = threading.Lock()
+
+
+def load_road_graph(path: str) -> Optional[RoadGraph]:
+    """Open (once per process) the graph at path; None if missing or invalid"""
+    if not path:
+        return None
+    with _graphs_lock:
+        if path not in _graphs:
+            try:
+                graph = RoadGraph(path)
+                print(f"✅ Road graph loaded: {graph.node_count} nodes, {graph.edge_count} edges"
+                      f"{' (CH)' if graph.has_ch else ''}")
+            except (OSError, ValueError, struct.error) as e:
+                print(f"⚠️  Road graph unavailable ({path}): {e}")
+                graph = None
+            _graphs[path] = graph
+        return _graphs[path]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4 or sys.argv[1] != "build":
+        print("Usage: python -m app.services.road_graph build <input.osm> <output.hagr> [--ch]")
+        sys.exit(1)
+    print(build_from_osm(sys.argv[2], sys.argv[3], with_ch="--ch" in sys.argv[4:]))
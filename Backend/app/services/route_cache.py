@@ -0,0 +1,219 @@
+# File: app/services/route_cache.py
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from app.core.config import settings
+from app.utils.polyline import encode, parse_polyline
+
+# Expired rows in the shared tier are purged once every this many writes
+PURGE_EVERY_WRITES = 500
+
+
+class RouteCache:
+    """
+    Two-tier cache for calculate_route results.
+
+    Keys are origin/destination pairs snapped to a grid of grid_deg
+    degrees, so near-identical requests share an entry. Tier 1 is an
+    in-process LRU with TTL; tier 2 is a SQLite file every worker on
+    the host reads and writes (WAL mode).
+
+    Entries keep the exact endpoints they were computed for. A hit for
+    another pair in the same cells gets the route re-anchored: polyline
+    ends and step texts moved to the requested points. Distance and
+    duration are reused as they are (off by at most one cell).
+    """
+
+    def __init__(
+        self,
+        grid_deg: float = 0.001,
+        max_entries: int = 10000,
+        ttl_seconds: float = 3600,
+        db_path: Optional[str] = None,
+        persistent_ttl_seconds: float = 86400
+    ):
+        self.grid_deg = grid_deg
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self.persistent_ttl_seconds = persistent_ttl_seconds
+
+        self._memory: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes_since_purge = 0
+        self.counters = {
+            "memory_hits": 0,
+            "persistent_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "writes": 0,
+            "persistent_errors": 0
+        }
+
+    def key(self, origin: Tuple[float, float], destination: Tuple[float, float]) -> str:
+        """Grid-quantized cache key for an origin/destination pair"""
+        cells = [round(value / self.grid_deg) for value in (*origin, *destination)]
+        return f"{self.grid_deg}:" + ",".join(map(str, cells))
+
+    # -------------------------
+    # SHARED (SQLITE) TIER
+    # -------------------------
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if not self.db_path:
+            return None
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=1.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS route_cache ("
+                "key TEXT PRIMARY KEY, route TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def _persistent_get(self, key: str, now: float) -> Optional[Dict]:
+        try:
+            conn = self._connection()
+            if conn is None:
+                return None
+            row = conn.execute(
+                "SELECT route FROM route_cache WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            entry = json.loads(row[0]) if row else None
+            # Rows written before entries carried their endpoints can't be re-anchored
+            return entry if entry and "origin" in entry else None
+        except sqlite3.Error as e:
+            self.counters["persistent_errors"] += 1
+            print(f"⚠️  Route cache read error: {e}")
+            return None
+
+    def _persistent_put(self, key: str, entry: Dict, now: float):
+        try:
+            conn = self._connection()
+            if conn is None:
+                return
+            conn.execute(
+                "INSERT OR REPLACE INTO route_cache (key, route, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(entry), now + self.persistent_ttl_seconds)
+            )
+            with self._lock:
+                self._writes_since_purge += 1
+                purge = self._writes_since_purge >= PURGE_EVERY_WRITES
+                if purge:
+                    self._writes_since_purge = 0
+            if purge:
+                conn.execute("DELETE FROM route_cache WHERE expires_at <= ?", (now,))
+            conn.commit()
+        except sqlite3.Error as e:
+            self.counters["persistent_errors"] += 1
+            print(f"⚠️  Route cache write error: {e}")
+
+    # -------------------------
+    # PUBLIC API
+    # -------------------------
+    def get(self, origin: Tuple[float, float], destination: Tuple[float, float]) -> Optional[Dict]:
+        key = self.key(origin, destination)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, entry = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    return reanchor(entry, origin, destination)
+                del self._memory[key]
+                self.counters["expirations"] += 1
+
+        entry = self._persistent_get(key, now)
+        if entry is None:
+            with self._lock:
+                self.counters["misses"] += 1
+            return None
+
+        with self._lock:
+            self.counters["persistent_hits"] += 1
+            self._memory_put(key, entry, now)
+        return reanchor(entry, origin, destination)
+
+    def put(self, origin: Tuple[float, float], destination: Tuple[float, float], route: Dict):
+        key = self.key(origin, destination)
+        entry = {"origin": list(origin), "destination": list(destination), "route": dict(route)}
+        now = time.time()
+        with self._lock:
+            self.counters["writes"] += 1
+            self._memory_put(key, entry, now)
+        self._persistent_put(key, entry, now)
+
+    def _memory_put(self, key: str, entry: Dict, now: float):
+        self._memory[key] = (now + self.ttl_seconds, entry)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        try:
+            conn = self._connection()
+            if conn is not None:
+                conn.execute("DELETE FROM route_cache")
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️  Route cache clear error: {e}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["persistent_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["persistent_hits"]) / lookups, 3) if lookups else None
+        stats["grid_deg"] = self.grid_deg
+        stats["max_entries"] = self.max_entries
+        stats["ttl_seconds"] = self.ttl_seconds
+        stats["persistent"] = bool(self.db_path)
+        return stats
+
+
+def reanchor(entry: Dict, origin: Tuple[float, float], destination: Tuple[float, float]) -> Dict:
+    """The cached route of entry, moved onto the requested endpoints"""
+    route = dict(entry["route"])
+    cached_origin, cached_destination = tuple(entry["origin"]), tuple(entry["destination"])
+    origin, destination = tuple(origin), tuple(destination)
+    if (cached_origin, cached_destination) == (origin, destination):
+        return route
+
+    if route.get("polyline"):
+        points = parse_polyline(route["polyline"])
+        if len(points) >= 2:
+            route["polyline"] = encode([origin, *points[1:-1], destination])
+    # Local providers write the endpoints into their step texts
+    route["steps"] = [
+        {
+            **step,
+            "instruction": step.get("instruction", "")
+            .replace(str(cached_origin), str(origin))
+            .replace(str(cached_destination), str(destination))
+        }
+        for step in route.get("steps", [])
+    ]
+    return route
+
+
+route_cache = RouteCache(
+    grid_deg=settings.ROUTE_CACHE_GRID_DEG,
+    max_entries=settings.ROUTE_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.ROUTE_CACHE_TTL_SECONDS,
+    db_path=settings.ROUTE_CACHE_DB_PATH or None,
+    persistent_ttl_seconds=settings.ROUTE_CACHE_PERSISTENT_TTL_SECONDS
+)
@@ -0,0 +1,240 @@
+# File: app/services/routing.py
+import asyncio
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from app.core.config import settings
+
+
+class RoutingError(Exception):
+    """A routing provider failed to produce a route"""
+
+
+def parse_directions(routes: List[Dict]) -> Dict:
+    """Turn a Directions API routes list into our route dict (shortest alternative wins)"""
+    if not routes:
+        raise RoutingError("No directions returned from Google Maps")
+
+    best_route = min(routes, key=lambda x: x['legs'][0]['distance']['value'])
+
+    return {
+        "distance_km": best_route['legs'][0]['distance']['value'] / 1000,
+        "duration_min": best_route['legs'][0]['duration']['value'] / 60,
+        "polyline": best_route['overview_polyline']['points'],
+        "steps": [
+            {
+                "instruction": step['html_instructions'],
+                "distance": step['distance']['text'],
+                "duration": step['duration']['text']
+            }
+            for step in best_route['legs'][0]['steps']
+        ],
+        "source": "google_maps"
+    }
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    Calls that fail or take longer than slow_call_seconds count as
+    failures. After failure_threshold of them in a row the circuit
+    opens and callers go straight to the fallback; once
+    reset_timeout_seconds have passed a single probe call is let
+    through (half-open) to decide whether to close it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout_seconds: float = 30.0, slow_call_seconds: float = 1.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_seconds = reset_timeout_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self.metrics = {"successes": 0, "failures": 0, "slow_calls": 0, "trips": 0, "short_circuited": 0}
+
+    def allow(self) -> bool:
+        """Whether a call may go to the protected provider right now"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout_seconds:
+                self.metrics["short_circuited"] += 1
+                return False
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                self.metrics["short_circuited"] += 1
+                return False
+            self._probe_in_flight = True
+        return True
+
+    def record_success(self, elapsed: float):
+        if elapsed > self.slow_call_seconds:
+            self.metrics["slow_calls"] += 1
+            self.record_failure()
+            return
+        self.metrics["successes"] += 1
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+        self.state = self.CLOSED
+
+    def release_probe(self):
+        """A call ended without a verdict (cancelled); the next one may probe instead"""
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.metrics["failures"] += 1
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.metrics["trips"] += 1
+                print(f"⚠️  Routing circuit opened after {self.consecutive_failures} failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict:
+        return {"state": self.state, "consecutive_failures": self.consecutive_failures, **self.metrics}
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram (about 19% bucket width, 1 ms .. 60 s).
+
+    Percentiles are answered with the upper edge of the bucket they fall
+    in, which is what hedging wants: a slightly pessimistic delay.
+    """
+
+    MIN_SECONDS = 0.001
+    MAX_SECONDS = 60.0
+    GROWTH = 2 ** 0.25
+
+    def __init__(self):
+        self.bucket_count = int(math.ceil(math.log(self.MAX_SECONDS / self.MIN_SECONDS, self.GROWTH))) + 1
+        self.counts = [0] * self.bucket_count
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def _bucket(self, seconds: float) -> int:
+        if seconds <= self.MIN_SECONDS:
+            return 0
+        return min(int(math.ceil(math.log(seconds / self.MIN_SECONDS, self.GROWTH))), self.bucket_count - 1)
+
+    def _upper_edge(self, bucket: int) -> float:
+        return self.MIN_SECONDS * self.GROWTH ** bucket
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.counts[self._bucket(seconds)] += 1
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Latency in seconds at percentile p (0-100), None when empty"""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = max(1, int(math.ceil(self.count * p / 100)))
+            seen = 0
+            for bucket, n in enumerate(self.counts):
+                seen += n
+                if seen >= rank:
+                    return min(self._upper_edge(bucket), self.max)
+        return self.max
+
+    def snapshot(self) -> Dict:
+        def ms(value):
+            return round(value * 1000, 2) if value is not None else None
+        return {
+            "count": self.count,
+            "mean_ms": ms(self.total / self.count) if self.count else None,
+            "p50_ms": ms(self.percentile(50)),
+            "p90_ms": ms(self.percentile(90)),
+            "p99_ms": ms(self.percentile(99)),
+            "max_ms": ms(self.max) if self.count else None
+        }
+
+
+class GoogleDirectionsProvider:
+    """Non-blocking Directions API client over a pooled keep-alive httpx connection"""
+
+    name = "google_maps"
+
+    def __init__(self, api_key: str, base_url: str = "https://maps.googleapis.com"):
+        import httpx
+
+        self.api_key = api_key
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_POOL_MAXSIZE,
+                max_keepalive_connections=settings.HTTP_POOL_MAXSIZE
+            ),
+            timeout=httpx.Timeout(10.0)
+        )
+
+    async def route(self, origin: Tuple[float, float], destination: Tuple[float, float]) -> Dict:
+        response = await self.client.get(
+            "/maps/api/directions/json",
+            params={
+                "origin": f"{origin[0]},{origin[1]}",
+                "destination": f"{destination[0]},{destination[1]}",
+                "mode": "driving",
+                "alternatives": "true",
+                "key": self.api_key
+            }
+        )
+        if response.status_code != 200:
+            # Not raise_for_status(): its message carries the URL, key included
+            raise RoutingError(f"Directions API HTTP {response.status_code}")
+        payload = response.json()
+        if payload.get("status") != "OK":
+            raise RoutingError(f"Directions API status {payload.get('status')}")
+        return parse_directions(payload.get("routes", []))
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+async def call_with_deadline(
+    provider,
+    breaker: CircuitBreaker,
+    origin,
+    destination,
+    deadline_seconds: float,
+    histogram: Optional[LatencyHistogram] = None
+) -> Optional[Dict]:
+    """Call provider under a deadline, feeding the breaker (and histogram); None on any failure"""
+    if not breaker.allow():
+        return None
+
+    started = time.monotonic()
+    try:
+        route = await asyncio.wait_for(provider.route(origin, destination), timeout=deadline_seconds)
+    except asyncio.CancelledError:
+        # The caller went away: says nothing about the provider, but a
+        # half-open probe slot left taken would short-circuit every call
+        breaker.release_probe()
+        raise
+    except asyncio.TimeoutError:
+        breaker.record_failure()
+        print(f"⚠️  {provider.name} missed the {deadline_seconds * 1000:.0f} ms routing deadline")
+        return None
+    except Exception as e:
+        breaker.record_failure()
+        print(f"⚠️  {provider.name} routing error: {e}")
+        return None
+
+    elapsed = time.monotonic() - started
+    breaker.record_success(elapsed)
+    if histogram is not None:
+        histogram.record(elapsed)
+    return route
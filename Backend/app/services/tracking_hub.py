@@ -0,0 +1,261 @@
+# File: app/services/tracking_hub.py
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.delivery import Delivery, DeliveryStatus
+
+# Statuses during which the customer can watch the driver
+TRACKED_STATUSES = (DeliveryStatus.ASSIGNED.value, DeliveryStatus.IN_TRANSIT.value)
+
+
+class _Topic:
+    __slots__ = ("delivery_id", "driver_id", "subscribers", "latest")
+
+    def __init__(self, delivery_id: str, driver_id: str):
+        self.delivery_id = delivery_id
+        self.driver_id = driver_id
+        self.subscribers: Set[str] = set()
+        self.latest: Optional[Dict] = None
+
+
+class _Outbox:
+    """Per subscriber and topic: at most one frame waiting, at most one send per interval"""
+
+    __slots__ = ("last_sent", "pending", "timer")
+
+    def __init__(self):
+        self.last_sent = 0.0
+        self.pending: Optional[Dict] = None
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class TrackingHub:
+    """
+    Per-delivery pub/sub for live driver positions.
+
+    A topic exists while a delivery is assigned or in transit; its
+    customer is subscribed when it opens. Each location ping for the
+    driver replaces the subscriber's pending frame, and frames go out
+    over the socket no more than once per interval, so a burst of pings
+    costs one send.
+
+    With several workers, topic opens and closes are replicated to the
+    others (bind(replicate=...)), so whichever worker receives the
+    driver's pings can push to the customer wherever they are connected.
+    """
+
+    def __init__(self, min_interval_seconds: float = 1.0):
+        self.min_interval_seconds = min_interval_seconds
+        self._topics: Dict[str, _Topic] = {}
+        self._by_driver: Dict[str, str] = {}
+        self._attached: Set[str] = set()
+        self._outboxes: Dict[Tuple[str, str], _Outbox] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._send: Optional[Callable[[str, Dict], Awaitable[None]]] = None
+        self._reachable: Callable[[str], bool] = self._attached.__contains__
+        self._replicate: Optional[Callable[[bytes], None]] = None
+        self.metrics = {"published": 0, "sent": 0, "coalesced": 0, "dropped_offline": 0}
+
+    # -------------------------
+    # TOPICS
+    # -------------------------
+    def load(self, db: Session):
+        """Open topics for every delivery that is already being tracked"""
+        rows = (
+            db.query(Delivery.id, Delivery.driver_id, Delivery.customer_id)
+            .filter(Delivery.status.in_(TRACKED_STATUSES), Delivery.driver_id.isnot(None))
+            .all()
+        )
+        for delivery_id, driver_id, customer_id in rows:
+            self.open(delivery_id, driver_id, customer_id)
+        print(f"✅ Tracking hub loaded {len(rows)} active deliveries")
+
+    def open(self, delivery_id: str, driver_id: str, customer_id: str):
+        """Start tracking a delivery's driver for its customer"""
+        self._open(delivery_id, driver_id, customer_id)
+        self._share({"op": "open", "delivery_id": delivery_id, "driver_id": driver_id, "customer_id": customer_id})
+
+    def _open(self, delivery_id: str, driver_id: str, customer_id: str):
+        with self._lock:
+            previous = self._topics.get(delivery_id)
+            if previous is not None and previous.driver_id != driver_id:
+                self._by_driver.pop(previous.driver_id, None)
+            topic = _Topic(delivery_id, driver_id)
+            topic.subscribers.add(customer_id)
+            self._topics[delivery_id] = topic
+            self._by_driver[driver_id] = delivery_id
+
+    def close(self, delivery_id: str):
+        """Stop tracking; subscribers get a final tracking_ended frame"""
+        subscribers = self._close(delivery_id)
+        self._share({"op": "close", "delivery_id": delivery_id})
+        if subscribers:
+            frame = {"type": "tracking_ended", "delivery_id": delivery_id}
+            self._call_in_loop(self._end_topic, delivery_id, subscribers, frame)
+
+    def _close(self, delivery_id: str) -> List[str]:
+        with self._lock:
+            topic = self._topics.pop(delivery_id, None)
+            if topic is None:
+                return []
+            if self._by_driver.get(topic.driver_id) == delivery_id:
+                del self._by_driver[topic.driver_id]
+            return list(topic.subscribers)
+
+    def _share(self, change: Dict):
+        if self._replicate is not None:
+            self._call_in_loop(self._replicate, json.dumps(change).encode())
+
+    def apply_remote(self, payload: bytes):
+        """Apply a topic change made by another worker (it notifies the subscribers itself)"""
+        change = json.loads(payload)
+        if change["op"] == "open":
+            self._open(change["delivery_id"], change["driver_id"], change["customer_id"])
+        elif change["op"] == "close":
+            for user_id in self._close(change["delivery_id"]):
+                self._drop_outbox((user_id, change["delivery_id"]))
+
+    def subscribe(self, delivery_id: str, user_id: str) -> bool:
+        with self._lock:
+            topic = self._topics.get(delivery_id)
+            if topic is None:
+                return False
+            topic.subscribers.add(user_id)
+            return True
+
+    def unsubscribe(self, delivery_id: str, user_id: str):
+        with self._lock:
+            topic = self._topics.get(delivery_id)
+            if topic is not None:
+                topic.subscribers.discard(user_id)
+
+    # -------------------------
+    # CONNECTIONS
+    # -------------------------
+    def bind(
+        self,
+        send: Callable[[str, Dict], Awaitable[None]],
+        reachable: Optional[Callable[[str], bool]] = None,
+        replicate: Optional[Callable[[bytes], None]] = None
+    ):
+        """
+        Route frames through send(user_id, message) on the running loop.
+
+        reachable(user_id) decides whether a frame is worth sending (default:
+        attached here); replicate(payload) carries topic changes to other
+        workers, which feed them to apply_remote().
+        """
+        self._loop = asyncio.get_running_loop()
+        self._send = send
+        if reachable is not None:
+            self._reachable = reachable
+        self._replicate = replicate
+
+    def attach(self, user_id: str) -> List[Dict]:
+        """Mark a socket as live; returns the latest frame of each of its topics"""
+        self._attached.add(user_id)
+        with self._lock:
+            return [
+                topic.latest for topic in self._topics.values()
+                if user_id in topic.subscribers and topic.latest is not None
+            ]
+
+    def detach(self, user_id: str):
+        self._attached.discard(user_id)
+        for key in [key for key in self._outboxes if key[0] == user_id]:
+            self._drop_outbox(key)
+
+    def _drop_outbox(self, key: Tuple[str, str]):
+        outbox = self._outboxes.pop(key, None)
+        if outbox is not None and outbox.timer is not None:
+            outbox.timer.cancel()
+
+    # -------------------------
+    # PUBLISHING
+    # -------------------------
+    def publish(self, driver_id: str, lat: float, lng: float, timestamp: Optional[float] = None):
+        """Fan a driver ping out to the subscribers of the driver's active delivery"""
+        with self._lock:
+            delivery_id = self._by_driver.get(driver_id)
+            if delivery_id is None:
+                return
+            topic = self._topics[delivery_id]
+            frame = {
+                "type": "driver_location",
+                "delivery_id": delivery_id,
+                "lat": lat,
+                "lng": lng,
+                "timestamp": datetime.fromtimestamp(timestamp or time.time(), timezone.utc).isoformat()
+            }
+            topic.latest = frame
+            subscribers = list(topic.subscribers)
+
+        self.metrics["published"] += 1
+        self._call_in_loop(self._enqueue, delivery_id, subscribers, frame)
+
+    def _call_in_loop(self, fn, *args):
+        if self._loop is None or self._loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            fn(*args)
+        else:
+            self._loop.call_soon_threadsafe(fn, *args)
+
+    def _enqueue(self, delivery_id: str, subscribers: List[str], frame: Dict):
+        now = time.monotonic()
+        for user_id in subscribers:
+            if not self._reachable(user_id):
+                self.metrics["dropped_offline"] += 1
+                continue
+            key = (user_id, delivery_id)
+            outbox = self._outboxes.get(key)
+            if outbox is None:
+                outbox = self._outboxes[key] = _Outbox()
+            if outbox.pending is not None:
+                self.metrics["coalesced"] += 1
+            outbox.pending = frame
+            if outbox.timer is None:
+                delay = max(0.0, outbox.last_sent + self.min_interval_seconds - now)
+                outbox.timer = self._loop.call_later(delay, self._deliver, key)
+
+    def _deliver(self, key: Tuple[str, str]):
+        outbox = self._outboxes.get(key)
+        if outbox is None:
+            return
+        outbox.timer = None
+        frame, outbox.pending = outbox.pending, None
+        if frame is None:
+            return
+        outbox.last_sent = time.monotonic()
+        self.metrics["sent"] += 1
+        self._loop.create_task(self._send(key[0], frame))
+
+    def _end_topic(self, delivery_id: str, subscribers: List[str], frame: Dict):
+        for user_id in subscribers:
+            self._drop_outbox((user_id, delivery_id))
+            if self._reachable(user_id):
+                self._loop.create_task(self._send(user_id, frame))
+
+    def get_metrics(self) -> Dict:
+        with self._lock:
+            topics = len(self._topics)
+        return {
+            **self.metrics,
+            "topics": topics,
+            "attached": len(self._attached),
+            "pending": sum(1 for o in self._outboxes.values() if o.pending is not None),
+            "min_interval_seconds": self.min_interval_seconds
+        }
+
+
+tracking_hub = TrackingHub(min_interval_seconds=settings.TRACKING_PUSH_INTERVAL_SECONDS)
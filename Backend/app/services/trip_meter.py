@@ -0,0 +1,201 @@
+# File: app/services/trip_meter.py
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.utils.geo import haversine_pairs
+
+
+def measure_trace(
+    lat: np.ndarray,
+    lng: np.ndarray,
+    ts: np.ndarray,
+    max_speed_kmh: float,
+    jitter_m: float,
+    moving_speed_kmh: float
+) -> Tuple[float, float, np.ndarray]:
+    """
+    Distance and moving time of a GPS trace, vectorized.
+
+    Spikes - a point reached and left faster than max_speed_kmh - are
+    dropped first. A remaining segment counts only if it is longer than
+    jitter_m or was covered faster than moving_speed_kmh, so a parked
+    phone wandering a few metres adds nothing.
+    Returns (km, moving seconds, kept mask).
+    """
+    n = len(lat)
+    keep = np.ones(n, dtype=bool)
+    if n < 2:
+        return 0.0, 0.0, keep
+
+    seg_km = haversine_pairs(lat[:-1], lng[:-1], lat[1:], lng[1:])
+    dt = np.diff(ts)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        speed = np.where(dt > 0, seg_km / dt * 3600, np.inf)
+    too_fast = speed > max_speed_kmh
+    # Interior points with an impossible jump both in and out are spikes;
+    # a duplicate timestamp (dt == 0) drops the later point
+    keep[1:-1] = ~(too_fast[:-1] & too_fast[1:])
+    keep[1:] &= dt > 0
+
+    if not keep.all():
+        lat, lng, ts = lat[keep], lng[keep], ts[keep]
+        if len(lat) < 2:
+            return 0.0, 0.0, keep
+        seg_km = haversine_pairs(lat[:-1], lng[:-1], lat[1:], lng[1:])
+        dt = np.diff(ts)
+        speed = seg_km / dt * 3600
+
+    moving = (seg_km * 1000 >= jitter_m) | (speed >= moving_speed_kmh)
+    # A jump that survives as the last point of a batch is still too fast; skip it
+    moving &= speed <= max_speed_kmh
+    return float(seg_km[moving].sum()), float(dt[moving].sum()), keep
+
+
+class TripMeter:
+    """Running totals for one in-transit delivery, fed in batches"""
+
+    __slots__ = ("delivery_id", "driver_id", "started_at", "distance_km", "moving_seconds",
+                 "points", "rejected", "_pending", "_tail")
+
+    def __init__(self, delivery_id: str, driver_id: str, started_at: float):
+        self.delivery_id = delivery_id
+        self.driver_id = driver_id
+        self.started_at = started_at
+        self.distance_km = 0.0
+        self.moving_seconds = 0.0
+        self.points = 0
+        self.rejected = 0
+        self._pending: List[Tuple[float, float, float]] = []
+        # Last two accepted points: the anchor for the next batch, plus the one
+        # before it so a spike at a batch boundary can still be recognised
+        self._tail: List[Tuple[float, float, float]] = []
+
+    def add(self, lat: float, lng: float, ts: float):
+        if ts >= self.started_at:
+            self._pending.append((lat, lng, ts))
+
+    def process(self, max_speed_kmh: float, jitter_m: float, moving_speed_kmh: float):
+        """Fold pending points into the totals; cost is O(pending), not O(trace)"""
+        if not self._pending:
+            return
+        batch = self._tail + sorted(self._pending, key=lambda p: p[2])
+        self._pending = []
+        carried = len(self._tail)
+
+        trace = np.array(batch, dtype=np.float64)
+        if carried == 2:
+            # The previous batch already counted tail[0] -> tail[1]; measure it
+            # again here so it can be backed out, then re-add the survivors
+            prev_km, prev_s, _ = measure_trace(
+                trace[:2, 0], trace[:2, 1], trace[:2, 2], max_speed_kmh, jitter_m, moving_speed_kmh
+            )
+            self.distance_km -= prev_km
+            self.moving_seconds -= prev_s
+
+        km, seconds, keep = measure_trace(
+            trace[:, 0], trace[:, 1], trace[:, 2], max_speed_kmh, jitter_m, moving_speed_kmh
+        )
+        self.distance_km += km
+        self.moving_seconds += seconds
+
+        new_keep = keep[carried:]
+        self.points += int(new_keep.sum())
+        self.rejected += int((~new_keep).sum())
+        kept = trace[keep]
+        self._tail = [tuple(row) for row in kept[-2:].tolist()]
+
+    def totals(self) -> Dict:
+        return {
+            "distance_km": round(max(self.distance_km, 0.0), 3),
+            "moving_minutes": round(max(self.moving_seconds, 0.0) / 60, 2),
+            "points": self.points,
+            "rejected": self.rejected
+        }
+
+
+class TripMeters:
+    """
+    Active trip meters, keyed by driver (a driver has one trip in transit).
+
+    Pings are appended as they arrive; the location flush loop folds
+    them in with process_pending(), so finishing a trip only handles
+    the last few seconds of points.
+    """
+
+    def __init__(self, max_speed_kmh: float = 120.0, jitter_m: float = 15.0, moving_speed_kmh: float = 3.0):
+        self.max_speed_kmh = max_speed_kmh
+        self.jitter_m = jitter_m
+        self.moving_speed_kmh = moving_speed_kmh
+        self._by_driver: Dict[str, TripMeter] = {}
+        self._lock = threading.Lock()
+        self.metrics = {"started": 0, "finished": 0, "missing_on_finish": 0, "points": 0, "rejected": 0}
+
+    def _process(self, meter: TripMeter):
+        before = (meter.points, meter.rejected)
+        meter.process(self.max_speed_kmh, self.jitter_m, self.moving_speed_kmh)
+        self.metrics["points"] += meter.points - before[0]
+        self.metrics["rejected"] += meter.rejected - before[1]
+
+    def start(self, delivery_id: str, driver_id: str, started_at: Optional[float] = None):
+        with self._lock:
+            self._by_driver[driver_id] = TripMeter(delivery_id, driver_id, time.time() if started_at is None else started_at)
+            self.metrics["started"] += 1
+
+    def observe(self, driver_id: str, lat: float, lng: float, ts: float):
+        meter = self._by_driver.get(driver_id)
+        if meter is not None:
+            with self._lock:
+                meter.add(lat, lng, ts)
+
+    def discard(self, delivery_id: str, driver_id: str):
+        """Drop the meter of a trip that ended without completing"""
+        with self._lock:
+            meter = self._by_driver.get(driver_id)
+            if meter is not None and meter.delivery_id == delivery_id:
+                del self._by_driver[driver_id]
+
+    def process_pending(self):
+        with self._lock:
+            for meter in self._by_driver.values():
+                self._process(meter)
+
+    def finish(self, delivery_id: str, driver_id: str) -> Optional[Dict]:
+        """Final totals for the trip, or None if this process never metered it"""
+        with self._lock:
+            meter = self._by_driver.get(driver_id)
+            if meter is None or meter.delivery_id != delivery_id:
+                self.metrics["missing_on_finish"] += 1
+                return None
+            del self._by_driver[driver_id]
+            self._process(meter)
+            self.metrics["finished"] += 1
+            return meter.totals()
+
+    def measure(self, trail: List[Tuple[float, float, float]]) -> Dict:
+        """Totals for a whole stored trail (fallback when no meter was running)"""
+        if not trail:
+            return {"distance_km": 0.0, "moving_minutes": 0.0, "points": 0, "rejected": 0}
+        trace = np.array(trail, dtype=np.float64)
+        km, seconds, keep = measure_trace(
+            trace[:, 0], trace[:, 1], trace[:, 2], self.max_speed_kmh, self.jitter_m, self.moving_speed_kmh
+        )
+        return {
+            "distance_km": round(km, 3),
+            "moving_minutes": round(seconds / 60, 2),
+            "points": int(keep.sum()),
+            "rejected": int((~keep).sum())
+        }
+
+    def get_metrics(self) -> Dict:
+        with self._lock:
+            active = len(self._by_driver)
+        return {**self.metrics, "active": active}
+
+
+trip_meters = TripMeters(
+    max_speed_kmh=settings.TRIP_METER_MAX_SPEED_KMH,
+    jitter_m=settings.TRIP_METER_JITTER_M,
+    moving_speed_kmh=settings.TRIP_METER_MOVING_SPEED_KMH
+)
@@ -0,0 +1,129 @@
+# File: app/services/user_events.py
+import asyncio
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from app.core.config import settings
+
+
+class _UserLog:
+    __slots__ = ("events", "next_seq", "touched")
+
+    def __init__(self, capacity: int):
+        self.events: Deque[Tuple[int, Dict]] = deque(maxlen=capacity)
+        self.next_seq = 1
+        self.touched = time.monotonic()
+
+
+class UserEventLog:
+    """
+    Bounded per-user log of the events pushed over /ws.
+
+    Every event gets the next sequence number for its user plus this
+    process's epoch. A reconnecting client sends the last (epoch, seq)
+    it saw and gets only the newer events; if the log no longer reaches
+    back that far, or was started by another process (restart, other
+    worker), the client is told to resync from the REST API instead.
+    Sequence numbers only grow, so clients can drop anything they have
+    already seen.
+    """
+
+    def __init__(self, capacity: int = 256, idle_ttl_seconds: float = 86400):
+        self.capacity = capacity
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.epoch = uuid.uuid4().hex[:12]
+        self._logs: Dict[str, _UserLog] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._send: Optional[Callable[[str, Dict], Awaitable[None]]] = None
+        self._next_reap = time.monotonic() + idle_ttl_seconds
+        self.metrics = {"published": 0, "replayed": 0, "resumes": 0, "resyncs": 0, "reaped": 0}
+
+    def bind(self, send: Callable[[str, Dict], Awaitable[None]]):
+        """Deliver live events through send(user_id, message) on the running loop"""
+        self._loop = asyncio.get_running_loop()
+        self._send = send
+
+    def publish(self, user_id: str, message: Dict) -> Dict:
+        """Log an event for the user and push it; safe to call from worker threads"""
+        with self._lock:
+            log = self._logs.get(user_id)
+            if log is None:
+                log = self._logs[user_id] = _UserLog(self.capacity)
+            event = {**message, "epoch": self.epoch, "seq": log.next_seq}
+            log.events.append((log.next_seq, event))
+            log.next_seq += 1
+            log.touched = time.monotonic()
+            self.metrics["published"] += 1
+            if log.touched >= self._next_reap:
+                self._reap(log.touched)
+
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._deliver, user_id, event)
+        return event
+
+    def _deliver(self, user_id: str, event: Dict):
+        self._loop.create_task(self._send(user_id, event))
+
+    def resume(self, user_id: str, epoch: Optional[str], since: Optional[int]) -> List[Dict]:
+        """
+        Messages that bring a (re)connecting client up to date.
+
+        The events after (epoch, since) when the log still covers them,
+        then a "sync" carrying the cursor to continue from; a "resync"
+        instead when the client has to refetch its state. Both carry the
+        last sequence number, taken under the same lock as the replay, so
+        live events that race the reconnect are either replayed or newer.
+        """
+        with self._lock:
+            log = self._logs.get(user_id)
+            last = log.next_seq - 1 if log else 0
+            oldest = log.events[0][0] if log and log.events else last + 1
+
+            if since is None:
+                # First connection of this client: nothing to catch up on
+                return [{"type": "sync", "epoch": self.epoch, "seq": last, "replayed": 0}]
+            if epoch == self.epoch and oldest - 1 <= since <= last:
+                events = [event for seq, event in log.events if seq > since] if log else []
+                self.metrics["resumes"] += 1
+                self.metrics["replayed"] += len(events)
+                return events + [{"type": "sync", "epoch": self.epoch, "seq": last, "replayed": len(events)}]
+
+            self.metrics["resyncs"] += 1
+            reason = "epoch" if epoch != self.epoch else "truncated"
+            return [{"type": "resync", "reason": reason, "epoch": self.epoch, "seq": last}]
+
+    def _reap(self, now: float):
+        idle = [u for u, log in self._logs.items() if now - log.touched > self.idle_ttl_seconds]
+        for user_id in idle:
+            del self._logs[user_id]
+        self.metrics["reaped"] += len(idle)
+        self._next_reap = now + self.idle_ttl_seconds
+
+    def get_metrics(self) -> Dict:
+        with self._lock:
+            users = len(self._logs)
+            events = sum(len(log.events) for log in self._logs.values())
+        return {**self.metrics, "epoch": self.epoch, "users": users, "events": events, "capacity": self.capacity}
+
+
+user_events = UserEventLog(
+    capacity=settings.WS_EVENT_LOG_SIZE,
+    idle_ttl_seconds=settings.WS_EVENT_LOG_IDLE_HOURS * 3600
+)
+
+
+def publish_delivery_update(delivery, event: str, extra_user_ids: Tuple[str, ...] = ()):
+    """Tell the customer and driver of a delivery that it changed"""
+    message = {
+        "type": "delivery_update",
+        "event": event,
+        "delivery_id": delivery.id,
+        "status": delivery.status,
+        "driver_id": delivery.driver_id
+    }
+    recipients = {delivery.customer_id, delivery.driver_id, *extra_user_ids} - {None}
+    for user_id in recipients:
+        user_events.publish(user_id, message)
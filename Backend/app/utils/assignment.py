@@ -0,0 +1,79 @@
+# File: app/utils/assignment.py
+from typing import Tuple
+import numpy as np
+
+
+def linear_sum_assignment(cost: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Min-cost bipartite assignment (Hungarian algorithm with potentials).
+
+    Works on rectangular matrices: every row is matched when there are
+    at least as many columns as rows, and vice versa. Returns
+    (row_indices, col_indices) sorted by row, same as scipy's function
+    of the same name. Costs must be finite - callers should replace
+    forbidden pairs with a large penalty and filter them afterwards.
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    if cost.ndim != 2:
+        raise ValueError("cost matrix must be 2-dimensional")
+    if cost.size == 0:
+        empty = np.array([], dtype=np.intp)
+        return empty, empty
+    if not np.all(np.isfinite(cost)):
+        raise ValueError("cost matrix contains non-finite values")
+
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+
+    n, m = cost.shape
+    # 1-based potentials/matching as in the classic O(n^2 m) formulation;
+    # column 0 is a virtual column used to start each augmenting path.
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    match = np.zeros(m + 1, dtype=np.intp)  # match[j] = row assigned to column j
+    way = np.zeros(m + 1, dtype=np.intp)
+
+    for i in range(1, n + 1):
+        match[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+
+        while True:
+            used[j0] = True
+            i0 = match[j0]
+            free = ~used[1:]
+
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            improved = free & (reduced < minv[1:])
+            minv[1:][improved] = reduced[improved]
+            way[1:][improved] = j0
+
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+
+            used_cols = np.flatnonzero(used)
+            u[match[used_cols]] += delta
+            v[used_cols] -= delta
+            minv[1:][free] -= delta
+
+            j0 = j1
+            if match[j0] == 0:
+                break
+
+        # Flip the augmenting path back to the virtual column
+        while j0:
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+
+    cols = np.flatnonzero(match[1:]) + 1
+    rows = match[cols] - 1
+    cols = cols - 1
+
+    if transposed:
+        rows, cols = cols, rows
+    order = np.argsort(rows)
+    return rows[order], cols[order]
@@ -0,0 +1,82 @@
+# File: app/utils/cursor.py
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional
+from sqlalchemy import String, and_, literal, or_, tuple_, type_coerce
+from app.core.config import settings
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Opaque, URL-safe page cursor for the sort key of the last row served"""
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, length: int) -> List[Any]:
+    """Inverse of encode_cursor; ValueError for anything this API did not issue"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("malformed cursor")
+    if not isinstance(values, list) or len(values) != length:
+        raise ValueError("malformed cursor")
+    return values
+
+
+class Keyset:
+    """
+    Newest-first pages over (column, id): ORDER BY column DESC, id DESC and,
+    for the next page, WHERE (column, id) < (last value, last id), which is
+    an index range scan on an index ending in (column, id).
+
+    SQLite keeps datetimes as text in whatever format wrote them
+    (CURRENT_TIMESTAMP has no microseconds, SQLAlchemy always writes them),
+    so there the cursor carries and compares the stored text: a re-formatted
+    datetime would not equal the row it came from.
+    """
+
+    def __init__(self, column, id_column, nullable: bool = False):
+        self.column = column
+        self.id_column = id_column
+        self.nullable = nullable  # rows without a value come last
+        self.stored = type_coerce(column, String) if settings.is_sqlite else column
+
+    def columns(self):
+        """Select these next to the rows to build the cursor from the last one"""
+        return self.stored.label("keyset_value"), self.id_column.label("keyset_id")
+
+    def order_by(self):
+        return self.column.desc().nulls_last(), self.id_column.desc()
+
+    def after(self, cursor: str):
+        """WHERE clause for the rows following cursor; ValueError if it is not ours"""
+        value, last_id = decode_cursor(cursor, 2)
+        if not isinstance(last_id, str) or not isinstance(value, (str, type(None))):
+            raise ValueError("malformed cursor")
+        if value is None:
+            return and_(self.column.is_(None), self.id_column < last_id)
+        if not settings.is_sqlite:
+            value = datetime.fromisoformat(value)
+        following = tuple_(self.stored, self.id_column) < tuple_(literal(value, self.stored.type), last_id)
+        return or_(following, self.column.is_(None)) if self.nullable else following
+
+    def next_cursor(self, value, last_id: str) -> str:
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        return encode_cursor([value, last_id])
+
+    def page(self, query, cursor: Optional[str], limit: int):
+        """
+        Apply order, cursor and limit to a query that already selects
+        columns(); returns the rows of this page and the next cursor (None on
+        the last page). One extra row is read to tell whether there is more.
+        """
+        if cursor:
+            query = query.where(self.after(cursor))
+        rows = query.order_by(*self.order_by()).limit(limit + 1).all()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        last = rows[-1] if more else None
+        return rows, (self.next_cursor(last.keyset_value, last.keyset_id) if last is not None else None)
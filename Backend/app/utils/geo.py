@@ -0,0 +1,75 @@
+# File: app/utils/geo.py
+import math
+from typing import Optional, Sequence, Tuple, Union
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+ArrayLike = Union[Sequence[float], np.ndarray]
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two points in km (scalar version)"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+
+def _as_radians(values: ArrayLike) -> np.ndarray:
+    return np.radians(np.asarray(values, dtype=np.float64))
+
+
+def haversine_pairs(lat1: ArrayLike, lng1: ArrayLike, lat2: ArrayLike, lng2: ArrayLike) -> np.ndarray:
+    """Element-wise great-circle distance in km; inputs broadcast like NumPy arrays"""
+    lat1, lng1, lat2, lng2 = map(_as_radians, (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_matrix(origins: ArrayLike, targets: ArrayLike) -> np.ndarray:
+    """
+    Distance matrix in km between every origin and every target.
+
+    origins is an (n, 2) and targets an (m, 2) array of (lat, lng);
+    the result has shape (n, m). Rows with a NaN coordinate come back
+    as inf so they always rank last.
+    """
+    origins = np.atleast_2d(np.asarray(origins, dtype=np.float64)).reshape(-1, 2)
+    targets = np.atleast_2d(np.asarray(targets, dtype=np.float64)).reshape(-1, 2)
+
+    distances = haversine_pairs(
+        origins[:, 0:1], origins[:, 1:2],
+        targets[:, 0][np.newaxis, :], targets[:, 1][np.newaxis, :]
+    )
+    return np.where(np.isnan(distances), np.inf, distances)
+
+
+def rank_by_distance(
+    origins: ArrayLike,
+    targets: ArrayLike,
+    k: Optional[int] = None,
+    max_distance_km: Optional[float] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Distances plus per-origin target indices sorted nearest first.
+
+    Returns (distances, order), both (n, m) or (n, k) when k is given.
+    distances[i, j] is the distance from origin i to target order[i, j].
+    Targets beyond max_distance_km are reported as inf.
+    """
+    matrix = haversine_matrix(origins, targets)
+    if max_distance_km is not None:
+        matrix = np.where(matrix <= max_distance_km, matrix, np.inf)
+
+    m = matrix.shape[1]
+    if k is not None and k < m:
+        # Partition first so only the k best per row get fully sorted
+        candidates = np.argpartition(matrix, k - 1, axis=1)[:, :k]
+        candidate_distances = np.take_along_axis(matrix, candidates, axis=1)
+        inner = np.argsort(candidate_distances, axis=1, kind="stable")
+        order = np.take_along_axis(candidates, inner, axis=1)
+    else:
+        order = np.argsort(matrix, axis=1, kind="stable")
+
+    return np.take_along_axis(matrix, order, axis=1), order
@@ -0,0 +1,188 @@
+# File: app/utils/polyline.py
+import math
+import struct
+import zlib
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+from app.utils.geo import EARTH_RADIUS_KM
+
+Point = Tuple[float, float]
+
+# Metres per pixel at zoom 0 on the equator for 256px Web Mercator tiles
+METERS_PER_PIXEL_Z0 = 156543.03392
+
+# Packed geometry header: format version, point count
+GEOMETRY_VERSION = 1
+_GEOMETRY_HEADER = struct.Struct("<BI")
+GEOMETRY_SCALE = 1e5
+
+
+# -------------------------
+# GOOGLE ENCODED POLYLINE
+# -------------------------
+def encode(points: Sequence[Point], precision: int = 5) -> str:
+    """Google encoded polyline for (lat, lng) points"""
+    factor = 10 ** precision
+    chunks = []
+    prev_lat = prev_lng = 0
+    for lat, lng in points:
+        lat_i = int(round(lat * factor))
+        lng_i = int(round(lng * factor))
+        for delta in (lat_i - prev_lat, lng_i - prev_lng):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1F)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        prev_lat, prev_lng = lat_i, lng_i
+    return "".join(chunks)
+
+
+def decode(encoded: str, precision: int = 5) -> List[Point]:
+    """Inverse of encode(); raises ValueError on a truncated string"""
+    factor = 10 ** precision
+    points = []
+    index = lat = lng = 0
+    length = len(encoded)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                if index >= length:
+                    raise ValueError("Truncated polyline")
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append((lat / factor, lng / factor))
+    return points
+
+
+def parse_polyline(value: str) -> List[Point]:
+    """Decode an encoded polyline, or the legacy "lat,lng;lat,lng" form"""
+    # ',' is outside the encoded alphabet (ASCII 63-126)
+    if "," in value:
+        return [tuple(map(float, pair.split(","))) for pair in value.split(";") if pair]
+    return decode(value)
+
+
+# -------------------------
+# DOUGLAS-PEUCKER
+# -------------------------
+def simplify(points: Sequence[Point], tolerance_m: float) -> List[Point]:
+    """
+    Douglas-Peucker simplification with a tolerance in metres.
+
+    Points are projected onto a local equirectangular plane around the
+    line's mean latitude, which is accurate enough for city routes.
+    Endpoints are always kept.
+    """
+    if len(points) <= 2 or tolerance_m <= 0:
+        return list(points)
+
+    coords = np.asarray(points, dtype=np.float64)
+    scale = math.radians(1) * EARTH_RADIUS_KM * 1000
+    xy = np.column_stack((
+        coords[:, 1] * scale * math.cos(math.radians(coords[:, 0].mean())),
+        coords[:, 0] * scale
+    ))
+
+    xs, ys = xy[:, 0], xy[:, 1]
+    keep = np.zeros(len(xy), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(xy) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        x0, y0 = xs[start], ys[start]
+        dx, dy = xs[end] - x0, ys[end] - y0
+        length = math.hypot(dx, dy)
+        inner_x = xs[start + 1:end] - x0
+        inner_y = ys[start + 1:end] - y0
+        if length == 0:
+            distances = np.hypot(inner_x, inner_y)
+        else:
+            # Cross product / |segment|, compared without dividing every element
+            distances = np.abs(dx * inner_y - dy * inner_x)
+        worst = int(np.argmax(distances))
+        if distances[worst] > tolerance_m * (length or 1.0):
+            split = start + 1 + worst
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+
+    return [tuple(p) for p in coords[keep].tolist()]
+
+
+def tolerance_for_zoom(zoom: float, latitude: float, pixels: float = 1.0) -> float:
+    """Ground distance in metres covered by `pixels` screen pixels at a map zoom level"""
+    return METERS_PER_PIXEL_Z0 * math.cos(math.radians(latitude)) / (2 ** zoom) * pixels
+
+
+def simplify_for_zoom(points: Sequence[Point], zoom: Optional[float], pixels: float = 1.0) -> List[Point]:
+    """Drop detail that would not be visible at this zoom; None means full resolution"""
+    if zoom is None or len(points) <= 2:
+        return list(points)
+    latitude = sum(lat for lat, _ in points) / len(points)
+    return simplify(points, tolerance_for_zoom(zoom, latitude, pixels))
+
+
+# -------------------------
+# COMPACT BINARY STORAGE
+# -------------------------
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _unzigzag(value: int) -> int:
+    return (value >> 1) ^ -(value & 1)
+
+
+def pack_geometry(points: Sequence[Point]) -> bytes:
+    """Points as zigzag-varint deltas at 1e-5 degrees, zlib-compressed"""
+    body = bytearray()
+    prev_lat = prev_lng = 0
+    for lat, lng in points:
+        lat_i = int(round(lat * GEOMETRY_SCALE))
+        lng_i = int(round(lng * GEOMETRY_SCALE))
+        for delta in (lat_i - prev_lat, lng_i - prev_lng):
+            value = _zigzag(delta)
+            while value >= 0x80:
+                body.append((value & 0x7F) | 0x80)
+                value >>= 7
+            body.append(value)
+        prev_lat, prev_lng = lat_i, lng_i
+    return _GEOMETRY_HEADER.pack(GEOMETRY_VERSION, len(points)) + zlib.compress(bytes(body), 9)
+
+
+def unpack_geometry(blob: bytes) -> List[Point]:
+    version, count = _GEOMETRY_HEADER.unpack_from(blob)
+    if version != GEOMETRY_VERSION:
+        raise ValueError(f"Unsupported route geometry version {version}")
+    body = zlib.decompress(blob[_GEOMETRY_HEADER.size:])
+
+    points = []
+    index = lat = lng = 0
+    for _ in range(count):
+        deltas = []
+        for _ in range(2):
+            shift = value = 0
+            while True:
+                byte = body[index]
+                index += 1
+                value |= (byte & 0x7F) << shift
+                shift += 7
+                if byte < 0x80:
+                    break
+            deltas.append(_unzigzag(value))
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append((lat / GEOMETRY_SCALE, lng / GEOMETRY_SCALE))
+    return points
@@ -0,0 +1,50 @@
+# File: app/utils/single_flight.py
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical async calls.
+
+    The first caller for a key starts the computation as a task; everyone
+    who asks for the same key while it is in flight awaits that same
+    result (or exception) instead of starting their own. A caller that is
+    cancelled stops waiting but the computation runs on for the others.
+    Nothing is kept once the call finishes - caching is a separate concern.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.metrics = {"calls": 0, "executions": 0, "coalesced": 0, "errors": 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.metrics["calls"] += 1
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.metrics["coalesced"] += 1
+        else:
+            # The computation is its own task, owned by no caller: cancelling
+            # the first caller must not fail everyone waiting on it
+            self.metrics["executions"] += 1
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        # shield: a cancelled caller only stops waiting
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Reading the exception also keeps asyncio from warning when every caller left
+        if not task.cancelled() and task.exception() is not None:
+            self.metrics["errors"] += 1
+
+    def snapshot(self) -> Dict:
+        calls = self.metrics["calls"]
+        return {
+            **self.metrics,
+            "in_flight": len(self._in_flight),
+            "coalesced_rate": round(self.metrics["coalesced"] / calls, 3) if calls else None
+        }
@@ -0,0 +1,91 @@
+# File: app/utils/timer_wheel.py
+import math
+import time
+from typing import Dict, Hashable, List, Optional, Set
+
+
+class TimerWheel:
+    """
+    Hashed timing wheel of keyed deadlines.
+
+    A key sits in the slot of the tick its deadline falls on; advance()
+    only looks at the slots the clock moved past, so a tick costs the
+    keys due in it rather than every key held.
+
+    Re-arming is lazy: schedule() on a key that is already in the wheel
+    just moves its deadline later, and the key is re-slotted when its old
+    slot comes up. A key refreshed many times per TTL (a heartbeat) is
+    therefore touched in the wheel about once per TTL. Deadlines further
+    out than one revolution ride the wheel round until they are due.
+    """
+
+    def __init__(self, tick_seconds: float = 1.0, slots: int = 256, now: Optional[float] = None):
+        self.tick_seconds = tick_seconds
+        self._slots: List[Set[Hashable]] = [set() for _ in range(slots)]
+        self._deadlines: Dict[Hashable, float] = {}
+        # key -> absolute tick of the slot it sits in
+        self._due: Dict[Hashable, int] = {}
+        self._tick = self._tick_of(time.monotonic() if now is None else now)
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def __contains__(self, key: Hashable):
+        return key in self._deadlines
+
+    def _tick_of(self, t: float) -> int:
+        return math.floor(t / self.tick_seconds)
+
+    def _place(self, key: Hashable, deadline: float):
+        # Never in a slot that already went by: ceil, and at least the next tick
+        tick = max(math.ceil(deadline / self.tick_seconds), self._tick + 1)
+        self._due[key] = tick
+        self._slots[tick % len(self._slots)].add(key)
+
+    def schedule(self, key: Hashable, ttl_seconds: float, now: Optional[float] = None):
+        """Expire key ttl_seconds from now, replacing any earlier deadline"""
+        deadline = (time.monotonic() if now is None else now) + ttl_seconds
+        self._deadlines[key] = deadline
+        due = self._due.get(key)
+        if due is None:
+            self._place(key, deadline)
+        elif math.ceil(deadline / self.tick_seconds) < due:
+            # Sooner than the slot it sits in (a shorter TTL): move it up
+            self._slots[due % len(self._slots)].discard(key)
+            self._place(key, deadline)
+
+    def cancel(self, key: Hashable):
+        self._deadlines.pop(key, None)
+        due = self._due.pop(key, None)
+        if due is not None:
+            self._slots[due % len(self._slots)].discard(key)
+
+    def deadline(self, key: Hashable) -> Optional[float]:
+        return self._deadlines.get(key)
+
+    def advance(self, now: Optional[float] = None) -> List[Hashable]:
+        """Move the clock to now; returns (and forgets) every key that expired"""
+        now = time.monotonic() if now is None else now
+        target = self._tick_of(now)
+        if target <= self._tick:
+            return []
+
+        # After a long stall every slot is due once, never more
+        steps = min(target - self._tick, len(self._slots))
+        first = self._tick + 1
+        self._tick = target
+
+        expired = []
+        for tick in range(first, first + steps):
+            slot = self._slots[tick % len(self._slots)]
+            for key in [k for k in slot if self._due[k] <= target]:
+                slot.discard(key)
+                deadline = self._deadlines[key]
+                if deadline <= now:
+                    del self._deadlines[key]
+                    del self._due[key]
+                    expired.append(key)
+                else:
+                    # Refreshed since it was slotted
+                    self._place(key, deadline)
+        return expired
@@ -0,0 +1,178 @@
+# File: app/utils/ws_binary.py
+"""
+Binary WebSocket subprotocol "happyauto.bin.v1".
+
+Clients that offer it in Sec-WebSocket-Protocol get location and status
+frames as fixed little-endian structs; every other message stays a JSON
+text frame, so one connection can carry both.
+
+Every binary frame starts with (type: u8, flags: u8). With FLAG_DEFLATE
+the rest of the frame is zlib-compressed. Coordinates are int32 degrees
+x 1e7, times are epoch milliseconds, delivery ids are raw UUID bytes.
+
+    LOCATION_BATCH   client -> server  count: u16, base_ms: i64,
+                                       count x (lat: i32, lng: i32, offset_ms: u32)
+    LOCATION_ACK     server -> client  accepted: u16, server_ms: i64
+    DRIVER_LOCATION  server -> client  delivery: 16s, lat: i32, lng: i32, ts_ms: i64
+    STATUS           server -> client  code: u8, delivery: 16s
+    PING / PONG      either way        (header only)
+    ERROR            server -> client  code: u16, utf-8 message
+"""
+import struct
+import time
+import uuid
+import zlib
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+SUBPROTOCOL = "happyauto.bin.v1"
+
+LOCATION_BATCH = 0x01
+LOCATION_ACK = 0x02
+DRIVER_LOCATION = 0x03
+STATUS = 0x04
+PING = 0x05
+PONG = 0x06
+ERROR = 0x7F
+
+FLAG_DEFLATE = 0x01
+
+STATUS_TRACKING_ENDED = 1
+
+COORD_SCALE = 1e7
+MAX_BATCH = 1024
+# Frames shorter than this are not worth compressing
+DEFLATE_MIN_BYTES = 256
+# Upper bound for an inflated frame (a full batch is ~12 KB)
+MAX_FRAME_BYTES = 64 * 1024
+
+_HEADER = struct.Struct("<BB")
+_BATCH = struct.Struct("<Hq")
+_SAMPLE = struct.Struct("<iiI")
+_ACK = struct.Struct("<Hq")
+_DRIVER_LOCATION = struct.Struct("<16siiq")
+_STATUS = struct.Struct("<B16s")
+_ERROR = struct.Struct("<H")
+
+Sample = Tuple[float, float, float]  # lat, lng, epoch seconds
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+def _frame(kind: int, body: bytes = b"") -> bytes:
+    if len(body) >= DEFLATE_MIN_BYTES:
+        packed = zlib.compress(body, 6)
+        if len(packed) < len(body):
+            return _HEADER.pack(kind, FLAG_DEFLATE) + packed
+    return _HEADER.pack(kind, 0) + body
+
+
+def _coord(value: float) -> int:
+    return int(round(value * COORD_SCALE))
+
+
+# -------------------------
+# ENCODE
+# -------------------------
+def encode_location_batch(samples: List[Sample]) -> bytes:
+    if not 0 < len(samples) <= MAX_BATCH:
+        raise ProtocolError(f"batch must hold 1..{MAX_BATCH} samples")
+    base_ms = int(samples[0][2] * 1000)
+    body = [_BATCH.pack(len(samples), base_ms)]
+    for lat, lng, ts in samples:
+        body.append(_SAMPLE.pack(_coord(lat), _coord(lng), int(ts * 1000) - base_ms))
+    return _frame(LOCATION_BATCH, b"".join(body))
+
+
+def encode_ack(accepted: int, server_time: Optional[float] = None) -> bytes:
+    return _frame(LOCATION_ACK, _ACK.pack(accepted, int((server_time or time.time()) * 1000)))
+
+
+def encode_ping() -> bytes:
+    return _frame(PING)
+
+
+def encode_pong() -> bytes:
+    return _frame(PONG)
+
+
+def encode_error(code: int, message: str) -> bytes:
+    return _frame(ERROR, _ERROR.pack(code) + message.encode())
+
+
+def encode_message(message: Dict) -> Optional[bytes]:
+    """Binary form of a server message, or None if it only exists as JSON"""
+    kind = message.get("type")
+    try:
+        if kind == "driver_location":
+            ts = datetime.fromisoformat(message["timestamp"]).timestamp()
+            return _frame(DRIVER_LOCATION, _DRIVER_LOCATION.pack(
+                uuid.UUID(message["delivery_id"]).bytes,
+                _coord(message["lat"]), _coord(message["lng"]), int(ts * 1000)
+            ))
+        if kind == "tracking_ended":
+            return _frame(STATUS, _STATUS.pack(STATUS_TRACKING_ENDED, uuid.UUID(message["delivery_id"]).bytes))
+        if kind == "location_ack":
+            ts = datetime.fromisoformat(message["timestamp"]).timestamp()
+            return encode_ack(message.get("accepted", 1), ts)
+        if kind == "error":
+            return encode_error(message.get("code", 400), message.get("message", ""))
+        if kind == "pong":
+            return encode_pong()
+    except (KeyError, ValueError):
+        return None
+    return None
+
+
+# -------------------------
+# DECODE
+# -------------------------
+def decode(data: bytes) -> Dict:
+    """Parse one binary frame into a dict with a "type" key"""
+    if len(data) < _HEADER.size:
+        raise ProtocolError("frame too short")
+    kind, flags = _HEADER.unpack_from(data)
+    body = data[_HEADER.size:]
+    if flags & FLAG_DEFLATE:
+        inflater = zlib.decompressobj()
+        try:
+            body = inflater.decompress(body, MAX_FRAME_BYTES)
+        except zlib.error as e:
+            raise ProtocolError(f"bad deflate payload: {e}")
+        if inflater.unconsumed_tail:
+            raise ProtocolError("frame too large")
+
+    try:
+        if kind == LOCATION_BATCH:
+            count, base_ms = _BATCH.unpack_from(body)
+            if not 0 < count <= MAX_BATCH or len(body) != _BATCH.size + count * _SAMPLE.size:
+                raise ProtocolError("bad location batch length")
+            samples = [
+                (lat / COORD_SCALE, lng / COORD_SCALE, (base_ms + offset) / 1000)
+                for lat, lng, offset in _SAMPLE.iter_unpack(body[_BATCH.size:])
+            ]
+            return {"type": "location_batch", "samples": samples}
+        if kind == LOCATION_ACK:
+            accepted, server_ms = _ACK.unpack(body)
+            return {"type": "location_ack", "accepted": accepted, "server_ms": server_ms}
+        if kind == DRIVER_LOCATION:
+            delivery, lat, lng, ts_ms = _DRIVER_LOCATION.unpack(body)
+            return {
+                "type": "driver_location", "delivery_id": str(uuid.UUID(bytes=delivery)),
+                "lat": lat / COORD_SCALE, "lng": lng / COORD_SCALE, "ts_ms": ts_ms
+            }
+        if kind == STATUS:
+            code, delivery = _STATUS.unpack(body)
+            return {"type": "status", "code": code, "delivery_id": str(uuid.UUID(bytes=delivery))}
+        if kind == PING:
+            return {"type": "ping"}
+        if kind == PONG:
+            return {"type": "pong"}
+        if kind == ERROR:
+            (code,) = _ERROR.unpack_from(body)
+            return {"type": "error", "code": code, "message": body[_ERROR.size:].decode(errors="replace")}
+    except struct.error as e:
+        raise ProtocolError(f"bad frame body: {e}")
+    raise ProtocolError(f"unknown frame type {kind:#x}")
@@ -0,0 +1,218 @@
+# bench_async_db.py
+"""
+Mixed HTTP + WebSocket load against the API in one process, to see what
+database work on the event loop costs the sockets.
+
+Clients keep a steady stream of requests going (delivery lookups, /me,
+driver status writes, a booking and a login now and then) while
+WebSocket clients ping and time the pong. Any route that blocks the
+event loop on the database (or bcrypt) shows up as loop lag (how late a
+10 ms timer fires) and as fewer pings answered; the HTTP side reports
+requests per second and its own latencies.
+
+Runs the app through its ASGI interface (no server or client libraries
+needed) on a scratch SQLite file:
+
+    python bench_async_db.py --http-clients 32 --sockets 50 --seconds 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ.setdefault("DATABASE_ECHO", "false")
+os.environ.setdefault("LOCATION_HISTORY_DIR", tempfile.mkdtemp())
+os.environ.setdefault("ROUTE_CACHE_ENABLED", "false")
+os.environ.setdefault("DISPATCH_ENABLED", "false")
+os.environ.setdefault("WS_IDLE_TIMEOUT_SECONDS", "0")
+
+sys.path.append('.')
+import builtins
+
+say = builtins.print
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def summary(values):
+    return f"p50 {percentile(values, 50):7.1f} ms  p99 {percentile(values, 99):7.1f} ms  max {max(values or [0]):7.1f} ms"
+
+
+class Socket:
+    """A WebSocket client speaking raw ASGI to the app"""
+
+    def __init__(self, app, user_id, token=""):
+        self.app = app
+        self.scope = {
+            "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws", "http_version": "1.1",
+            "path": f"/ws/{user_id}", "raw_path": f"/ws/{user_id}".encode(), "root_path": "",
+            "query_string": f"token={token}".encode(), "headers": [], "client": ("bench", 0),
+            "server": ("bench", 80), "subprotocols": []
+        }
+        self.inbox = asyncio.Queue()
+        self.pongs = asyncio.Queue()
+        self.task = None
+
+    async def _receive(self):
+        return await self.inbox.get()
+
+    async def _send(self, message):
+        if message["type"] == "websocket.send" and '"pong"' in (message.get("text") or ""):
+            self.pongs.put_nowait(time.perf_counter())
+
+    async def open(self):
+        self.inbox.put_nowait({"type": "websocket.connect"})
+        self.task = asyncio.create_task(self.app(self.scope, self._receive, self._send))
+
+    async def ping(self):
+        started = time.perf_counter()
+        self.inbox.put_nowait({"type": "websocket.receive", "text": json.dumps({"type": "ping"})})
+        return (await self.pongs.get() - started) * 1000
+
+    async def close(self):
+        self.inbox.put_nowait({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(self.task, 5)
+
+
+async def run(args):
+    import httpx
+    from app.core import database
+    from app.mainCode import app
+    from app.models.delivery import Delivery
+
+    for engine in (getattr(database, "engine", None), getattr(database, "async_engine", None)):
+        if engine is not None:
+            engine.echo = False  # older trees echo every statement
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            async def register(email, user_type, **extra):
+                response = await client.post("/api/v1/auth/register", json={
+                    "email": email, "password": "secret123", "name": "Bench", "phone": str(abs(hash(email)))[:10],
+                    "user_type": user_type, **extra
+                })
+                body = response.json()
+                return body["access_token"], body["user"]["id"]
+
+            customers = [await register(f"bench-c{i}@x.com", "customer") for i in range(4)]
+            drivers = [
+                await register(f"bench-d{i}@x.com", "driver", driver_license_number=f"L{i}", vehicle_plate_number=f"KA{i}")
+                for i in range(4)
+            ]
+
+            db = database.SessionLocal()
+            delivery_ids = []
+            for n in range(args.deliveries):
+                token, customer_id = customers[n % len(customers)]
+                delivery = Delivery(
+                    id=str(uuid.uuid4()), customer_id=customer_id, pickup_address="p", pickup_lat=12.97,
+                    pickup_lng=77.59, dropoff_address="d", dropoff_lat=12.99, dropoff_lng=77.70, status="pending"
+                )
+                db.add(delivery)
+                delivery_ids.append((token, delivery.id))
+            db.commit()
+            db.close()
+
+            booking = {
+                "pickup_address": "a", "pickup_lat": 12.97, "pickup_lng": 77.59,
+                "dropoff_address": "b", "dropoff_lat": 12.99, "dropoff_lng": 77.70,
+                "vehicle_make": "M", "vehicle_model": "S", "vehicle_year": 2020, "vehicle_vin": "TBD"
+            }
+
+            def request_for(n):
+                token, delivery_id = delivery_ids[n % len(delivery_ids)]
+                kind = n % 20
+                if kind < 10:
+                    return "get delivery", client.get(f"/api/v1/deliveries/{delivery_id}", headers=auth(token))
+                if kind < 15:
+                    return "me", client.get("/api/v1/auth/me", headers=auth(token))
+                if kind < 18:
+                    driver_token = drivers[n % len(drivers)][0]
+                    return "driver status", client.put("/api/v1/deliveries/driver/status", headers=auth(driver_token),
+                                                       json={"is_available": bool(n % 2), "current_status": "online"})
+                if kind < 19:
+                    return "book", client.post("/api/v1/deliveries/book", headers=auth(token), json=booking)
+                return "login", client.post("/api/v1/auth/login",
+                                            json={"email": "bench-c0@x.com", "password": "secret123"})
+
+            def auth(token):
+                return {"Authorization": f"Bearer {token}"}
+
+            # One socket per user: a second socket for the same user replaces the first
+            sockets = []
+            for i in range(args.sockets):
+                socket = Socket(app, f"bench-ws-{i}", "")
+                await socket.open()
+                sockets.append(socket)
+            await asyncio.sleep(0.2)
+
+            stop = time.perf_counter() + args.seconds
+            http_ms, ping_ms, lag_ms, errors, counter = {}, [], [], [0], [0]
+
+            async def http_client():
+                while time.perf_counter() < stop:
+                    counter[0] += 1
+                    name, pending = request_for(counter[0])
+                    started = time.perf_counter()
+                    response = await pending
+                    http_ms.setdefault(name, []).append((time.perf_counter() - started) * 1000)
+                    if response.status_code >= 400:
+                        errors[0] += 1
+
+            async def pinger(socket):
+                while time.perf_counter() < stop:
+                    ping_ms.append(await socket.ping())
+                    await asyncio.sleep(args.ping_interval)
+
+            async def loop_lag():
+                while time.perf_counter() < stop:
+                    started = time.perf_counter()
+                    await asyncio.sleep(0.01)
+                    lag_ms.append((time.perf_counter() - started - 0.01) * 1000)
+
+            started = time.perf_counter()
+            await asyncio.gather(
+                *(http_client() for _ in range(args.http_clients)),
+                *(pinger(socket) for socket in sockets),
+                loop_lag()
+            )
+            elapsed = time.perf_counter() - started
+            for socket in sockets:
+                await socket.close()
+
+    total = sum(len(values) for values in http_ms.values())
+    say(f"HTTP: {total} requests in {elapsed:.1f}s = {total / elapsed:,.0f} req/s ({errors[0]} errors)")
+    for name, values in sorted(http_ms.items()):
+        say(f"  {name:<14} {len(values):6d}  {summary(values)}")
+    say(f"WS ping round-trip ({len(ping_ms)} pings over {len(sockets)} sockets)")
+    say(f"  {'pong':<14} {len(ping_ms):6d}  {summary(ping_ms)}")
+    say("Event loop lag")
+    say(f"  {'10 ms timer':<14} {len(lag_ms):6d}  {summary(lag_ms)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--http-clients", type=int, default=32)
+    parser.add_argument("--sockets", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--deliveries", type=int, default=2000)
+    parser.add_argument("--ping-interval", type=float, default=0.05)
+    args = parser.parse_args()
+
+    builtins.print = lambda *a, **k: None  # silence per-request logging
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
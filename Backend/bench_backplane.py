@@ -0,0 +1,115 @@
+# bench_backplane.py
+"""
+Messages per second through the WebSocket backplane across worker
+processes on one host.
+
+Each worker runs a ConnectionManager on a UnixSocketBackplane with its
+own set of (fake) connected users, then sends personal messages to
+users that live on the other workers. Delivery is counted when the
+frame has been written to the receiving socket.
+
+    python bench_backplane.py --workers 4 --users 250 --messages 20000
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append('.')
+
+
+class CountingSocket:
+    scope = {}
+
+    def __init__(self, counter):
+        self.counter = counter
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, text):
+        self.counter[0] += 1
+
+    async def close(self, code=1000):
+        pass
+
+
+def worker(index, args, path, ready, go, results):
+    from app.api.websocket import ConnectionManager
+    from app.services.backplane import UnixSocketBackplane
+
+    async def run():
+        received = [0]
+        manager = ConnectionManager(max_queue=100000, backplane=UnixSocketBackplane(path))
+        await manager.start()
+        for u in range(args.users):
+            await manager.connect(CountingSocket(received), f"w{index}-u{u}")
+        await asyncio.sleep(0.5)  # let subscriptions reach the broker
+        ready.release()
+        while not go.is_set():
+            await asyncio.sleep(0.01)
+
+        others = [w for w in range(args.workers) if w != index]
+        started = time.perf_counter()
+        for n in range(args.messages):
+            target = f"w{others[n % len(others)]}-u{n % args.users}"
+            await manager.send_personal_message({"type": "bench", "from": index, "n": n}, target)
+            if n % 256 == 0:
+                await manager.backplane.flush()
+        await manager.backplane.flush()
+        send_seconds = time.perf_counter() - started
+
+        # Messages the other workers address to this one
+        expected = 0
+        for sender in range(args.workers):
+            if sender != index:
+                targets = [w for w in range(args.workers) if w != sender]
+                expected += len(range(targets.index(index), args.messages, len(targets)))
+        deadline = time.perf_counter() + args.timeout
+        while received[0] < expected and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+        results.put((index, send_seconds, received[0], time.perf_counter() - started))
+        await asyncio.sleep(1)  # keep the broker up until everyone has drained
+        await manager.stop()
+
+    import builtins
+    builtins.print = lambda *a, **k: None  # silence per-connection logging
+    asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--users", type=int, default=250)
+    parser.add_argument("--messages", type=int, default=20000, help="sent by each worker")
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "backplane.sock")
+    ctx = multiprocessing.get_context("spawn")
+    ready, go, results = ctx.Semaphore(0), ctx.Event(), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(i, args, path, ready, go, results)) for i in range(args.workers)]
+    for p in procs:
+        p.start()
+    for _ in procs:
+        ready.acquire()
+
+    go.set()
+    rows = sorted(results.get(timeout=args.timeout + 30) for _ in procs)
+    for p in procs:
+        p.join()
+
+    total_sent = args.messages * args.workers
+    total_received = sum(r[2] for r in rows)
+    wall = max(r[3] for r in rows)
+    print(f"📡 {args.workers} workers x {args.users} users, {args.messages} messages sent per worker")
+    for index, send_seconds, received, elapsed in rows:
+        print(f"   worker {index}: sent in {send_seconds:.2f}s, received {received} in {elapsed:.2f}s")
+    print(f"   delivered {total_received}/{total_sent} in {wall:.2f}s -> {total_received / wall:,.0f} msg/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# conftest.py
+"""
+Shared setup for the offline test suite:
+
+    python -m pytest -q test_*.py
+
+Settings are read once at import, so the environment is fixed here,
+before any app module loads: one temporary SQLite database, no route
+cache file, no background dispatch. Each test module then starts from an
+empty database and freshly built process-wide services (driver index,
+pickup index, presence, tracking hub, sockets...), with any settings it
+needs overridden through a module-level marker:
+
+    pytestmark = pytest.mark.settings(PRESENCE_TTL_SECONDS=1)
+"""
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/tests.db"
+os.environ["DATABASE_ECHO"] = "false"
+os.environ["LOCATION_HISTORY_DIR"] = tempfile.mkdtemp()
+os.environ["ROUTE_CACHE_ENABLED"] = "false"
+os.environ["ROUTE_CACHE_DB_PATH"] = ""
+os.environ["ROAD_GRAPH_PATH"] = ""
+os.environ["DISPATCH_ENABLED"] = "false"
+
+from collections import namedtuple
+
+import pytest
+from sqlalchemy import event
+from fastapi.testclient import TestClient
+
+from app.api.websocket import manager
+from app.core.config import settings
+from app.core.database import Base, async_engine, create_tables, engine
+from app.mainCode import app
+from app.services.backplane import create_backplane
+from app.services.dispatch_service import dispatch_engine
+from app.services.driver_index import driver_index
+from app.services.location_history import location_history
+from app.services.location_ingest import location_ingestor
+from app.services.pickup_index import pending_pickups
+from app.services.presence import presence
+from app.services.route_cache import route_cache
+from app.services.tracking_hub import tracking_hub
+from app.services.trip_meter import trip_meters
+from app.services.user_events import user_events
+
+Account = namedtuple("Account", "headers id token")
+
+DELIVERY = {
+    "pickup_address": "a", "pickup_lat": 12.97, "pickup_lng": 77.59,
+    "dropoff_address": "b", "dropoff_lat": 12.99, "dropoff_lng": 77.70,
+    "vehicle_make": "M", "vehicle_model": "S", "vehicle_year": 2020, "vehicle_vin": "TBD"
+}
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "settings(**values): override app settings for the test module")
+
+
+def rebuild_services():
+    """Re-run each module singleton's constructor in place, from the current settings"""
+    driver_index.__init__(settings.DRIVER_INDEX_CELL_DEG)
+    pending_pickups.__init__(settings.DRIVER_INDEX_CELL_DEG)
+    tracking_hub.__init__(min_interval_seconds=settings.TRACKING_PUSH_INTERVAL_SECONDS)
+    presence.__init__(ttl_seconds=settings.PRESENCE_TTL_SECONDS, tick_seconds=settings.PRESENCE_TICK_SECONDS)
+    user_events.__init__(capacity=settings.WS_EVENT_LOG_SIZE, idle_ttl_seconds=settings.WS_EVENT_LOG_IDLE_HOURS * 3600)
+    location_ingestor.__init__(
+        flush_interval_seconds=settings.LOCATION_FLUSH_INTERVAL_SECONDS,
+        batch_size=settings.LOCATION_FLUSH_BATCH_SIZE,
+        max_lag_seconds=settings.LOCATION_MAX_LAG_SECONDS
+    )
+    location_history.__init__(
+        history_dir=settings.LOCATION_HISTORY_DIR or None,
+        capacity=settings.LOCATION_HISTORY_CAPACITY,
+        min_interval_seconds=settings.LOCATION_HISTORY_MIN_INTERVAL_SECONDS,
+        min_distance_m=settings.LOCATION_HISTORY_MIN_DISTANCE_M,
+        spill_points=settings.LOCATION_HISTORY_SPILL_POINTS,
+        spill_max_age_seconds=settings.LOCATION_HISTORY_SPILL_MAX_AGE_SECONDS,
+        segment_max_bytes=int(settings.LOCATION_HISTORY_SEGMENT_MAX_MB * 1024 * 1024),
+        retention_days=settings.LOCATION_HISTORY_RETENTION_DAYS
+    )
+    trip_meters.__init__(
+        max_speed_kmh=settings.TRIP_METER_MAX_SPEED_KMH,
+        jitter_m=settings.TRIP_METER_JITTER_M,
+        moving_speed_kmh=settings.TRIP_METER_MOVING_SPEED_KMH
+    )
+    route_cache.__init__(
+        grid_deg=settings.ROUTE_CACHE_GRID_DEG,
+        max_entries=settings.ROUTE_CACHE_MAX_ENTRIES,
+        ttl_seconds=settings.ROUTE_CACHE_TTL_SECONDS,
+        db_path=settings.ROUTE_CACHE_DB_PATH or None,
+        persistent_ttl_seconds=settings.ROUTE_CACHE_PERSISTENT_TTL_SECONDS
+    )
+    dispatch_engine.__init__(
+        window_seconds=settings.DISPATCH_WINDOW_SECONDS,
+        max_pickup_km=settings.DISPATCH_MAX_PICKUP_KM,
+        batch_size=settings.DISPATCH_BATCH_SIZE,
+        candidates_per_delivery=settings.DISPATCH_CANDIDATES_PER_DELIVERY,
+        auto_assign=settings.DISPATCH_AUTO_ASSIGN
+    )
+    manager.__init__(
+        max_queue=settings.WS_SEND_QUEUE_SIZE,
+        send_timeout_seconds=settings.WS_SEND_TIMEOUT_SECONDS,
+        slow_consumer_seconds=settings.WS_SLOW_CONSUMER_SECONDS,
+        backplane=create_backplane(settings.WS_BACKPLANE, settings.WS_BACKPLANE_SOCKET),
+        idle_timeout_seconds=settings.WS_IDLE_TIMEOUT_SECONDS
+    )
+
+
+def empty_database():
+    create_tables()
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+
+
+@pytest.fixture(scope="module", autouse=True)
+def fresh_state(request, tmp_path_factory):
+    """Per test module: marker settings applied, empty database, new services"""
+    marker = request.node.get_closest_marker("settings")
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(settings, "LOCATION_HISTORY_DIR", str(tmp_path_factory.mktemp("history")))
+        for name, value in (marker.kwargs if marker else {}).items():
+            patch.setattr(settings, name, value)
+        empty_database()
+        rebuild_services()
+        yield
+    rebuild_services()
+
+
+@pytest.fixture(scope="module")
+def client(fresh_state):
+    """The app with its lifespan running"""
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(scope="module")
+def register(client):
+    """register(email, user_type, **extra) -> Account(headers, id, token)"""
+    def register(email, user_type, **extra):
+        response = client.post("/api/v1/auth/register", json={
+            "email": email, "password": "secret123", "name": email.split("@")[0],
+            "phone": str(abs(hash(email)))[:10], "user_type": user_type, **extra
+        })
+        assert response.status_code == 200, response.text
+        body = response.json()
+        return Account({"Authorization": f"Bearer {body['access_token']}"}, body["user"]["id"], body["access_token"])
+    return register
+
+
+@pytest.fixture(scope="module")
+def book(client):
+    """book(account, **fields) -> the booked delivery"""
+    def book(account, **fields):
+        response = client.post("/api/v1/deliveries/book", headers=account.headers, json={**DELIVERY, **fields})
+        assert response.status_code == 200, response.text
+        return response.json()
+    return book
+
+
+@pytest.fixture(scope="session")
+def statements():
+    """statements(fn) -> [(sql, parameters)] fn ran, on the sync and async engines"""
+    def capture(fn):
+        seen = []
+        listener = lambda conn, cursor, statement, parameters, *rest: seen.append((statement, parameters))
+        engines = (engine, async_engine.sync_engine)
+        for e in engines:
+            event.listen(e, "before_cursor_execute", listener)
+        try:
+            fn()
+        finally:
+            for e in engines:
+                event.remove(e, "before_cursor_execute", listener)
+        return seen
+    return capture
@@ -0,0 +1,90 @@
+# fake_directions_server.py
+"""
+Local stand-in for the Google Directions API.
+
+Run it, point the backend at it and dial latency / failures up and down
+to see how routing behaves when Google is slow or down:
+
+    uvicorn fake_directions_server:app --port 8765
+    GOOGLE_MAPS_BASE_URL=http://127.0.0.1:8765 GOOGLE_MAPS_API_KEY=AIzaFAKE uvicorn main:app
+
+    curl -X POST localhost:8765/__control -H 'Content-Type: application/json' \
+         -d '{"latency_ms": 2500, "failure_rate": 0.3}'
+"""
+import asyncio
+import math
+import random
+from typing import Optional
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
+
+app = FastAPI(title="Fake Directions API")
+
+
+class Behaviour(BaseModel):
+    latency_ms: float = Field(0, ge=0)
+    jitter_ms: float = Field(0, ge=0)
+    failure_rate: float = Field(0, ge=0, le=1)
+    # Directions API status to return on failure ("OVER_QUERY_LIMIT", ...)
+    # or "HTTP_500" for a transport-level error
+    failure_status: str = "HTTP_500"
+
+
+behaviour = Behaviour()
+counters = {"requests": 0, "failures": 0}
+
+
+def _straight_line(origin: str, destination: str):
+    lat1, lng1 = map(float, origin.split(","))
+    lat2, lng2 = map(float, destination.split(","))
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2
+    meters = 6371000 * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a)) * 1.3
+    return meters, meters / (30 / 3.6)
+
+
+@app.get("/maps/api/directions/json")
+async def directions(origin: str, destination: str, key: Optional[str] = None, mode: str = "driving", alternatives: bool = False):
+    counters["requests"] += 1
+
+    delay = behaviour.latency_ms + random.uniform(0, behaviour.jitter_ms)
+    if delay:
+        await asyncio.sleep(delay / 1000)
+
+    if random.random() < behaviour.failure_rate:
+        counters["failures"] += 1
+        if behaviour.failure_status == "HTTP_500":
+            return JSONResponse({"error": "fake outage"}, status_code=500)
+        return {"status": behaviour.failure_status, "routes": []}
+
+    meters, seconds = _straight_line(origin, destination)
+    step = {
+        "html_instructions": "Head towards destination",
+        "distance": {"text": f"{meters / 1000:.1f} km", "value": int(meters)},
+        "duration": {"text": f"{seconds / 60:.0f} mins", "value": int(seconds)}
+    }
+    return {
+        "status": "OK",
+        "routes": [{
+            "legs": [{
+                "distance": step["distance"],
+                "duration": step["duration"],
+                "steps": [step]
+            }],
+            "overview_polyline": {"points": "fake_polyline"}
+        }]
+    }
+
+
+@app.post("/__control")
+def set_behaviour(update: Behaviour):
+    global behaviour
+    behaviour = update
+    return {"behaviour": behaviour.dict(), **counters}
+
+
+@app.get("/__control")
+def get_behaviour():
+    return {"behaviour": behaviour.dict(), **counters}
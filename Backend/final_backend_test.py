@@ -239,7 +239,7 @@ class BackendTester:
         print_result("Delivery History Access", success)
         
         if success:
-            deliveries = response.json()
+            deliveries = response.json()["items"]
             print(f"   Found {len(deliveries)} deliveries in history")
     
     def test_protected_endpoints(self):
@@ -0,0 +1,121 @@
+# test_backplane.py
+"""
+Offline check of cross-worker WebSocket delivery: two ConnectionManagers
+play two workers, over the in-process bus and over the Unix-socket
+broker (including a broker hand-over when the hosting worker stops).
+
+    python -m pytest -q test_backplane.py
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+from app.api.websocket import ConnectionManager
+from app.services.backplane import InProcessBackplane, InProcessBus, UnixSocketBackplane
+
+
+class FakeSocket:
+    scope = {}
+
+    def __init__(self):
+        self.received = []
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, text):
+        self.received.append(json.loads(text))
+
+    async def close(self, code=1000):
+        pass
+
+
+async def settle():
+    await asyncio.sleep(0.1)
+
+
+async def check_routing(a: ConnectionManager, b: ConnectionManager):
+    alice, bob, eve = FakeSocket(), FakeSocket(), FakeSocket()
+    await a.connect(alice, "alice", authenticated=True)
+    await b.connect(bob, "bob", authenticated=True)
+    await b.connect(eve, "eve")
+    await settle()
+
+    await a.send_personal_message({"type": "hello", "to": "bob"}, "bob")
+    await b.send_personal_message({"type": "hello", "to": "alice"}, "alice")
+    await a.broadcast({"type": "announcement"})
+    await a.send_personal_message({"type": "driver_location"}, "eve", private=True)
+    await settle()
+
+    assert [m["type"] for m in bob.received] == ["hello", "announcement"], bob.received
+    assert [m["type"] for m in alice.received] == ["announcement", "hello"], alice.received
+    assert [m["type"] for m in eve.received] == ["announcement"], eve.received
+    assert b.metrics["refused_private"] == 1
+
+    # Once bob leaves worker b, nothing more is routed there for him
+    b.disconnect("bob", bob)
+    await settle()
+    await a.send_personal_message({"type": "late"}, "bob")
+    await settle()
+    assert len(bob.received) == 2
+
+
+def unix_workers(path, count):
+    return [ConnectionManager(backplane=UnixSocketBackplane(path, reconnect_seconds=0.05)) for _ in range(count)]
+
+
+def test_inprocess_bus():
+    async def run():
+        bus = InProcessBus()
+        a = ConnectionManager(backplane=InProcessBackplane(bus))
+        b = ConnectionManager(backplane=InProcessBackplane(bus))
+        await a.start()
+        await b.start()
+        await check_routing(a, b)
+        await a.stop()
+        await b.stop()
+    asyncio.run(run())
+
+
+def test_unix_socket_broker():
+    async def run():
+        a, b = unix_workers(os.path.join(tempfile.mkdtemp(), "backplane.sock"), 2)
+        await a.start()
+        await b.start()
+        assert a.backplane.broker is not None and b.backplane.broker is None
+        await check_routing(a, b)
+        await a.stop()
+        await b.stop()
+    asyncio.run(run())
+
+
+def test_unix_broker_hand_over():
+    """The worker hosting the broker stops; a surviving one takes over"""
+    async def run():
+        path = os.path.join(tempfile.mkdtemp(), "backplane.sock")
+        a, b = unix_workers(path, 2)
+        await a.start()
+        await b.start()
+        await settle()
+        await a.stop()
+        c, = unix_workers(path, 1)
+        await c.start()
+        carol, dave = FakeSocket(), FakeSocket()
+        await b.connect(carol, "carol")
+        await c.connect(dave, "dave")
+        await asyncio.sleep(0.5)
+        assert (b.backplane.broker is None) != (c.backplane.broker is None)
+        await c.send_personal_message({"type": "hello"}, "carol")
+        await b.send_personal_message({"type": "hello"}, "dave")
+        await settle()
+        assert len(carol.received) == 1 and len(dave.received) == 1
+        await c.stop()
+        await b.stop()
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,150 @@
+# test_dispatch.py
+"""
+Offline check of batched dispatch: the Hungarian solver and
+DispatchEngine.solve against brute force over every assignment, busy
+drivers never taking a candidate slot, overlapping rounds skipped, and
+a booking cancelled mid-round left cancelled.
+
+    python -m pytest -q test_dispatch.py
+"""
+import itertools
+import sys
+
+import numpy as np
+import pytest
+from app.core.database import SessionLocal
+from app.models.delivery import Delivery
+from app.services.dispatch_service import INFEASIBLE_COST, DispatchEngine, dispatch_engine
+from app.services.driver_index import driver_index
+from app.services.tracking_hub import tracking_hub
+from app.utils.assignment import linear_sum_assignment
+from app.utils.geo import haversine_matrix
+
+PICKUP = (12.9716, 77.5946)
+
+
+def brute_force(cost):
+    """Cheapest total over every way to match min(rows, cols) pairs"""
+    n, m = cost.shape
+    if n > m:
+        return brute_force(cost.T)
+    return min(sum(cost[i, j] for i, j in enumerate(cols)) for cols in itertools.permutations(range(m), n))
+
+
+@pytest.mark.parametrize("shape", [(1, 1), (3, 3), (5, 5), (6, 6), (3, 7), (7, 3), (2, 6), (6, 4)])
+@pytest.mark.parametrize("seed", range(5))
+def test_assignment_matches_brute_force(shape, seed):
+    rng = np.random.default_rng(seed)
+    # Small integers make ties, which a wrong augmenting path gets wrong first
+    cost = rng.integers(0, 10, size=shape).astype(float) if seed % 2 else rng.uniform(0, 50, size=shape)
+    rows, cols = linear_sum_assignment(cost)
+    assert len(rows) == min(shape)
+    assert list(rows) == sorted(set(rows)) and len(set(cols)) == len(cols)
+    assert cost[rows, cols].sum() == pytest.approx(brute_force(cost))
+
+
+def test_assignment_edge_cases():
+    rows, cols = linear_sum_assignment(np.zeros((0, 3)))
+    assert len(rows) == len(cols) == 0
+    with pytest.raises(ValueError):
+        linear_sum_assignment(np.array([[1.0, np.inf]]))
+    with pytest.raises(ValueError):
+        linear_sum_assignment(np.zeros(3))
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_solve_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    engine = DispatchEngine(max_pickup_km=3.0)
+    pickups = PICKUP + rng.uniform(-0.04, 0.04, size=(int(rng.integers(1, 6)), 2))
+    coords = PICKUP + rng.uniform(-0.04, 0.04, size=(int(rng.integers(1, 6)), 2))
+    drivers = [{"id": f"d{i}", "current_location_lat": lat, "current_location_lng": lng} for i, (lat, lng) in enumerate(coords)]
+
+    result = engine.solve(pickups, drivers)
+
+    distances = haversine_matrix(pickups, coords)
+    feasible = distances <= engine.max_pickup_km
+    best = brute_force(np.where(feasible, distances, INFEASIBLE_COST))
+    most_pairs = min(len(pickups), len(drivers)) - int(best // INFEASIBLE_COST)
+    assert len(result["pairs"]) == most_pairs
+    assert result["pickup_km"] == pytest.approx(best % INFEASIBLE_COST)
+    assert all(distance <= engine.max_pickup_km for _, _, distance in result["pairs"])
+
+
+@pytest.fixture(scope="module")
+def fleet(client, register, book):
+    """Three drivers on a trip parked right at PICKUP, one idle driver ~2 km off, one new booking"""
+    customer = register("dispatch-c@x.com", "customer")
+    busy = []
+    for i in range(3):
+        driver = register(f"dispatch-b{i}@x.com", "driver", driver_license_number=f"LDB{i}", vehicle_plate_number=f"KADB{i}")
+        trip = book(customer)
+        assert client.post(f"/api/v1/deliveries/{trip['id']}/accept", headers=driver.headers).status_code == 200
+        busy.append(driver)
+    idle = register("dispatch-i@x.com", "driver", driver_license_number="LDI", vehicle_plate_number="KADI")
+
+    # The index can lag the trips table; dispatch must still skip them
+    for driver in busy:
+        driver_index.set_status(driver.id, True, *PICKUP)
+    driver_index.set_status(idle.id, True, PICKUP[0] + 0.018, PICKUP[1])
+    booking = book(customer, pickup_lat=PICKUP[0], pickup_lng=PICKUP[1])
+    return busy, idle, booking
+
+
+def suggested_driver(delivery_id):
+    db = SessionLocal()
+    try:
+        return db.get(Delivery, delivery_id).suggested_driver_id
+    finally:
+        db.close()
+
+
+def test_busy_drivers_do_not_take_candidate_slots(fleet):
+    busy, idle, booking = fleet
+    engine = DispatchEngine(max_pickup_km=5.0, candidates_per_delivery=1)
+    db = SessionLocal()
+    try:
+        result = engine.run_once(db)
+    finally:
+        db.close()
+    print(f"   round: {result}")
+    assert result["drivers"] == 1 and result["assignments"] == 1
+    assert suggested_driver(booking["id"]) == idle.id
+
+
+def test_overlapping_round_is_skipped(client, fleet):
+    with dispatch_engine._round_lock:
+        skipped = client.post("/api/v1/admin/dispatch/run").json()
+    print(f"   while a round runs: {skipped}")
+    assert skipped["skipped"] and dispatch_engine.metrics["skipped_rounds"] == 1
+    ran = client.post("/api/v1/admin/dispatch/run").json()
+    assert "skipped" not in ran and ran["deliveries"] == 1
+
+
+def test_cancel_during_a_round_is_not_reassigned(client, register, fleet, book):
+    busy, idle, booking = fleet
+    customer = register("dispatch-late@x.com", "customer")
+    # Closer to the idle driver than the fleet booking, so the solver picks it
+    late = book(customer, pickup_lat=PICKUP[0] + 0.017, pickup_lng=PICKUP[1])
+
+    class CancelWhileSolving(DispatchEngine):
+        def solve(self, pickups, drivers):
+            response = client.post(f"/api/v1/deliveries/{late['id']}/customer-cancel", headers=customer.headers)
+            assert response.status_code == 200
+            return super().solve(pickups, drivers)
+
+    engine = CancelWhileSolving(max_pickup_km=5.0, auto_assign=True)
+    db = SessionLocal()
+    try:
+        result = engine.run_once(db)
+        cancelled = db.get(Delivery, late["id"])
+        print(f"   round: {result} -> {cancelled.status}, driver={cancelled.driver_id}")
+        assert result["written"] == 1
+        assert cancelled.status == "cancelled" and cancelled.driver_id is None
+    finally:
+        db.close()
+    assert late["id"] not in tracking_hub._topics
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,109 @@
+# test_driver_index.py
+"""
+Offline check of the grid index behind nearest-driver lookups: ring
+search answers match a brute-force sort by distance for any k, radius,
+cell size and latitude, paging with `after` walks the same order, and
+moves and removals are seen right away.
+
+    python -m pytest -q test_driver_index.py
+"""
+import random
+import sys
+
+import pytest
+from app.services.driver_index import DriverIndex, GeoGridIndex
+from app.utils.geo import haversine_km
+
+
+def scatter(index, n, center, spread_deg, seed):
+    rng = random.Random(seed)
+    points = {}
+    for i in range(n):
+        lat = center[0] + rng.uniform(-spread_deg, spread_deg)
+        lng = center[1] + rng.uniform(-spread_deg, spread_deg)
+        points[f"p{i:04d}"] = (lat, lng)
+        index.upsert(f"p{i:04d}", lat, lng)
+    return points
+
+
+def brute_force(points, query, k=None, max_distance_km=None, exclude=()):
+    ranked = sorted(
+        (haversine_km(*query, *position), point_id)
+        for point_id, position in points.items() if point_id not in exclude
+    )
+    if max_distance_km is not None:
+        ranked = [(d, p) for d, p in ranked if d <= max_distance_km]
+    return [(p, d) for d, p in ranked[:k]]
+
+
+# (center, cell size, spread) - a city, a coarse grid, and far north where cells narrow
+LAYOUTS = [((12.97, 77.59), 0.01, 0.2), ((12.97, 77.59), 0.05, 0.3), ((64.14, -21.94), 0.01, 0.2)]
+
+
+@pytest.mark.parametrize("center, cell_deg, spread", LAYOUTS, ids=["city", "coarse", "north"])
+def test_nearest_matches_brute_force(center, cell_deg, spread):
+    index = GeoGridIndex(cell_deg)
+    points = scatter(index, 600, center, spread, seed=int(cell_deg * 1000))
+    rng = random.Random(1)
+    queries = [(center[0] + rng.uniform(-spread, spread), center[1] + rng.uniform(-spread, spread)) for _ in range(25)]
+    # Far outside the populated area too
+    queries.append((center[0] + 1.0, center[1] - 1.0))
+    for query in queries:
+        for k, radius in ((1, None), (5, None), (20, 3.0), (50, 8.0), (700, None)):
+            got = index.nearest(*query, k=k, max_distance_km=radius)
+            want = brute_force(points, query, k, radius)
+            assert [p for p, _ in got] == [p for p, _ in want], (query, k, radius)
+            assert [d for _, d in got] == pytest.approx([d for _, d in want])
+
+
+def test_paging_walks_the_same_order():
+    index = GeoGridIndex(0.01)
+    points = scatter(index, 300, (12.97, 77.59), 0.1, seed=5)
+    query = (12.99, 77.61)
+    pages, after = [], None
+    while True:
+        page = index.nearest(*query, k=7, max_distance_km=6.0, after=after)
+        if not page:
+            break
+        pages.append(page)
+        after = (page[-1][1], page[-1][0])
+    walked = [p for page in pages for p, _ in page]
+    assert walked == [p for p, _ in brute_force(points, query, max_distance_km=6.0)]
+
+
+def test_exclude_does_not_use_up_k():
+    index = GeoGridIndex(0.01)
+    points = scatter(index, 200, (12.97, 77.59), 0.05, seed=9)
+    query = (12.97, 77.59)
+    nearest_ten = {p for p, _ in brute_force(points, query, 10)}
+    got = index.nearest(*query, k=5, exclude=nearest_ten)
+    assert [p for p, _ in got] == [p for p, _ in brute_force(points, query, 5, exclude=nearest_ten)]
+
+
+def test_within_radius_matches_brute_force():
+    index = GeoGridIndex(0.01)
+    points = scatter(index, 400, (12.97, 77.59), 0.15, seed=3)
+    for radius in (0.5, 2.0, 7.5):
+        got = index.within_radius(12.95, 77.62, radius)
+        assert [p for p, _ in got] == [p for p, _ in brute_force(points, (12.95, 77.62), max_distance_km=radius)]
+
+
+def test_moves_and_removals():
+    index = DriverIndex(0.01)
+    index.set_status("near", True, 12.970, 77.590, rating=4.5)
+    index.set_status("far", True, 13.020, 77.620)
+    assert [d["id"] for d in index.nearest((12.97, 77.59), k=2)] == ["near", "far"]
+
+    assert index.update_location("far", 12.9701, 77.5901)
+    assert index.update_location("nobody", 12.97, 77.59) is False
+    nearest = index.nearest((12.9701, 77.5901), k=1)[0]
+    assert nearest["id"] == "far" and nearest["current_location_lat"] == 12.9701
+
+    index.set_status("far", False)
+    assert [d["id"] for d in index.nearest((12.97, 77.59), k=5)] == ["near"]
+    index.remove("near")
+    assert index.nearest((12.97, 77.59), k=5) == [] and len(index) == 0
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
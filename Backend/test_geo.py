@@ -0,0 +1,84 @@
+# test_geo.py
+"""
+Offline check of the haversine kernels: known distances, the vectorized
+forms agreeing with the scalar one, and rank_by_distance agreeing with a
+plain sort on both its full-sort and partition paths.
+
+    python -m pytest -q test_geo.py
+"""
+import math
+import sys
+
+import numpy as np
+import pytest
+from app.utils.geo import EARTH_RADIUS_KM, KM_PER_DEGREE, haversine_km, haversine_matrix, haversine_pairs, rank_by_distance
+
+
+@pytest.mark.parametrize("a, b, km", [
+    ((0, 0), (0, 0), 0.0),
+    ((0, 0), (1, 0), KM_PER_DEGREE),
+    ((0, 0), (0, 90), math.pi / 2 * EARTH_RADIUS_KM),
+    ((10, 20), (-10, -160), math.pi * EARTH_RADIUS_KM),
+    ((90, 0), (-90, 0), math.pi * EARTH_RADIUS_KM),
+    # Across the antimeridian is the short way round
+    ((0, 179.5), (0, -179.5), KM_PER_DEGREE),
+])
+def test_known_distances(a, b, km):
+    # asin is ill-conditioned next to antipodes, so allow a few ulps of relative error
+    assert haversine_km(*a, *b) == pytest.approx(km, rel=1e-7, abs=1e-9)
+    assert haversine_km(*b, *a) == pytest.approx(km, rel=1e-7, abs=1e-9)
+
+
+def test_bangalore_to_chennai():
+    # ~290 km great-circle between the city centres
+    assert haversine_km(12.9716, 77.5946, 13.0827, 80.2707) == pytest.approx(290.2, abs=0.5)
+
+
+def test_vector_forms_match_the_scalar():
+    rng = np.random.default_rng(0)
+    origins = np.column_stack((rng.uniform(-80, 80, 40), rng.uniform(-180, 180, 40)))
+    targets = np.column_stack((rng.uniform(-80, 80, 30), rng.uniform(-180, 180, 30)))
+
+    pairs = haversine_pairs(origins[:30, 0], origins[:30, 1], targets[:, 0], targets[:, 1])
+    assert pairs == pytest.approx([haversine_km(*o, *t) for o, t in zip(origins[:30], targets)])
+
+    matrix = haversine_matrix(origins, targets)
+    assert matrix.shape == (40, 30)
+    expected = [[haversine_km(*o, *t) for t in targets] for o in origins]
+    assert np.allclose(matrix, expected, rtol=1e-12, atol=1e-9)
+    # Broadcasting one point against many gives the same row
+    assert np.allclose(haversine_pairs(origins[0, 0], origins[0, 1], targets[:, 0], targets[:, 1]), matrix[0])
+
+
+def test_matrix_shapes_and_missing_coordinates():
+    assert haversine_matrix((12.97, 77.59), [(12.98, 77.60)]).shape == (1, 1)
+    matrix = haversine_matrix([(12.97, 77.59), (float("nan"), 77.59)], [(12.98, 77.60), (12.99, 77.61)])
+    assert np.isfinite(matrix[0]).all() and np.isinf(matrix[1]).all()
+
+
+@pytest.mark.parametrize("k", [None, 1, 5, 29, 30, 50])
+@pytest.mark.parametrize("max_distance_km", [None, 20.0])
+def test_rank_matches_a_plain_sort(k, max_distance_km):
+    rng = np.random.default_rng(7)
+    center = np.array([12.97, 77.59])
+    origins = center + rng.uniform(-0.2, 0.2, size=(12, 2))
+    targets = center + rng.uniform(-0.2, 0.2, size=(30, 2))
+    distances, order = rank_by_distance(origins, targets, k=k, max_distance_km=max_distance_km)
+    width = min(k, 30) if k is not None else 30
+    assert distances.shape == order.shape == (12, width)
+
+    matrix = haversine_matrix(origins, targets)
+    for i in range(len(origins)):
+        row = [matrix[i, j] if max_distance_km is None or matrix[i, j] <= max_distance_km else math.inf for j in range(30)]
+        expected = sorted(row)[:width]
+        assert list(distances[i]) == pytest.approx(expected)
+        # order points at targets with exactly those distances
+        assert [row[j] for j in order[i]] == pytest.approx(expected)
+        assert len(set(order[i].tolist())) == width
+    if max_distance_km is not None and width == 30:
+        # Targets out of range still rank, last, at infinity
+        assert np.isinf(distances).any()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,134 @@
+# test_keyset_pages.py
+"""
+Offline check of cursor pagination on the list endpoints: walking
+next_cursor returns every row exactly once, newest first, even with many
+rows sharing a timestamp, and each page is an index range scan.
+
+    python -m pytest -q test_keyset_pages.py
+"""
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+from app.core.database import SessionLocal, engine
+from app.models.delivery import Delivery
+
+
+def seed(customer_id, driver_id):
+    """
+    created_at: 40 rows from the server default (same second, stored
+    without microseconds) and 20 set from Python (stored with them).
+    Completed rows: 5 of them without actual_delivery.
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        for n in range(60):
+            status = "completed" if n % 2 == 0 else ("pending", "assigned", "in_transit")[n % 3]
+            db.add(Delivery(
+                id=str(uuid.uuid4()), customer_id=customer_id, driver_id=None if status == "pending" else driver_id,
+                pickup_address="p", pickup_lat=12.97, pickup_lng=77.59, dropoff_address="d",
+                dropoff_lat=12.99, dropoff_lng=77.70, status=status,
+                created_at=now - timedelta(seconds=n % 3) if n >= 40 else None,
+                actual_delivery=now - timedelta(minutes=n % 4) if status == "completed" and n >= 10 else None
+            ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def walk(client, path, headers, limit):
+    pages, cursor = [], None
+    while True:
+        response = client.get(path, headers=headers, params={"limit": limit, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200, response.text
+        body = response.json()
+        pages.append(body["items"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return pages
+        assert len(pages) < 100, "cursor is not advancing"
+
+
+def explain(statement, parameters):
+    with engine.connect() as conn:
+        raw = conn.connection.driver_connection
+        return [row[3] for row in raw.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+
+
+@pytest.fixture(scope="module")
+def accounts(register):
+    customer = register("pages-c@x.com", "customer")
+    driver = register("pages-d@x.com", "driver", driver_license_number="LP", vehicle_plate_number="KAP")
+    for i in range(11):
+        register(f"pages-c{i}@x.com", "customer")
+    seed(customer.id, driver.id)
+    return {"customer": customer, "driver": driver}
+
+
+# (name, path, who asks, timestamp the rows come newest first by)
+CASES = [
+    ("my-deliveries-customer", "/api/v1/deliveries/my-deliveries", "customer", "created_at"),
+    ("my-deliveries-driver", "/api/v1/deliveries/my-deliveries", "driver", "created_at"),
+    ("completed", "/api/v1/deliveries/completed", "customer", "created_at"),
+    ("driver-completed", "/api/v1/deliveries/driver/completed", "driver", None),
+]
+
+
+@pytest.mark.parametrize("name, path, who, key", CASES, ids=[case[0] for case in CASES])
+def test_every_row_once_newest_first(client, accounts, name, path, who, key):
+    db = SessionLocal()
+    customer_id, driver_id = accounts["customer"].id, accounts["driver"].id
+    expected = {
+        "my-deliveries-customer": db.query(Delivery).filter(Delivery.customer_id == customer_id,
+                                                            Delivery.status != "completed").count() + 30,
+        "my-deliveries-driver": db.query(Delivery).filter(Delivery.driver_id == driver_id).count(),
+        "completed": 30,
+        "driver-completed": 30,
+    }[name]
+    db.close()
+
+    pages = walk(client, path, accounts[who].headers, 7)
+    items = [item for page in pages for item in page]
+    ids = [item["id"] for item in items]
+    print(f"   {name:<28} {len(items)} rows in {len(pages)} pages")
+    assert len(ids) == len(set(ids)) == expected
+    assert all(len(page) <= 7 for page in pages) and all(pages)
+    if key:
+        stamps = [item[key] for item in items]
+        assert stamps == sorted(stamps, reverse=True)
+
+
+@pytest.mark.parametrize("path, count", [("/api/v1/admin/customers", 12), ("/api/v1/admin/drivers", 1)])
+def test_admin_lists(client, accounts, path, count):
+    pages = walk(client, path, {}, 5)
+    ids = [item["id"] for page in pages for item in page]
+    print(f"   {path:<28} {len(ids)} rows in {len(pages)} pages")
+    assert len(ids) == len(set(ids)) == count
+
+
+def test_pages_are_index_range_scans(client, accounts, statements):
+    customer = accounts["customer"]
+    first = client.get("/api/v1/deliveries/completed", headers=customer.headers, params={"limit": 7}).json()
+    seen = statements(lambda: client.get("/api/v1/deliveries/completed", headers=customer.headers,
+                                         params={"limit": 7, "cursor": first["next_cursor"]}))
+    page_plan = next(explain(*query) for query in seen if "FROM deliveries" in query[0])
+    print(f"   {page_plan}")
+    assert any("ix_deliveries_customer_status" in step and "<(?,?)" in step for step in page_plan)
+    assert not any("TEMP B-TREE" in step for step in page_plan)
+    with engine.connect() as conn:
+        names = {row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'"))}
+    assert {"ix_deliveries_customer_created", "ix_deliveries_driver_created",
+            "ix_deliveries_driver_status", "ix_users_created"} <= names
+
+
+@pytest.mark.parametrize("path, who", [("/api/v1/deliveries/completed", "customer"), ("/api/v1/admin/drivers", None)])
+def test_bad_cursor(client, accounts, path, who):
+    headers = accounts[who].headers if who else {}
+    assert client.get(path, headers=headers, params={"cursor": "nope"}).status_code == 400
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,109 @@
+# test_list_queries.py
+"""
+Offline check that the delivery list endpoints load drivers, their users
+and customers with the deliveries: the number of queries per request is
+the same for a handful of deliveries as for a few hundred.
+
+    python -m pytest -q test_list_queries.py
+"""
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from app.core.database import SessionLocal
+from app.models.customer import Customer
+from app.models.delivery import Delivery
+from app.models.driver import Driver
+from app.models.user import User
+from app.services.pickup_index import pending_pickups
+
+DRIVER_AT = (12.9716, 77.5946)
+
+# (endpoint, who asks, extra query params)
+LISTS = [
+    ("/api/v1/deliveries/my-deliveries", "customer", {}),
+    ("/api/v1/deliveries/my-deliveries", "driver", {}),
+    ("/api/v1/deliveries/completed", "customer", {}),
+    ("/api/v1/deliveries/driver/completed", "driver", {}),
+    ("/api/v1/deliveries/unassigned", "driver", {"lat": DRIVER_AT[0], "lng": DRIVER_AT[1], "limit": 100}),
+]
+
+
+def seed(customer_id, driver_id, count):
+    """
+    Half the deliveries are the customer's, each with its own driver; the
+    other half are the driver's, each for its own customer. So a lazy load
+    per row would show up as extra queries.
+    """
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        for n in range(count):
+            other = User(
+                name=f"lists-{uuid.uuid4().hex[:8]}", email=f"{uuid.uuid4().hex}@x.com",
+                phone=uuid.uuid4().hex[:15], password_hash="x", user_type="driver" if n % 2 == 0 else "customer"
+            )
+            db.add(other)
+            db.flush()
+            if n % 2 == 0:
+                db.add(Driver(id=other.id, vehicle_number=f"KA{other.id[:8]}"))
+                owner, assignee = customer_id, other.id
+            else:
+                db.add(Customer(id=other.id))
+                owner, assignee = other.id, driver_id
+            status = ("completed", "completed", "in_transit", "in_transit", "assigned", "assigned", "pending", "pending")[n % 8]
+            db.add(Delivery(
+                id=str(uuid.uuid4()), customer_id=owner, pickup_address="p",
+                pickup_lat=DRIVER_AT[0] + n * 1e-4, pickup_lng=DRIVER_AT[1], dropoff_address="d",
+                dropoff_lat=12.99, dropoff_lng=77.70, status=status,
+                driver_id=None if status == "pending" else assignee,
+                actual_delivery=now - timedelta(minutes=n) if status == "completed" else None
+            ))
+        db.commit()
+        pending_pickups.load(db)
+    finally:
+        db.close()
+
+
+def get(client, statements, path, headers, params):
+    """(queries run, items) for one list request"""
+    responses = []
+    queries = len(statements(lambda: responses.append(client.get(path, headers=headers, params=params))))
+    assert responses[0].status_code == 200, responses[0].text
+    body = responses[0].json()
+    return queries, body["items"] if isinstance(body, dict) else body
+
+
+@pytest.fixture(scope="module")
+def small(client, register, statements):
+    """Accounts, plus (queries, rows) per list with 16 deliveries; then 240 more are seeded"""
+    customer = register("lists-c@x.com", "customer")
+    driver = register("lists-d@x.com", "driver", driver_license_number="LL", vehicle_plate_number="KAL")
+    accounts = {"customer": customer, "driver": driver}
+    seed(customer.id, driver.id, 16)
+    counts = {
+        (path, who): get(client, statements, path, accounts[who].headers, params)
+        for path, who, params in LISTS
+    }
+    seed(customer.id, driver.id, 240)
+    return accounts, counts
+
+
+@pytest.mark.parametrize("path, who, params", LISTS, ids=[f"{path.rsplit('/', 1)[1]}-{who}" for path, who, _ in LISTS])
+def test_queries_do_not_grow_with_rows(client, statements, small, path, who, params):
+    accounts, counts = small
+    before_queries, before_items = counts[(path, who)]
+    queries, items = get(client, statements, path, accounts[who].headers, params)
+    print(f"   {path} as {who}: {len(before_items)} -> {len(items)} rows, {before_queries} -> {queries} queries")
+    assert len(items) > len(before_items)
+    assert queries == before_queries <= 3, f"{path} as {who}: {before_queries} -> {queries} queries"
+
+    # The driver and customer details did come back
+    assigned = [item for item in items if item["driver_id"]]
+    assert all(item["assigned_driver"]["name"].startswith("lists-") for item in assigned)
+    assert all(item["customer"]["name"].startswith("lists-") for item in items)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,125 @@
+# test_location_history.py
+"""
+Offline check of driver location history: ring buffers that grow, wrap
+and count what they overwrite before a spill, segment blocks that read
+back exactly what was written (also from a fresh process), and trail()
+merging disk and memory without gaps or duplicates.
+
+    python -m pytest -q test_location_history.py
+"""
+import os
+import sys
+import time
+
+import pytest
+from app.services.location_history import INITIAL_TRACK_POINTS, LocationHistory
+
+# An hour ago: segments are only read for windows that end after their last write
+START = time.time() - 3600
+
+
+def pings(n, start=START, every=10.0, lat=12.9, lng=77.5):
+    """n points 10 s and ~110 m apart (exact in microdegrees and milliseconds)"""
+    return [(round(lat + i * 0.001, 6), round(lng + i * 0.0005, 6), start + i * every) for i in range(n)]
+
+
+def history(tmp_path, **options):
+    return LocationHistory(
+        history_dir=str(tmp_path), min_interval_seconds=0, min_distance_m=0, spill_max_age_seconds=3600, **options
+    )
+
+
+def record(target, driver_id, points):
+    for lat, lng, ts in points:
+        target.record(driver_id, lat, lng, ts)
+
+
+def same_points(trail, expected):
+    return len(trail) == len(expected) and all(
+        got[:2] == pytest.approx(want[:2], abs=1e-9) and got[2] == pytest.approx(want[2], abs=1e-3)
+        for got, want in zip(trail, expected)
+    )
+
+
+def test_ring_grows_then_wraps(tmp_path):
+    target = history(tmp_path, capacity=100)
+    record(target, "d1", pings(INITIAL_TRACK_POINTS))
+    assert target.get_metrics()["memory_bytes"] == INITIAL_TRACK_POINTS * 12
+    record(target, "d1", pings(50, start=START + 1000))
+    metrics = target.get_metrics()
+    print(f"   after {INITIAL_TRACK_POINTS + 50} points: {metrics['points_in_memory']} kept, {metrics['memory_bytes']} bytes")
+    assert metrics["points_in_memory"] == 100 and metrics["memory_bytes"] == 100 * 12
+    assert metrics["overwritten_unspilled"] == INITIAL_TRACK_POINTS + 50 - 100
+
+
+def test_overwrite_without_spill_loses_the_oldest(tmp_path):
+    target = history(tmp_path, capacity=8)
+    points = pings(12)
+    record(target, "d1", points)
+    assert target.get_metrics()["overwritten_unspilled"] == 4
+    assert same_points(target.trail("d1", START, START + 1000), points[4:])
+
+
+def test_spilling_in_time_keeps_everything(tmp_path):
+    target = history(tmp_path, capacity=8)
+    points = pings(12)
+    for i in range(0, 12, 4):
+        record(target, "d1", points[i:i + 4])
+        target.spill(force=True)
+    metrics = target.get_metrics()
+    print(f"   spills={metrics['spills']} points_spilled={metrics['points_spilled']} bytes={metrics['bytes_spilled']}")
+    assert metrics["overwritten_unspilled"] == 0 and metrics["points_spilled"] == 12
+    assert same_points(target.trail("d1", START, START + 1000), points)
+
+
+def test_segment_blocks_round_trip(tmp_path):
+    writer = history(tmp_path)
+    first, second = pings(30), pings(20, lat=13.1, lng=77.7)
+    # Interleaved drivers land in separate blocks of the same segment
+    record(writer, "driver-one", first[:15])
+    record(writer, "driver-two", second)
+    writer.spill(force=True)
+    record(writer, "driver-one", first[15:])
+    writer.spill(force=True)
+
+    segments = [name for name in os.listdir(tmp_path) if name.endswith(".seg")]
+    assert len(segments) == 1
+    index = writer._index(str(tmp_path / segments[0]))
+    assert [(key, count) for key, _, _, _, count in index] == [("driver-one", 15), ("driver-two", 20), ("driver-one", 15)]
+    key, base_ms, span_ms, _, _ = index[2]
+    assert base_ms == int(first[15][2] * 1000) and span_ms == 140_000
+
+    # A fresh process has nothing in memory and reads the segment alone
+    reader = history(tmp_path)
+    assert same_points(reader.trail("driver-one", START, START + 1000), first)
+    assert same_points(reader.trail("driver-two", START + 50, START + 100), second[5:11])
+    assert reader.trail("driver-three", START, START + 1000) == []
+
+
+def test_trail_merges_disk_and_memory(tmp_path):
+    target = history(tmp_path, capacity=16)
+    points = pings(24)
+    record(target, "d1", points[:14])
+    target.spill(force=True)
+    # The ring now holds 6 spilled + 10 unspilled points; 8 live only on disk
+    record(target, "d1", points[14:])
+    trail = target.trail("d1", START, START + 1000)
+    print(f"   trail: {len(trail)} points, ring holds {target.get_metrics()['points_in_memory']}")
+    assert same_points(trail, points)
+    assert same_points(target.trail("d1", START + 45, START + 175), points[5:18])
+
+
+def test_thinning(tmp_path):
+    target = LocationHistory(history_dir=str(tmp_path), min_interval_seconds=5, min_distance_m=10)
+    target.record("d1", 12.9, 77.5, START)
+    target.record("d1", 12.901, 77.5, START + 2)        # too soon
+    target.record("d1", 12.90001, 77.5, START + 30)     # ~1 m: parked
+    target.record("d1", 12.90001, 77.5, START + 61)     # parked for a minute: keep one
+    target.record("d1", 12.901, 77.5, START + 70)       # moved
+    kept = [ts - START for _, _, ts in target.trail("d1", START, START + 100)]
+    assert kept == pytest.approx([0, 61, 70], abs=1e-3)
+    assert target.get_metrics()["thinned"] == 2
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,112 @@
+# test_migrations.py
+"""
+Offline check of the versioned schema migrations: a database from before
+versioning (missing a column, with the old index set) upgrades to exactly
+the schema a fresh database gets from the models, so does an empty one
+built by the scripts alone, and upgrading again does nothing.
+
+    python -m pytest -q test_migrations.py
+"""
+import sys
+import tempfile
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from app.core.database import Base
+from app.migrations import applied, available, upgrade
+
+VERSIONED_INDEXES = (
+    "ix_deliveries_customer_created", "ix_deliveries_driver_created", "ix_deliveries_customer_status",
+    "ix_deliveries_driver_status", "ix_deliveries_status_driver", "ix_deliveries_unassigned",
+    "ix_drivers_available_located", "ix_users_created",
+)
+
+
+def new_engine(name):
+    return create_engine(f"sqlite:///{tempfile.mkdtemp()}/{name}.db")
+
+
+def legacy_database():
+    """What create_all() plus the old patch-ups left behind"""
+    engine = new_engine("legacy")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for index in VERSIONED_INDEXES:
+            conn.execute(text(f"DROP INDEX {index}"))
+        conn.execute(text("CREATE INDEX ix_deliveries_driver_delivered ON deliveries (driver_id, actual_delivery, id)"))
+        conn.execute(text("ALTER TABLE deliveries DROP COLUMN route_geometry"))
+        conn.execute(text(
+            "INSERT INTO users (id, email, phone, name, password_hash, user_type) "
+            "VALUES ('u1', 'old@x.com', '1', 'Old', 'x', 'customer')"
+        ))
+    return engine
+
+
+def schema(engine):
+    """Columns and index definitions per table, comparable across databases"""
+    inspector = inspect(engine)
+    with engine.connect() as conn:
+        index_sql = dict(conn.execute(text("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL")).all())
+    return {
+        table: (
+            sorted(column["name"] for column in inspector.get_columns(table)),
+            sorted((index["name"], " ".join(index_sql[index["name"]].split())) for index in inspector.get_indexes(table))
+        )
+        for table in inspector.get_table_names()
+    }
+
+
+@pytest.fixture(scope="module")
+def fresh():
+    engine = new_engine("fresh")
+    assert upgrade(engine) == []
+    return engine
+
+
+@pytest.fixture(scope="module")
+def legacy():
+    engine = legacy_database()
+    ran = upgrade(engine)
+    print(f"   applied: {ran}")
+    assert len(ran) == len(available())
+    return engine
+
+
+def test_versions_are_numbered_from_one():
+    versions = [version for version, _, _ in available()]
+    assert versions == sorted(versions) and versions[0] == 1
+
+
+def test_fresh_database_is_stamped(fresh):
+    assert applied(fresh) == [version for version, _, _ in available()]
+
+
+def test_legacy_database_upgrades_to_the_fresh_schema(fresh, legacy):
+    assert applied(legacy) == applied(fresh)
+    assert schema(legacy) == schema(fresh)
+    with legacy.connect() as conn:
+        assert conn.execute(text("SELECT email FROM users")).scalar() == "old@x.com"
+        partial = dict(conn.execute(text(
+            "SELECT name, sql FROM sqlite_master WHERE name IN ('ix_deliveries_unassigned', 'ix_drivers_available_located')"
+        )).all())
+    assert "WHERE driver_id IS NULL" in partial["ix_deliveries_unassigned"]
+    assert "IS NOT NULL" in partial["ix_drivers_available_located"]
+
+
+def test_scripts_alone_build_the_fresh_schema(fresh):
+    # The scripts are frozen; the models must keep describing what they build
+    engine = new_engine("scripted")
+    for _, _, module in available():
+        with engine.begin() as conn:
+            module.upgrade(conn)
+    assert schema(engine) == {table: spec for table, spec in schema(fresh).items() if table != "schema_migrations"}
+
+
+def test_upgrading_again_is_a_no_op(fresh, legacy):
+    before = applied(legacy)
+    assert upgrade(legacy) == [] and upgrade(fresh) == []
+    assert applied(legacy) == applied(fresh) == before
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
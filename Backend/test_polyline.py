@@ -0,0 +1,116 @@
+# test_polyline.py
+"""
+Offline check of route geometry helpers: the Google encoded polyline
+codec against the published sample, Douglas-Peucker keeping every
+dropped point within tolerance, and compact geometry packing round
+trips.
+
+    python -m pytest -q test_polyline.py
+"""
+import math
+import random
+import sys
+
+import pytest
+from app.utils import polyline
+from app.utils.geo import haversine_km
+
+# From Google's "Encoded Polyline Algorithm Format" documentation
+GOOGLE_SAMPLE = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+GOOGLE_POINTS = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+
+
+def random_route(n, seed=0):
+    rng = random.Random(seed)
+    lat, lng, points = 12.97, 77.59, []
+    for _ in range(n):
+        lat += rng.uniform(-0.0008, 0.0008)
+        lng += rng.uniform(-0.0008, 0.0008)
+        points.append((lat, lng))
+    return points
+
+
+def test_google_sample():
+    assert polyline.encode(GOOGLE_POINTS) == GOOGLE_SAMPLE
+    assert polyline.decode(GOOGLE_SAMPLE) == pytest.approx(GOOGLE_POINTS)
+
+
+@pytest.mark.parametrize("precision", [5, 6])
+def test_round_trip(precision):
+    points = random_route(500) + [(-33.8688, 151.2093), (0.0, 0.0), (89.99999, -179.99999)]
+    decoded = polyline.decode(polyline.encode(points, precision), precision)
+    assert len(decoded) == len(points)
+    half_step = 0.5 / 10 ** precision + 1e-12
+    assert all(abs(a - b) <= half_step for p, q in zip(points, decoded) for a, b in zip(p, q))
+
+
+def test_bad_and_legacy_input():
+    with pytest.raises(ValueError):
+        polyline.decode(GOOGLE_SAMPLE[:-1])
+    assert polyline.parse_polyline("12.9,77.5;13.0,77.6") == [(12.9, 77.5), (13.0, 77.6)]
+    assert polyline.parse_polyline(GOOGLE_SAMPLE) == pytest.approx(GOOGLE_POINTS)
+
+
+def offset_m(point, start, end):
+    """Distance in metres from point to the segment start-end (local flat projection)"""
+    scale = math.radians(1) * 6371000
+    cos_lat = math.cos(math.radians(start[0]))
+    px, py = (point[1] - start[1]) * scale * cos_lat, (point[0] - start[0]) * scale
+    ex, ey = (end[1] - start[1]) * scale * cos_lat, (end[0] - start[0]) * scale
+    length = math.hypot(ex, ey)
+    if length == 0:
+        return math.hypot(px, py)
+    return abs(ex * py - ey * px) / length
+
+
+@pytest.mark.parametrize("tolerance_m", [1, 5, 25, 100])
+def test_simplify_keeps_dropped_points_within_tolerance(tolerance_m):
+    points = random_route(400, seed=tolerance_m)
+    simplified = polyline.simplify(points, tolerance_m)
+    print(f"   {tolerance_m:>3} m: {len(points)} -> {len(simplified)} points")
+    assert simplified[0] == points[0] and simplified[-1] == points[-1]
+    assert 2 <= len(simplified) < len(points)
+
+    # Every original point lies within tolerance of the simplified segment spanning it
+    kept = [points.index(p) for p in simplified]
+    assert kept == sorted(kept)
+    for start, end in zip(kept, kept[1:]):
+        for i in range(start + 1, end):
+            assert offset_m(points[i], points[start], points[end]) <= tolerance_m * 1.001
+
+
+def test_simplify_edge_cases():
+    straight = [(12.9 + i * 1e-4, 77.5 + i * 1e-4) for i in range(50)]
+    assert polyline.simplify(straight, 0.5) == [straight[0], straight[-1]]
+    assert polyline.simplify(straight, 0) == straight
+    assert polyline.simplify(straight[:2], 10) == straight[:2]
+    # A loop back to the start still keeps its far point
+    loop = [(12.9, 77.5), (12.91, 77.5), (12.9, 77.5)]
+    assert polyline.simplify(loop, 10) == loop
+
+
+def test_tolerance_for_zoom():
+    assert polyline.tolerance_for_zoom(0, 0) == pytest.approx(polyline.METERS_PER_PIXEL_Z0)
+    assert polyline.tolerance_for_zoom(10, 60, pixels=2) == pytest.approx(polyline.METERS_PER_PIXEL_Z0 * 0.5 / 1024 * 2)
+    points = random_route(300)
+    assert len(polyline.simplify_for_zoom(points, 12)) < len(polyline.simplify_for_zoom(points, 18))
+    assert polyline.simplify_for_zoom(points, None) == points
+
+
+def test_geometry_packing_round_trip():
+    points = random_route(1000)
+    blob = polyline.pack_geometry(points)
+    unpacked = polyline.unpack_geometry(blob)
+    encoded = polyline.encode(points)
+    print(f"   1000 points: {len(blob)} bytes packed vs {len(encoded)} bytes encoded")
+    assert unpacked == polyline.decode(encoded)
+    assert max(haversine_km(*p, *q) for p, q in zip(points, unpacked)) < 0.001
+    assert len(blob) < len(encoded)
+    assert polyline.unpack_geometry(polyline.pack_geometry([])) == []
+
+    with pytest.raises(ValueError):
+        polyline.unpack_geometry(bytes([polyline.GEOMETRY_VERSION + 1]) + blob[1:])
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
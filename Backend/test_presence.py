@@ -0,0 +1,123 @@
+# test_presence.py
+"""
+Offline check of heartbeat presence: the timer wheel, a driver whose
+app goes silent being taken out of matching and written offline, the
+next ping bringing them back, and an idle socket being closed.
+
+    python -m pytest -q test_presence.py
+"""
+import sys
+import time
+
+import pytest
+from fastapi import WebSocketDisconnect
+from app.core.database import SessionLocal
+from app.models.driver import Driver
+from app.services.driver_index import driver_index
+from app.services.presence import presence
+from app.utils.timer_wheel import TimerWheel
+
+pytestmark = pytest.mark.settings(
+    PRESENCE_TTL_SECONDS=1, PRESENCE_TICK_SECONDS=0.2,
+    WS_IDLE_TIMEOUT_SECONDS=1, LOCATION_FLUSH_INTERVAL_SECONDS=0.2
+)
+
+
+def row(driver_id):
+    db = SessionLocal()
+    try:
+        driver = db.query(Driver).filter(Driver.id == driver_id).first()
+        return driver.is_available, driver.current_status
+    finally:
+        db.close()
+
+
+def test_timer_wheel_deadlines():
+    wheel = TimerWheel(tick_seconds=1.0, slots=8, now=0)
+    wheel.schedule("a", 3, now=0)
+    wheel.schedule("b", 5, now=0)
+    wheel.schedule("far", 20, now=0)  # more than one revolution out
+    assert wheel.advance(2.5) == []
+    assert wheel.advance(3.0) == ["a"]
+
+    # A refresh only moves the deadline; the key is re-slotted when its old slot comes up
+    wheel.schedule("b", 5, now=4)
+    assert wheel.advance(6) == [] and "b" in wheel
+    assert wheel.advance(9) == ["b"]
+
+    # Shortening a deadline takes effect at once
+    wheel.schedule("far", 1, now=9)
+    assert wheel.advance(10) == ["far"] and len(wheel) == 0
+
+
+def test_timer_wheel_long_stall_and_cancel():
+    wheel = TimerWheel(tick_seconds=1.0, slots=8, now=10)
+    # Hours of stall: each slot is visited once, everything due comes out
+    for i in range(100):
+        wheel.schedule(i, i % 7, now=10)
+    assert sorted(wheel.advance(100000)) == list(range(100))
+
+    wheel.schedule("gone", 1, now=100000)
+    wheel.cancel("gone")
+    assert wheel.advance(200000) == []
+
+
+@pytest.fixture(scope="module")
+def driver(client, register):
+    """An available driver with a known position"""
+    account = register("pr-d@x.com", "driver", driver_license_number="LPR", vehicle_plate_number="KAPR")
+    client.put("/api/v1/deliveries/driver/location", headers=account.headers, json={"lat": 12.97, "lng": 77.59})
+    client.put("/api/v1/deliveries/driver/status", headers=account.headers,
+               json={"is_available": True, "current_status": "online"})
+    assert driver_index.get(account.id) is not None
+    return account
+
+
+def test_silent_driver_goes_offline_and_ping_restores(client, driver):
+    # The app dies: no pings
+    time.sleep(2.0)
+    assert driver_index.get(driver.id) is None
+    assert row(driver.id) == (False, "offline"), row(driver.id)
+    print(f"   after silence: {row(driver.id)}")
+
+    # It comes back and pings again
+    client.put("/api/v1/deliveries/driver/location", headers=driver.headers, json={"lat": 12.98, "lng": 77.60})
+    assert driver_index.get(driver.id)["lat"] == 12.98
+    time.sleep(0.5)
+    assert row(driver.id) == (True, "online"), row(driver.id)
+    print(f"   after a ping: {row(driver.id)}")
+
+
+def test_websocket_pings_keep_driver_present(client, driver):
+    client.put("/api/v1/deliveries/driver/location", headers=driver.headers, json={"lat": 12.98, "lng": 77.60})
+    with client.websocket_connect(f"/ws/{driver.id}?token={driver.token}") as ws:
+        ws.receive_json()  # sync
+        for _ in range(6):
+            time.sleep(0.4)
+            ws.send_json({"type": "ping"})
+            assert ws.receive_json()["type"] == "pong"
+        assert driver_index.get(driver.id) is not None
+
+
+def test_going_offline_is_not_undone_by_a_ping(client, driver):
+    client.put("/api/v1/deliveries/driver/status", headers=driver.headers,
+               json={"is_available": False, "current_status": "offline"})
+    client.put("/api/v1/deliveries/driver/location", headers=driver.headers, json={"lat": 12.98, "lng": 77.60})
+    time.sleep(0.5)
+    assert driver_index.get(driver.id) is None and row(driver.id) == (False, "offline")
+    print(f"   metrics: {presence.get_metrics()}")
+
+
+def test_idle_socket_is_closed(client, register):
+    customer = register("pr-c@x.com", "customer")
+    with client.websocket_connect(f"/ws/{customer.id}?token={customer.token}") as ws:
+        ws.receive_json()  # sync
+        started = time.monotonic()
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_json()
+        print(f"   closed after {time.monotonic() - started:.1f}s with code {closed.value.code}")
+        assert closed.value.code == 1001
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
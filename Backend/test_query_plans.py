@@ -0,0 +1,125 @@
+# test_query_plans.py
+"""
+Offline check that every hot query is answered from an index: runs the
+real code paths (list pages, dispatch, startup loads), captures their SQL
+and asks SQLite for EXPLAIN QUERY PLAN. A full table scan or a sort for
+ORDER BY fails the check.
+
+    python -m pytest -q test_query_plans.py
+"""
+import re
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from app.core.database import SessionLocal, engine
+from app.models.delivery import Delivery
+from app.models.driver import Driver
+from app.services.dispatch_service import dispatch_engine
+from app.services.driver_index import driver_index
+from app.services.pickup_index import pending_pickups
+from app.services.tracking_hub import tracking_hub
+
+TABLES = ("deliveries", "drivers", "users")
+
+
+def seed(customer_id, driver_id):
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        for n in range(200):
+            status = ("pending", "assigned", "in_transit", "completed", "cancelled")[n % 5]
+            db.add(Delivery(
+                id=str(uuid.uuid4()), customer_id=customer_id, driver_id=None if status == "pending" else driver_id,
+                pickup_address="p", pickup_lat=12.97, pickup_lng=77.59, dropoff_address="d",
+                dropoff_lat=12.99, dropoff_lng=77.70, status=status,
+                actual_delivery=now - timedelta(minutes=n) if status == "completed" else None
+            ))
+        driver = db.get(Driver, driver_id)
+        driver.is_available, driver.current_location_lat, driver.current_location_lng = True, 12.97, 77.59
+        db.commit()
+    finally:
+        db.close()
+
+
+def plan(statement, parameters):
+    with engine.connect() as conn:
+        raw = conn.connection.driver_connection
+        return [row[3] for row in raw.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+
+
+def check(statements, name, fn, indexes, table="deliveries"):
+    """The query fn() runs against table must use one of indexes, scan nothing and sort nothing"""
+    queries = [query for query in statements(fn) if re.search(rf"\bFROM {table}\b", query[0])]
+    assert queries, f"{name}: no query on {table}"
+    steps = plan(*queries[0])
+    print(f"   {name:<34} {steps[0]}")
+    full_scans = [s for s in steps if re.match(rf"SCAN ({'|'.join(TABLES)})(_\d+)?$", s)]
+    assert not full_scans, f"{name}: full scan {full_scans}"
+    assert not any("TEMP B-TREE" in s for s in steps), f"{name}: sorts {steps}"
+    indexes = (indexes,) if isinstance(indexes, str) else indexes
+    assert any(index in s for s in steps for index in indexes), f"{name}: expected {indexes}, got {steps}"
+
+
+@pytest.fixture(scope="module")
+def accounts(register):
+    customer = register("plans-c@x.com", "customer")
+    driver = register("plans-d@x.com", "driver", driver_license_number="LQ", vehicle_plate_number="KAQ")
+    for i in range(6):
+        register(f"plans-c{i}@x.com", "customer")
+    seed(customer.id, driver.id)
+    return {"customer": customer, "driver": driver}
+
+
+# (page, who asks, index it must be answered from, table)
+PAGES = [
+    ("/api/v1/deliveries/my-deliveries", "customer", "ix_deliveries_customer_created", "deliveries"),
+    ("/api/v1/deliveries/my-deliveries", "driver", "ix_deliveries_driver_created", "deliveries"),
+    ("/api/v1/deliveries/completed", "customer", "ix_deliveries_customer_status", "deliveries"),
+    ("/api/v1/deliveries/driver/completed", "driver", "ix_deliveries_driver_status", "deliveries"),
+    ("/api/v1/admin/customers", None, "ix_users_created", "users"),
+]
+
+
+@pytest.mark.parametrize("path, who, index, table", PAGES, ids=[f"{p.rsplit('/', 1)[1]}-{w}" for p, w, _, _ in PAGES])
+def test_list_pages(client, statements, accounts, path, who, index, table):
+    headers = accounts[who].headers if who else {}
+    first = client.get(path, headers=headers, params={"limit": 5}).json()
+    assert first["next_cursor"]
+    second = lambda: client.get(path, headers=headers, params={"limit": 5, "cursor": first["next_cursor"]})
+    check(statements, f"{path} as {who}", second, index, table=table)
+
+
+def test_driver_location(client, statements, accounts):
+    # status != completed cannot use the status column; customer_id is the prefix that matters
+    customer = accounts["customer"]
+    check(statements, "driver location (customer)",
+          lambda: client.get("/api/v1/deliveries/driver/location", headers=customer.headers),
+          "ix_deliveries_customer_")
+
+
+# (name, call on a session, indexes that answer it, table)
+LOADS = [
+    ("dispatch-pending", lambda db: dispatch_engine._pending_deliveries(db), "ix_deliveries_unassigned", "deliveries"),
+    ("dispatch-busy", lambda db: dispatch_engine._busy_driver_ids(db), "ix_deliveries_status_driver", "deliveries"),
+    # Each is an equality search on (status, driver_id IS NULL); without
+    # ANALYZE statistics SQLite may pick any of them
+    ("pickup-index", lambda db: pending_pickups.load(db),
+     ("ix_deliveries_unassigned", "ix_deliveries_driver_status", "ix_deliveries_status_driver"), "deliveries"),
+    ("tracking-hub", lambda db: tracking_hub.load(db), "ix_deliveries_status_driver", "deliveries"),
+    ("driver-index", lambda db: driver_index.load(db), "ix_drivers_available_located", "drivers"),
+]
+
+
+@pytest.mark.parametrize("name, load, indexes, table", LOADS, ids=[load[0] for load in LOADS])
+def test_dispatch_and_startup_loads(client, statements, accounts, name, load, indexes, table):
+    db = SessionLocal()
+    try:
+        check(statements, name, lambda: load(db), indexes, table=table)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,146 @@
+# test_road_graph.py
+"""
+Offline check of the road graph on a small synthetic street grid: the
+binary CSR file reads back what was written, and A*, the contraction
+hierarchy and both many-to-many paths agree with a plain Dijkstra.
+
+    python -m pytest -q test_road_graph.py
+"""
+import heapq
+import math
+import random
+import sys
+
+import numpy as np
+import pytest
+from app.services.road_graph import RoadGraph, write_graph
+from app.utils.geo import haversine_km
+
+SIZE = 8
+STEP_DEG = 0.002
+BASE = (12.9, 77.5)
+
+
+def street_grid(seed=7):
+    """SIZE x SIZE junctions, two-way streets at random speeds, a few one-ways, one island node"""
+    rng = random.Random(seed)
+    nodes = [(BASE[0] + r * STEP_DEG, BASE[1] + c * STEP_DEG) for r in range(SIZE) for c in range(SIZE)]
+    edges = []
+    for r in range(SIZE):
+        for c in range(SIZE):
+            u = r * SIZE + c
+            for v in ([u + 1] if c + 1 < SIZE else []) + ([u + SIZE] if r + 1 < SIZE else []):
+                meters = haversine_km(*nodes[u], *nodes[v]) * 1000
+                one_way = rng.random() < 0.15
+                for a, b in ((u, v),) if one_way else ((u, v), (v, u)):
+                    edges.append((a, b, meters / rng.uniform(4.0, 20.0), meters))
+    nodes.append((BASE[0] + 0.05, BASE[1] + 0.05))
+    return nodes, edges
+
+
+def dijkstra(n, edges, source):
+    """Reference (seconds, meters) to every reachable node, on the float32 weights the file stores"""
+    adjacency = [[] for _ in range(n)]
+    for u, v, seconds, meters in edges:
+        adjacency[u].append((v, float(np.float32(seconds)), float(np.float32(meters))))
+    best = {source: (0.0, 0.0)}
+    heap = [(0.0, 0.0, source)]
+    done = set()
+    while heap:
+        d, m, node = heapq.heappop(heap)
+        if node in done:
+            continue
+        done.add(node)
+        for nxt, seconds, meters in adjacency[node]:
+            if d + seconds < best.get(nxt, (math.inf,))[0]:
+                best[nxt] = (d + seconds, m + meters)
+                heapq.heappush(heap, (d + seconds, m + meters, nxt))
+    return best
+
+
+@pytest.fixture(scope="module")
+def network():
+    nodes, edges = street_grid()
+    return nodes, edges, {s: dijkstra(len(nodes), edges, s) for s in range(len(nodes))}
+
+
+@pytest.fixture(scope="module", params=[False, True], ids=["astar", "ch"])
+def graph(request, network, tmp_path_factory):
+    nodes, edges, _ = network
+    path = str(tmp_path_factory.mktemp("graph") / "grid.hagr")
+    write_graph(path, nodes, edges, with_ch=request.param)
+    return RoadGraph(path)
+
+
+def path_seconds(graph, path):
+    return sum(graph._leg(u, v)[0] for u, v in zip(path, path[1:]))
+
+
+def test_csr_file_round_trip(graph, network):
+    nodes, edges, _ = network
+    assert (graph.node_count, graph.edge_count) == (len(nodes), len(edges))
+    for node, (lat, lng) in enumerate(nodes):
+        assert graph.coord(node) == pytest.approx((lat, lng), abs=1e-6)
+    written = sorted((u, v, float(np.float32(s)), float(np.float32(m))) for u, v, s, m in edges)
+    read = sorted(
+        (u, graph.targets[i], graph.seconds[i], graph.meters[i])
+        for u in range(graph.node_count)
+        for i in range(graph.offsets[u], graph.offsets[u + 1])
+    )
+    assert read == written
+
+
+def test_point_to_point_matches_dijkstra(graph, network):
+    nodes, _, reference = network
+    search = graph._ch_query if graph.has_ch else graph._astar
+    pairs = [(s, t) for s in range(0, SIZE * SIZE, 5) for t in range(3, SIZE * SIZE, 7) if s != t]
+    for source, target in pairs:
+        path = search(source, target)
+        if target not in reference[source]:
+            assert path is None
+            continue
+        assert path[0] == source and path[-1] == target
+        assert path_seconds(graph, path) == pytest.approx(reference[source][target][0], rel=1e-5)
+    island = len(nodes) - 1
+    assert search(0, island) is None and search(island, 0) is None
+
+
+def test_many_to_many_matches_dijkstra(graph, network):
+    nodes, _, reference = network
+    sources = [0, 9, 27, 63, 36, len(nodes) - 1]
+    targets = [63, 5, 0, 44, 44, len(nodes) - 1, 18]
+    seconds, meters = graph._node_matrix(sources, targets)
+    for i, source in enumerate(sources):
+        for j, target in enumerate(targets):
+            expected = reference[source].get(target)
+            if expected is None:
+                assert math.isinf(seconds[i, j])
+            else:
+                assert seconds[i, j] == pytest.approx(expected[0], rel=1e-5)
+                assert meters[i, j] == pytest.approx(expected[1], rel=1e-5)
+
+    # On the junctions themselves there is no snap leg to add
+    distance_km, duration_min = graph.distance_matrix([nodes[s] for s in sources], [nodes[t] for t in targets])
+    finite = np.isfinite(seconds)
+    assert np.allclose(duration_min[finite], seconds[finite] / 60, rtol=1e-4)
+    assert np.allclose(distance_km[finite], meters[finite] / 1000, rtol=1e-4)
+    assert np.array_equal(np.isnan(duration_min), ~finite)
+
+
+def test_shortest_path_between_coordinates(graph, network):
+    nodes, _, reference = network
+    route = graph.shortest_path(nodes[0], nodes[SIZE * SIZE - 1])
+    assert route["coordinates"][0] == nodes[0] and route["coordinates"][-1] == nodes[SIZE * SIZE - 1]
+    assert route["duration_min"] == pytest.approx(reference[0][SIZE * SIZE - 1][0] / 60, rel=1e-4)
+    assert graph.shortest_path(nodes[0], nodes[-1]) is None
+
+
+def test_bad_file_is_rejected(tmp_path):
+    path = tmp_path / "junk.hagr"
+    path.write_bytes(b"\0" * 128)
+    with pytest.raises(ValueError):
+        RoadGraph(str(path))
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
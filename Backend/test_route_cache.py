@@ -0,0 +1,69 @@
+# test_route_cache.py
+"""
+Offline check of the route cache: a hit for a nearby pair in the same
+grid cells comes back on the requested endpoints, not the ones the
+route was computed for, from either tier.
+
+    python -m pytest -q test_route_cache.py
+"""
+import sqlite3
+import sys
+
+import pytest
+from app.services.ai_service import AIService
+from app.services.route_cache import RouteCache
+from app.utils.polyline import decode
+
+ORIGIN = (12.97160, 77.59460)
+DESTINATION = (12.96980, 77.75000)
+# Same 0.001 degree cells as ORIGIN / DESTINATION
+NEARBY_ORIGIN = (12.97180, 77.59480)
+NEARBY_DESTINATION = (12.96960, 77.75020)
+
+
+@pytest.fixture
+def route():
+    return AIService()._calculate_route_fallback(ORIGIN, DESTINATION)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def cache(request, tmp_path):
+    writer = RouteCache(db_path=str(tmp_path / "routes.db"))
+    if request.param == "memory":
+        return writer, writer
+    # A second worker on the host: only the shared tier is warm
+    return writer, RouteCache(db_path=str(tmp_path / "routes.db"))
+
+
+def test_exact_pair_hits_unchanged(cache, route):
+    writer, reader = cache
+    writer.put(ORIGIN, DESTINATION, route)
+    assert reader.get(ORIGIN, DESTINATION) == route
+
+
+def test_nearby_pair_is_reanchored(cache, route):
+    writer, reader = cache
+    assert reader.key(NEARBY_ORIGIN, NEARBY_DESTINATION) == reader.key(ORIGIN, DESTINATION)
+    writer.put(ORIGIN, DESTINATION, route)
+    hit = reader.get(NEARBY_ORIGIN, NEARBY_DESTINATION)
+    print(f"   nearby hit: {hit['steps'][0]['instruction']!r} / {hit['steps'][1]['instruction']!r}")
+    points = decode(hit["polyline"])
+    assert points[0] == pytest.approx(NEARBY_ORIGIN) and points[-1] == pytest.approx(NEARBY_DESTINATION)
+    assert str(NEARBY_ORIGIN) in hit["steps"][0]["instruction"]
+    assert str(NEARBY_DESTINATION) in hit["steps"][1]["instruction"]
+    assert str(ORIGIN) not in str(hit["steps"])
+    assert hit["distance_km"] == route["distance_km"]
+    # The stored entry is untouched for the next exact hit
+    assert reader.get(ORIGIN, DESTINATION) == route
+
+
+def test_rows_without_endpoints_are_misses(tmp_path, route):
+    cache = RouteCache(db_path=str(tmp_path / "routes.db"))
+    cache.put(ORIGIN, DESTINATION, route)
+    with sqlite3.connect(tmp_path / "routes.db") as conn:
+        conn.execute("UPDATE route_cache SET route = ?", ('{"distance_km": 1.0, "polyline": "", "steps": []}',))
+    assert RouteCache(db_path=str(tmp_path / "routes.db")).get(ORIGIN, DESTINATION) is None
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,301 @@
+# test_routing_resilience.py
+"""
+Offline check of async routing against fake_directions_server.py:
+deadline, circuit breaker, hedging, request coalescing and event-loop
+responsiveness.
+
+    python -m pytest -q test_routing_resilience.py
+"""
+import asyncio
+import gc
+import os
+import sys
+import threading
+import time
+
+import httpx
+import pytest
+import uvicorn
+from fake_directions_server import app as fake_app
+from app.core.config import settings
+from app.services.ai_service import AIService
+from app.services.route_cache import route_cache
+from app.services.routing import CircuitBreaker, call_with_deadline
+from app.utils.single_flight import SingleFlight
+
+PORT = int(os.getenv("FAKE_DIRECTIONS_PORT", "8765"))
+
+pytestmark = pytest.mark.settings(
+    GOOGLE_MAPS_API_KEY="AIzaFakeKeyForOfflineTesting000000000000",
+    GOOGLE_MAPS_BASE_URL=f"http://127.0.0.1:{PORT}",
+    ROUTING_DEADLINE_MS=300,
+    ROUTING_SLOW_CALL_MS=200,
+    ROUTING_BREAKER_FAILURES=3,
+    ROUTING_BREAKER_RESET_SECONDS=1,
+    ROUTING_HEDGE_MIN_SAMPLES=5
+)
+
+BANGALORE = (12.9716, 77.5946)
+WHITEFIELD = (12.9698, 77.7500)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def fake_google():
+    server = uvicorn.Server(uvicorn.Config(fake_app, host="127.0.0.1", port=PORT, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    yield
+    server.should_exit = True
+    thread.join()
+
+
+def control(**behaviour) -> dict:
+    """Replace the fake server's behaviour (unset fields go back to healthy)"""
+    response = httpx.post(f"http://127.0.0.1:{PORT}/__control", json=behaviour)
+    response.raise_for_status()
+    return response.json()
+
+
+def with_service(check):
+    """Run check(ai_service) on a fresh AIService pointed at the fake server"""
+    async def run():
+        ai_service = AIService()
+        assert ai_service.use_real_api, "AIService did not pick up the fake Google key"
+        try:
+            await check(ai_service)
+        finally:
+            await ai_service.aclose()
+    asyncio.run(run())
+
+
+async def trip_breaker(ai_service):
+    control(failure_rate=1.0)
+    for _ in range(3):
+        await ai_service.calculate_route_async(BANGALORE, WHITEFIELD)
+    assert ai_service.google_breaker.state == ai_service.google_breaker.OPEN
+
+
+async def max_loop_stall(coro, tick: float = 0.01) -> tuple:
+    """Run coro while a ticker measures the worst event-loop stall"""
+    # Collect now so a full pass over earlier tests' garbage is not counted as a stall
+    gc.collect()
+    worst = 0.0
+    done = asyncio.Event()
+
+    async def ticker():
+        nonlocal worst
+        while not done.is_set():
+            before = time.perf_counter()
+            await asyncio.sleep(tick)
+            worst = max(worst, time.perf_counter() - before - tick)
+
+    ticker_task = asyncio.create_task(ticker())
+    try:
+        result = await coro
+    finally:
+        done.set()
+        await ticker_task
+    return result, worst
+
+
+def test_healthy_provider():
+    async def check(ai_service):
+        control(latency_ms=20)
+        route = await ai_service.calculate_route_async(BANGALORE, WHITEFIELD)
+        print(f"   source={route['source']} distance={route['distance_km']:.2f} km")
+        assert route["source"] == "google_maps"
+        assert ai_service.google_breaker.state == ai_service.google_breaker.CLOSED
+    with_service(check)
+
+
+def test_deadline_falls_back_without_blocking():
+    async def check(ai_service):
+        control(latency_ms=3000)
+        started = time.perf_counter()
+        route, stall = await max_loop_stall(ai_service.calculate_route_async(BANGALORE, WHITEFIELD))
+        elapsed = time.perf_counter() - started
+        print(f"   source={route['source']} elapsed={elapsed * 1000:.0f} ms worst loop stall={stall * 1000:.1f} ms")
+        assert route["source"] == "fallback_calculation"
+        assert elapsed < 1.0, "deadline was not enforced"
+        assert stall < 0.1, "routing blocked the event loop"
+    with_service(check)
+
+
+def test_failures_trip_the_breaker():
+    async def check(ai_service):
+        await trip_breaker(ai_service)
+        print(f"   breaker={ai_service.google_breaker.snapshot()}")
+        started = time.perf_counter()
+        route = await ai_service.calculate_route_async(BANGALORE, WHITEFIELD)
+        elapsed = time.perf_counter() - started
+        print(f"   open circuit answered from {route['source']} in {elapsed * 1000:.1f} ms")
+        assert route["source"] == "fallback_calculation"
+        assert ai_service.google_breaker.metrics["short_circuited"] >= 1
+    with_service(check)
+
+
+def test_half_open_probe_closes_the_circuit():
+    async def check(ai_service):
+        breaker = ai_service.google_breaker
+        await trip_breaker(ai_service)
+        control(latency_ms=20)
+        await asyncio.sleep(1.1)
+        route = await ai_service.calculate_route_async(BANGALORE, WHITEFIELD)
+        print(f"   source={route['source']} breaker={breaker.state}")
+        assert route["source"] == "google_maps"
+        assert breaker.state == breaker.CLOSED
+    with_service(check)
+
+
+class StalledProvider:
+    name = "stalled"
+
+    async def route(self, origin, destination):
+        await asyncio.sleep(60)
+
+
+def test_cancelled_probe_frees_the_breaker():
+    async def run():
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout_seconds=0.05)
+        breaker.record_failure()
+        await asyncio.sleep(0.06)
+        probe = asyncio.create_task(call_with_deadline(StalledProvider(), breaker, BANGALORE, WHITEFIELD, 5))
+        await asyncio.sleep(0.01)
+        assert breaker.state == breaker.HALF_OPEN and not breaker.allow()
+
+        # The booking that made the probe is cancelled (client gone, shutdown)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        print(f"   after the cancelled probe: {breaker.snapshot()}")
+        assert breaker.state == breaker.HALF_OPEN
+        assert [breaker.allow(), breaker.allow()] == [True, False]
+    asyncio.run(run())
+
+
+def test_hedging_beats_a_slow_primary():
+    async def check(ai_service):
+        control(latency_ms=10)
+        for i in range(10):
+            await ai_service.calculate_route_async((BANGALORE[0] + i * 0.01, BANGALORE[1]), WHITEFIELD)
+        delay = ai_service.hedge_delay()
+        control(latency_ms=150)
+        started = time.perf_counter()
+        route = await ai_service.calculate_route_async(BANGALORE, (WHITEFIELD[0] + 0.05, WHITEFIELD[1]))
+        elapsed = time.perf_counter() - started
+        print(f"   hedge delay={delay * 1000:.0f} ms -> provider={route['provider']} "
+              f"hedged={route['hedged']} in {elapsed * 1000:.0f} ms")
+        assert route["hedged"] and route["provider"] == "fallback_calculation"
+        assert elapsed < 0.15, "hedge did not beat the slow primary"
+        await asyncio.sleep(0.3)
+        metrics = ai_service.routing_metrics()
+        print(f"   hedging={metrics['hedging']}")
+        assert metrics["hedging"]["late_primary_results"] >= 1
+    with_service(check)
+
+
+class SlowRoadGraph:
+    """A loaded road graph that answers well after Google"""
+
+    def shortest_path(self, origin, destination):
+        time.sleep(0.3)
+        return {"distance_km": 30.0, "duration_min": 60.0, "coordinates": [origin, destination]}
+
+
+def test_losing_secondary_leaves_the_cached_winner(monkeypatch):
+    monkeypatch.setattr(settings, "ROUTE_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "ROUTING_HEDGE_DEFAULT_MS", 50)
+
+    async def check(ai_service):
+        ai_service.road_graph = SlowRoadGraph()
+        control(latency_ms=120)
+        dropoff = (WHITEFIELD[0] + 0.2, WHITEFIELD[1])
+        route = await ai_service.calculate_route_async(BANGALORE, dropoff)
+        assert route["hedged"] and route["provider"] == "google_maps"
+        # Give the road-graph thread time to finish after losing the race
+        await asyncio.sleep(0.4)
+        cached = route_cache.get(BANGALORE, dropoff)
+        print(f"   hedging={ai_service.hedge_metrics} cached source={cached['source']}")
+        assert cached["source"] == "google_maps"
+    with_service(check)
+
+
+def test_concurrent_bookings_under_a_slow_provider():
+    async def check(ai_service):
+        control(latency_ms=150, jitter_ms=100)
+        started = time.perf_counter()
+        routes, stall = await max_loop_stall(asyncio.gather(*[
+            ai_service.calculate_route_async(BANGALORE, (WHITEFIELD[0], WHITEFIELD[1] + i * 0.001))
+            for i in range(50)
+        ]))
+        elapsed = time.perf_counter() - started
+        sources = {r["source"] for r in routes}
+        print(f"   50 routes in {elapsed * 1000:.0f} ms, sources={sources}, worst loop stall={stall * 1000:.1f} ms")
+        assert elapsed < 1.0
+        assert stall < 0.1
+    with_service(check)
+
+
+def test_identical_lookups_are_coalesced():
+    async def check(ai_service):
+        requests_before = control(latency_ms=40)["requests"]
+        dropoff = (WHITEFIELD[0] + 0.1, WHITEFIELD[1])
+        results = await asyncio.gather(
+            *[ai_service.quote_async(BANGALORE, dropoff) for _ in range(25)],
+            *[ai_service.calculate_route_async(BANGALORE, dropoff) for _ in range(10)]
+        )
+        quotes = results[:25]
+        upstream_calls = control(latency_ms=40)["requests"] - requests_before
+        flights = ai_service.routing_metrics()["single_flight"]
+        print(f"   25 quotes + 10 routes -> {upstream_calls} upstream call(s), fare={quotes[0]['estimated_total']}")
+        print(f"   single_flight={flights}")
+        assert upstream_calls == 1
+        assert len({q["estimated_total"] for q in quotes}) == 1
+        assert flights["quote"]["coalesced"] == 24
+        assert flights["route"]["coalesced"] >= 10
+    with_service(check)
+
+
+
+def test_cancelled_leader_does_not_fail_followers():
+    async def run():
+        flights, calls = SingleFlight(), []
+
+        async def lookup():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"distance_km": 4.2}
+
+        leader = asyncio.create_task(flights.do("pair", lookup))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(flights.do("pair", lookup)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.gather(*followers)
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        print(f"   followers after the leader was cancelled: {results}, flights={flights.snapshot()}")
+        assert results == [{"distance_km": 4.2}] * 3 and len(calls) == 1
+        assert flights.snapshot()["in_flight"] == 0
+    asyncio.run(run())
+
+
+def test_nearby_pairs_are_not_coalesced():
+    async def check(ai_service):
+        requests_before = control(latency_ms=40)["requests"]
+        nearby = (BANGALORE[0] + 0.0002, BANGALORE[1])
+        assert route_cache.key(nearby, WHITEFIELD) == route_cache.key(BANGALORE, WHITEFIELD)
+        await asyncio.gather(
+            ai_service.calculate_route_async(BANGALORE, WHITEFIELD),
+            ai_service.calculate_route_async(nearby, WHITEFIELD)
+        )
+        upstream_calls = control(latency_ms=40)["requests"] - requests_before
+        print(f"   two pairs in one cache cell -> {upstream_calls} upstream calls")
+        assert upstream_calls == 2 and ai_service.route_flights.metrics["coalesced"] == 0
+    with_service(check)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,98 @@
+# test_trip_meter.py
+"""
+Offline check of trip metering: folding pings in batches of any size
+gives the same distance and moving time as measuring the whole trace at
+once, with spikes, a parked stretch and duplicate fixes falling on
+every possible batch boundary.
+
+    python -m pytest -q test_trip_meter.py
+"""
+import random
+import sys
+
+import pytest
+from app.services.trip_meter import TripMeter, TripMeters
+
+START = 1_700_000_000.0
+METERS_PER_DEG = 111_320
+
+
+def trace(seed=3):
+    """Drive ~29 km/h, park for 200 s wandering a metre, drive on; plus spikes and a duplicate fix"""
+    rng = random.Random(seed)
+    points, lat, lng, ts = [], 12.90, 77.50, START
+    for phase, count in (("drive", 30), ("park", 20), ("drive", 30)):
+        for _ in range(count):
+            if phase == "drive":
+                ts += 2.0
+                lat += 16 / METERS_PER_DEG
+                lng += rng.uniform(-2, 2) / METERS_PER_DEG
+                points.append((lat, lng, ts))
+            else:
+                ts += 10.0
+                points.append((lat + rng.uniform(-1, 1) / METERS_PER_DEG, lng + rng.uniform(-1, 1) / METERS_PER_DEG, ts))
+    for i in (7, 11, 41, 66):
+        # A fix ~3 km off for one ping
+        spiked = points[i]
+        points[i] = (spiked[0] + 0.03, spiked[1], spiked[2])
+    points.insert(25, points[24])
+    return points
+
+
+@pytest.fixture(scope="module")
+def meters():
+    return TripMeters(max_speed_kmh=120, jitter_m=15, moving_speed_kmh=3)
+
+
+def metered(meters, points, batch):
+    meter = TripMeter("delivery", "driver", START)
+    for i in range(0, len(points), batch):
+        for lat, lng, ts in points[i:i + batch]:
+            meter.add(lat, lng, ts)
+        meter.process(meters.max_speed_kmh, meters.jitter_m, meters.moving_speed_kmh)
+    return meter.totals()
+
+
+def test_whole_trace(meters):
+    whole = meters.measure(trace())
+    print(f"   whole trace: {whole}")
+    # Two 30-ping drives of ~16 m steps; the parked stretch and the spikes add nothing
+    assert whole["distance_km"] == pytest.approx(60 * 0.016, rel=0.05)
+    assert whole["rejected"] == 5
+    assert whole["moving_minutes"] == pytest.approx(60 * 2 / 60, rel=0.05)
+
+
+@pytest.mark.parametrize("batch", [1, 2, 3, 4, 5, 7, 11, 40, 200])
+def test_batches_match_the_whole_trace(meters, batch):
+    points = trace()
+    whole = meters.measure(points)
+    totals = metered(meters, points, batch)
+    assert totals["distance_km"] == pytest.approx(whole["distance_km"], abs=1e-3)
+    assert totals["moving_minutes"] == pytest.approx(whole["moving_minutes"], abs=0.01)
+    assert totals["points"] + totals["rejected"] == len(points)
+
+
+def test_out_of_order_pings_within_a_batch(meters):
+    points = trace()
+    shuffled = points[:]
+    for i in range(0, len(shuffled) - 5, 6):
+        random.Random(i).shuffle(shuffled[i:i + 6])
+    meter = TripMeter("delivery", "driver", START)
+    for i in range(0, len(points), 6):
+        for lat, lng, ts in shuffled[i:i + 6]:
+            meter.add(lat, lng, ts)
+        meter.process(meters.max_speed_kmh, meters.jitter_m, meters.moving_speed_kmh)
+    assert meter.totals()["distance_km"] == pytest.approx(meters.measure(points)["distance_km"], abs=1e-3)
+
+
+def test_pings_before_the_trip_are_ignored(meters):
+    meters.start("delivery", "driver", started_at=START + 100)
+    for lat, lng, ts in trace():
+        meters.observe("driver", lat, lng, ts)
+    totals = meters.finish("delivery", "driver")
+    assert totals["points"] + totals["rejected"] == sum(1 for _, _, ts in trace() if ts >= START + 100)
+    assert meters.finish("delivery", "driver") is None
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,132 @@
+# test_unassigned_feed.py
+"""
+Offline check of the drivers' unassigned feed: only pickups near the
+driver, nearest first, paged with a cursor, kept current on book,
+accept and cancel (by the assigned driver only), and a page costs the
+same however large the backlog elsewhere is.
+
+    python -m pytest -q test_unassigned_feed.py
+"""
+import random
+import sys
+import uuid
+
+import pytest
+from app.core.database import SessionLocal
+from app.models.delivery import Delivery
+from app.services.pickup_index import pending_pickups
+from app.services.tracking_hub import tracking_hub
+from app.utils.cursor import encode_cursor
+from app.utils.geo import haversine_km
+
+DRIVER_AT = (12.9716, 77.5946)
+NEAR = {"lat": DRIVER_AT[0], "lng": DRIVER_AT[1], "radius_km": 5}
+
+
+def seed(customer_id, count, center, spread_deg):
+    rng = random.Random(count)
+    points = [
+        (center[0] + rng.uniform(-spread_deg, spread_deg), center[1] + rng.uniform(-spread_deg, spread_deg))
+        for _ in range(count)
+    ]
+    db = SessionLocal()
+    try:
+        for lat, lng in points:
+            db.add(Delivery(
+                id=str(uuid.uuid4()), customer_id=customer_id, pickup_address="p", pickup_lat=lat, pickup_lng=lng,
+                dropoff_address="d", dropoff_lat=center[0], dropoff_lng=center[1], status="pending"
+            ))
+        db.commit()
+        pending_pickups.load(db)
+    finally:
+        db.close()
+    return points
+
+
+@pytest.fixture(scope="module")
+def feed(register):
+    """A customer with 45 pickups around the driver and 300 in another town, ~70 km off"""
+    customer = register("feed-c@x.com", "customer")
+    driver = register("feed-d@x.com", "driver", driver_license_number="LFD", vehicle_plate_number="KAFD")
+    other = register("feed-o@x.com", "driver", driver_license_number="LFO", vehicle_plate_number="KAFO")
+    nearby = seed(customer.id, 45, DRIVER_AT, 0.05)
+    seed(customer.id, 300, (13.35, 77.10), 0.05)
+    return customer, driver, other, nearby
+
+
+def first_page(client, driver):
+    response = client.get("/api/v1/deliveries/unassigned", headers=driver.headers, params={**NEAR, "limit": 10})
+    assert response.status_code == 200, response.text
+    return response.json()["items"]
+
+
+def test_nearby_pickups_nearest_first_across_pages(client, feed):
+    _, driver, _, nearby = feed
+    pages, cursor = [], None
+    while True:
+        query = {"limit": 10, **({"cursor": cursor} if cursor else NEAR)}
+        page = client.get("/api/v1/deliveries/unassigned", headers=driver.headers, params=query).json()
+        pages.append(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    items = [item for page in pages for item in page]
+    distances = [item["distance_km"] for item in items]
+    assert distances == sorted(distances) and max(distances) <= 5
+    assert len({item["id"] for item in items}) == len(items)
+    expected = sum(1 for point in nearby if haversine_km(*DRIVER_AT, *point) <= 5)
+    print(f"   {len(items)} pickups within 5 km over {len(pages)} pages (of {len(pending_pickups)} pending)")
+    assert len(items) == expected and all(len(page) <= 10 for page in pages)
+
+
+def test_page_cost_does_not_follow_the_backlog(client, feed, statements):
+    customer, driver, _, _ = feed
+    before = len(statements(lambda: first_page(client, driver)))
+    seed(customer.id, 1000, (13.35, 77.10), 0.05)
+    after = len(statements(lambda: first_page(client, driver)))
+    print(f"   queries per page: {before} before, {after} with {len(pending_pickups)} pending")
+    assert before == after <= 3 and len(first_page(client, driver)) == 10
+
+
+def test_book_accept_and_cancel_keep_the_feed_current(client, feed, book):
+    customer, driver, other, _ = feed
+    booked = book(customer, pickup_address="here", pickup_lat=DRIVER_AT[0], pickup_lng=DRIVER_AT[1])
+    first = lambda: first_page(client, driver)[0]
+    assert first()["id"] == booked["id"] and first()["distance_km"] == 0
+
+    client.post(f"/api/v1/deliveries/{booked['id']}/accept", headers=other.headers)
+    assert first()["id"] != booked["id"] and booked["id"] not in pending_pickups
+
+    # Only the assigned driver can give it back; a stranger's try changes nothing
+    response = client.post(f"/api/v1/deliveries/{booked['id']}/driver-cancel", headers=driver.headers)
+    assert response.status_code == 403
+    assert booked["id"] in tracking_hub._topics and booked["id"] not in pending_pickups
+
+    client.post(f"/api/v1/deliveries/{booked['id']}/driver-cancel", headers=other.headers)
+    assert first()["id"] == booked["id"]
+
+    client.post(f"/api/v1/deliveries/{booked['id']}/customer-cancel", headers=customer.headers)
+    assert first()["id"] != booked["id"]
+
+
+def test_bad_input(client, feed):
+    customer, driver, _, _ = feed
+    assert client.get("/api/v1/deliveries/unassigned", headers=driver.headers).status_code == 400
+    assert client.get("/api/v1/deliveries/unassigned", headers=driver.headers,
+                      params={"cursor": "not-a-cursor"}).status_code == 400
+    assert client.get("/api/v1/deliveries/unassigned", headers=customer.headers, params=NEAR).status_code == 403
+
+    # A crafted cursor gets no more than the query parameters would
+    nan, inf = float("nan"), float("inf")
+    for lat, lng, radius_km, last_distance in (
+        (*DRIVER_AT, 5000, 1.0), (*DRIVER_AT, inf, 1.0), (*DRIVER_AT, -1, 0.0), (nan, DRIVER_AT[1], 5, 1.0),
+        (DRIVER_AT[0], inf, 5, 1.0), (95.0, DRIVER_AT[1], 5, 1.0), (*DRIVER_AT, 5, nan), (*DRIVER_AT, 5, -inf)
+    ):
+        cursor = encode_cursor([lat, lng, radius_km, last_distance, "x"])
+        response = client.get("/api/v1/deliveries/unassigned", headers=driver.headers, params={"cursor": cursor})
+        assert response.status_code == 400, (lat, lng, radius_km, last_distance)
+    print(f"   metrics: {pending_pickups.get_metrics()}")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
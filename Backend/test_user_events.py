@@ -0,0 +1,91 @@
+# test_user_events.py
+"""
+Offline check of missed-message replay: the per-user event log on its
+own, then a customer socket that drops, misses a driver accepting its
+delivery, and gets exactly that event back on reconnect.
+
+    python -m pytest -q test_user_events.py
+"""
+import sys
+
+import pytest
+from app.services.user_events import UserEventLog, user_events
+
+
+def test_event_log_resume():
+    log = UserEventLog(capacity=4, idle_ttl_seconds=3600)
+    for i in range(3):
+        log.publish("u1", {"type": "delivery_update", "n": i})
+
+    sync = log.resume("u1", None, None)
+    assert sync == [{"type": "sync", "epoch": log.epoch, "seq": 3, "replayed": 0}], sync
+
+    caught_up = log.resume("u1", log.epoch, 1)
+    assert [m.get("n") for m in caught_up] == [1, 2, None] and caught_up[-1]["type"] == "sync"
+    assert log.resume("u1", log.epoch, 3)[0]["type"] == "sync"
+
+
+def test_event_log_truncation_and_epochs():
+    log = UserEventLog(capacity=4, idle_ttl_seconds=3600)
+    # Nine events: the first five no longer fit a four-event log
+    for i in range(9):
+        log.publish("u1", {"type": "delivery_update", "n": i})
+    truncated = log.resume("u1", log.epoch, 2)
+    assert truncated == [{"type": "resync", "reason": "truncated", "epoch": log.epoch, "seq": 9}], truncated
+    replayed = log.resume("u1", log.epoch, 5)
+    assert [m["seq"] for m in replayed[:-1]] == [6, 7, 8, 9]
+
+    other = log.resume("u1", "another-epoch", 5)
+    assert other[0]["type"] == "resync" and other[0]["reason"] == "epoch"
+
+    # A user the log has never seen (or already reaped) cannot resume
+    assert log.resume("u2", log.epoch, 4)[0]["type"] == "resync"
+    print(f"   metrics: {log.get_metrics()}")
+
+
+@pytest.fixture(scope="module")
+def missed(client, register, book):
+    """A customer whose socket dropped while the driver accepted their delivery"""
+    customer = register("ev-c@x.com", "customer")
+    driver = register("ev-d@x.com", "driver", driver_license_number="LEV", vehicle_plate_number="KAEV")
+
+    with client.websocket_connect(f"/ws/{customer.id}?token={customer.token}") as ws:
+        sync = ws.receive_json()
+        assert sync["type"] == "sync" and sync["seq"] == 0
+        delivery = book(customer)
+        booked = ws.receive_json()
+        print(f"   live: {booked['event']} seq={booked['seq']}")
+        assert booked["event"] == "booked" and booked["delivery_id"] == delivery["id"]
+
+    # Offline while the driver accepts
+    client.post(f"/api/v1/deliveries/{delivery['id']}/accept", headers=driver.headers)
+    return customer, driver, (booked["epoch"], booked["seq"])
+
+
+def test_reconnect_replays_missed_event(client, missed):
+    customer, driver, (epoch, seq) = missed
+    with client.websocket_connect(f"/ws/{customer.id}?token={customer.token}&epoch={epoch}&since={seq}") as ws:
+        event = ws.receive_json()
+        print(f"   replayed: {event['event']} seq={event['seq']}")
+        assert event["type"] == "delivery_update" and event["event"] == "assigned"
+        assert event["seq"] == seq + 1 and event["driver_id"] == driver.id
+        sync = ws.receive_json()
+        assert sync == {"type": "sync", "epoch": epoch, "seq": event["seq"], "replayed": 1}, sync
+    assert user_events.get_metrics()["replayed"] >= 1
+
+
+def test_reconnect_from_another_process_resyncs(client, missed):
+    customer, _, _ = missed
+    with client.websocket_connect(f"/ws/{customer.id}?token={customer.token}&epoch=stale&since=1") as ws:
+        assert ws.receive_json()["type"] == "resync"
+
+
+def test_no_replay_without_token(client, missed):
+    customer, _, (epoch, _) = missed
+    with client.websocket_connect(f"/ws/{customer.id}?epoch={epoch}&since=0") as ws:
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json()["type"] == "pong"
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
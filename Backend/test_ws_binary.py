@@ -0,0 +1,144 @@
+# test_ws_binary.py
+"""
+Offline check of the happyauto.bin.v1 WebSocket subprotocol: codec round
+trips, a driver sending batched binary location frames, a customer
+receiving binary live-tracking frames, a JSON client on the same
+server, and out-of-range or non-finite positions rejected on every path.
+
+    python -m pytest -q test_ws_binary.py
+"""
+import json
+import sys
+import time
+
+import pytest
+from app.services.location_ingest import DeviceClock, location_ingestor
+from app.services.trip_meter import trip_meters
+from app.utils import ws_binary
+
+pytestmark = pytest.mark.settings(TRACKING_PUSH_INTERVAL_SECONDS=0)
+
+
+def test_location_batch_round_trip():
+    now = time.time()
+    samples = [(12.9716 + i * 1e-4, 77.5946 - i * 1e-4, now + i) for i in range(50)]
+    frame = ws_binary.encode_location_batch(samples)
+    decoded = ws_binary.decode(frame)["samples"]
+    assert len(decoded) == 50
+    assert all(abs(a[0] - b[0]) < 1e-7 and abs(a[1] - b[1]) < 1e-7 and abs(a[2] - b[2]) < 1e-3
+               for a, b in zip(samples, decoded))
+    as_json = json.dumps({"type": "location_batch", "samples": samples})
+    print(f"   50 samples: {len(frame)} bytes binary (deflated: {bool(frame[1] & ws_binary.FLAG_DEFLATE)}) "
+          f"vs {len(as_json)} bytes JSON")
+    assert len(frame) < len(as_json) / 3
+    assert len(ws_binary.encode_location_batch(samples[:1])) == 24
+
+
+@pytest.mark.parametrize("bad", [b"\x01", b"\x01\x00\x05\x00", b"\x7e\x00", b"\x01\x01not-zlib"])
+def test_malformed_frames_are_rejected(bad):
+    with pytest.raises(ws_binary.ProtocolError):
+        ws_binary.decode(bad)
+
+
+@pytest.fixture(scope="module")
+def trip(client, register, book):
+    """A customer and the driver who accepted their delivery"""
+    customer = register("bin-c@x.com", "customer")
+    driver = register("bin-d@x.com", "driver", driver_license_number="LBIN", vehicle_plate_number="KABIN")
+    delivery = book(customer)
+    client.post(f"/api/v1/deliveries/{delivery['id']}/accept", headers=driver.headers)
+    return customer, driver, delivery
+
+
+def test_binary_driver_and_customer(client, trip):
+    customer, driver, delivery = trip
+    protocol = [ws_binary.SUBPROTOCOL]
+    with client.websocket_connect(f"/ws/{customer.id}?token={customer.token}", subprotocols=protocol) as customer_ws, \
+            client.websocket_connect(f"/ws/{driver.id}?token={driver.token}", subprotocols=protocol) as driver_ws:
+        # Reconnect cursors stay JSON text frames on the binary subprotocol too
+        assert customer_ws.receive_json()["type"] == "sync" and driver_ws.receive_json()["type"] == "sync"
+        now = time.time()
+        driver_ws.send_bytes(ws_binary.encode_location_batch([
+            (12.9700, 77.5900, now - 2), (12.9710, 77.5910, now - 1), (12.9720, 77.5920, now)
+        ]))
+        ack = ws_binary.decode(driver_ws.receive_bytes())
+        print(f"   driver ack: {ack}")
+        assert ack == {"type": "location_ack", "accepted": 3, "server_ms": ack["server_ms"]}
+        assert abs(location_ingestor.position(driver.id)["lat"] - 12.972) < 1e-9
+
+        pushed = ws_binary.decode(customer_ws.receive_bytes())
+        print(f"   customer push: {pushed}")
+        assert pushed["type"] == "driver_location" and pushed["delivery_id"] == delivery["id"]
+
+        driver_ws.send_bytes(ws_binary.encode_ping())
+        assert ws_binary.decode(driver_ws.receive_bytes()) == {"type": "pong"}
+
+        driver_ws.send_bytes(b"\x01\x00\x09")
+        assert ws_binary.decode(driver_ws.receive_bytes())["type"] == "error"
+
+
+def test_json_clients_still_work(client, trip):
+    _, driver, _ = trip
+    with client.websocket_connect(f"/ws/{driver.id}?token={driver.token}") as legacy:
+        assert legacy.receive_json()["type"] == "sync"
+        legacy.send_text(json.dumps({"type": "location_update", "lat": 12.973, "lng": 77.593}))
+        ack = legacy.receive_json()
+        print(f"   JSON ack: {ack['type']} accepted={ack['accepted']}")
+        assert ack["type"] == "location_ack" and ack["lat"] == 12.973
+
+
+
+def test_device_clock_offset():
+    clock = DeviceClock()
+    clock.observe(1000.0, received_at=1120.5)
+    clock.observe(1010.0, received_at=1130.2)
+    assert clock.offset == pytest.approx(120.2)
+    assert clock.to_server(1010.0) == pytest.approx(1130.2)
+
+
+def test_slow_phone_clock_after_a_plain_update(client, trip):
+    _, driver, _ = trip
+    with client.websocket_connect(f"/ws/{driver.id}?token={driver.token}") as ws:
+        assert ws.receive_json()["type"] == "sync"
+        ws.send_text(json.dumps({"type": "location_update", "lat": 12.974, "lng": 77.594}))
+        assert ws.receive_json()["accepted"] == 1
+
+        # Two fixes after that ping, from a phone whose clock runs two minutes slow
+        time.sleep(0.3)
+        phone_now = time.time() - 120
+        ws.send_text(json.dumps({"type": "location_batch", "samples": [
+            (12.975, 77.595, phone_now - 0.2), (12.976, 77.596, phone_now)
+        ]}))
+        ack = ws.receive_json()
+        print(f"   batch from a slow clock: accepted={ack['accepted']} stale={location_ingestor.metrics['stale']}")
+        assert ack["accepted"] == 2
+        assert location_ingestor.position(driver.id)["lat"] == 12.976
+
+
+def test_bad_positions_are_rejected_before_anything_sees_them(client, trip):
+    _, driver, _ = trip
+    before = location_ingestor.position(driver.id)
+    meter = trip_meters.get_metrics()
+    for body in ('{"lat": NaN, "lng": 77.59}', '{"lat": 12.97, "lng": Infinity}', '{"lat": 91, "lng": 77.59}'):
+        response = client.put("/api/v1/deliveries/driver/location", headers={**driver.headers, "Content-Type": "application/json"},
+                              content=body)
+        assert response.status_code == 422, body
+
+    with client.websocket_connect(f"/ws/{driver.id}?token={driver.token}") as ws:
+        assert ws.receive_json()["type"] == "sync"
+        ws.send_text('{"type": "location_update", "lat": NaN, "lng": 77.59}')
+        assert ws.receive_json()["type"] == "error"
+        ws.send_text('{"type": "location_batch", "samples": [[12.97, 77.59, Infinity]]}')
+        assert ws.receive_json()["type"] == "error"
+        ws.send_text(json.dumps({"type": "location_update", "lat": 12.97, "lng": 181.0}))
+        assert ws.receive_json()["accepted"] == 0
+
+    assert location_ingestor.ingest(driver.id, float("nan"), 77.59) is False
+    assert location_ingestor.ingest(driver.id, 12.97, 77.59, float("inf")) is False
+    print(f"   ingest metrics: {location_ingestor.metrics}")
+    assert location_ingestor.position(driver.id) == before
+    assert trip_meters.get_metrics() == meter
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
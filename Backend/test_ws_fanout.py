@@ -0,0 +1,117 @@
+# test_ws_fanout.py
+"""
+Offline check of the WebSocket fan-out: a stalled client must not delay
+the others, frames are encoded once, queued driver positions coalesce,
+and a consumer that stays behind is disconnected.
+
+    python -m pytest -q test_ws_fanout.py
+"""
+import asyncio
+import json
+import sys
+import time
+
+import pytest
+from app.api.websocket import ConnectionManager
+
+
+class FakeSocket:
+    """Stands in for a Starlette WebSocket; delay=None never completes a send"""
+    scope = {}
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.received = []
+        self.closed_with = None
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, text):
+        if self.delay is None:
+            await asyncio.Event().wait()
+        await asyncio.sleep(self.delay)
+        self.received.append(json.loads(text))
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+async def connected(manager, sockets):
+    for user_id, socket in sockets.items():
+        await manager.connect(socket, user_id)
+    return sockets
+
+
+def new_manager():
+    return ConnectionManager(max_queue=8, send_timeout_seconds=5, slow_consumer_seconds=0.2)
+
+
+def test_broadcast_not_held_up_by_stalled_client():
+    async def run():
+        manager = new_manager()
+        fast = await connected(manager, {f"fast{i}": FakeSocket() for i in range(50)})
+        await connected(manager, {"stuck": FakeSocket(delay=None)})
+        started = time.perf_counter()
+        for n in range(5):
+            await manager.broadcast({"type": "announcement", "n": n})
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(0.05)
+        print(f"   5 broadcasts to 51 sockets returned in {elapsed * 1000:.2f}ms")
+        assert elapsed < 0.05
+        assert all(len(s.received) == 5 for s in fast.values())
+        assert manager.metrics["encoded"] == 5
+    asyncio.run(run())
+
+
+def test_queued_positions_coalesce():
+    async def run():
+        manager = new_manager()
+        slow = FakeSocket(delay=0.05)
+        await manager.connect(slow, "slow")
+        for i in range(20):
+            await manager.send_personal_message(
+                {"type": "driver_location", "delivery_id": "d1", "lat": i}, "slow",
+                coalesce_key=("driver_location", "d1")
+            )
+        await asyncio.sleep(0.3)
+        lats = [m["lat"] for m in slow.received]
+        print(f"   20 updates arrived as {lats}")
+        assert lats[-1] == 19 and len(lats) <= 3
+        manager.disconnect("slow", slow)
+    asyncio.run(run())
+
+
+def test_client_that_stays_behind_is_disconnected():
+    async def run():
+        manager = new_manager()
+        fast = await connected(manager, {f"fast{i}": FakeSocket() for i in range(50)})
+        stuck = FakeSocket(delay=None)
+        await manager.connect(stuck, "stuck")
+        # The stuck writer takes a first frame and never finishes sending it
+        await manager.broadcast({"type": "announcement", "n": -1})
+        await asyncio.sleep(0.01)
+
+        # A burst overflows the stuck queue, but nobody is cut off for a burst
+        for n in range(40):
+            await manager.broadcast({"type": "announcement", "n": n})
+        await asyncio.sleep(0.3)
+        assert all(manager.is_connected(u) for u in fast)
+
+        # Still behind past slow_consumer_seconds: disconnected on the next frame
+        await manager.broadcast({"type": "announcement", "n": 40})
+        await asyncio.sleep(0.05)
+        metrics = manager.get_metrics()
+        print(f"   dropped={metrics['dropped']} slow_disconnects={metrics['slow_disconnects']}")
+        print(f"   send latency: {metrics['send_latency']}")
+        assert not manager.is_connected("stuck")
+        assert stuck.closed_with == 1013
+        assert metrics["slow_disconnects"] == 1
+        assert all(manager.is_connected(u) for u in fast)
+        for user_id, socket in fast.items():
+            manager.disconnect(user_id, socket)
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
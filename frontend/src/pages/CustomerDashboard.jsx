@@ -134,66 +134,84 @@ const CustomerDashboard = () => {
     ]
   );
 
-  // Poll driver location
+  // Live driver location, pushed over the WebSocket
   useEffect(() => {
   const token = localStorage.getItem("access_token");
+  const user = JSON.parse(localStorage.getItem("user") || "null");
 
-  // 🚨 If user is not logged in, do not poll
-  if (!token) {
-    console.warn("No auth token found. Skipping driver location polling.");
+  // 🚨 If user is not logged in, do not connect
+  if (!token || !user?.id) {
+    console.warn("No auth token found. Skipping live driver tracking.");
     return;
   }
 
-  const id = setInterval(async () => {
-    try {
-      const res = await fetch(
-        "http://127.0.0.1:8000/api/v1/deliveries/driver/location",
-        {
-          headers: {
-            Authorization: `Bearer ${token}`, // ✅ REQUIRED
-            "Content-Type": "application/json"
-          }
-        }
-      );
-
-      // 🔹 No active delivery / no driver assigned
-      if (res.status === 404) {
-        setDriver(null);
-        return;
-      }
-
-      // 🔒 Token expired or invalid
-      if (res.status === 401) {
-        console.warn("Unauthorized. Stopping driver polling.");
-        clearInterval(id);
-        setDriver(null);
-        return;
-      }
+  let ws;
+  let retry;
+  let heartbeat;
+  let closed = false;
+  // Last delivery event seen; sent on reconnect so only the missed ones come back
+  let cursor = null;
+
+  const connect = () => {
+    const resume = cursor
+      ? `&epoch=${cursor.epoch}&since=${cursor.seq}`
+      : "";
+    ws = new WebSocket(
+      `ws://127.0.0.1:8000/ws/${user.id}?token=${encodeURIComponent(token)}${resume}`
+    );
 
-      if (!res.ok) {
-        console.warn(`Driver location fetch failed: ${res.status}`);
+    ws.onmessage = (event) => {
+      let msg;
+      try {
+        msg = JSON.parse(event.data);
+      } catch (e) {
         return;
       }
 
-      const loc = await res.json();
-
-      // ✅ Only update when coordinates exist
-      if (loc?.lat != null && loc?.lng != null) {
+      if (msg.type === "driver_location") {
         setDriver({
-          lat: Number(loc.lat),
-          lng: Number(loc.lng)
+          lat: Number(msg.lat),
+          lng: Number(msg.lng)
         });
-      } else {
+      } else if (msg.type === "tracking_ended") {
         setDriver(null);
+      } else if (msg.type === "delivery_update") {
+        // Replayed and live copies of an event can overlap; keep the first
+        if (cursor && msg.epoch === cursor.epoch && msg.seq <= cursor.seq) return;
+        cursor = { epoch: msg.epoch, seq: msg.seq };
+        fetchDeliveries();
+      } else if (msg.type === "sync") {
+        // Nothing to compare against on a first connect: refetch once
+        if (!cursor) fetchDeliveries();
+        cursor = { epoch: msg.epoch, seq: msg.seq };
+      } else if (msg.type === "resync") {
+        // Too much was missed (or the server restarted): reload everything
+        cursor = { epoch: msg.epoch, seq: msg.seq };
+        fetchDeliveries();
       }
+    };
+
+    // The server closes sockets it has not heard from in a minute
+    ws.onopen = () => {
+      heartbeat = setInterval(() => ws.send(JSON.stringify({ type: "ping" })), 20000);
+    };
+
+    // 🔁 Reconnect after a short pause; the server resends the last position
+    // and whatever delivery updates came in meanwhile
+    ws.onclose = () => {
+      clearInterval(heartbeat);
+      if (!closed) retry = setTimeout(connect, 3000);
+    };
+  };
 
-    } catch (e) {
-      // Network failure → silently ignore
-      setDriver(null);
-    }
-  }, 4000);
+  connect();
 
-  return () => clearInterval(id);
+  return () => {
+    closed = true;
+    clearTimeout(retry);
+    clearInterval(heartbeat);
+    ws?.close();
+  };
 }, []);
 
   // Fetch deliveries on load
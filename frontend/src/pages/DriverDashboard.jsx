@@ -46,6 +46,17 @@ const formatPickupTime = (isoString) => {
 
 
 
+// Browser position for the nearby-jobs feed; null lets the server use the last ping
+const currentPosition = () =>
+  new Promise((resolve) => {
+    if (!navigator.geolocation) return resolve(null);
+    navigator.geolocation.getCurrentPosition(
+      (pos) => resolve({ lat: pos.coords.latitude, lng: pos.coords.longitude }),
+      () => resolve(null),
+      { timeout: 3000, maximumAge: 30000 }
+    );
+  });
+
 const DriverDashboard = () => {
   const [isOnline, setIsOnline] = useState(false);
   const [unassignedJobs, setUnassignedJobs] = useState([]);
@@ -60,12 +71,49 @@ const DriverDashboard = () => {
     }
   }, [isOnline]);
 
+  // 💓 While online, heartbeat over the WebSocket; a driver the server
+  // stops hearing from is taken offline after ~30s
+  useEffect(() => {
+    const token = localStorage.getItem("access_token");
+    const user = JSON.parse(localStorage.getItem("user") || "null");
+    if (!isOnline || !token || !user?.id) return;
+
+    let ws;
+    let retry;
+    let heartbeat;
+    let closed = false;
+
+    const connect = () => {
+      ws = new WebSocket(
+        `ws://127.0.0.1:8000/ws/${user.id}?token=${encodeURIComponent(token)}`
+      );
+      ws.onopen = () => {
+        heartbeat = setInterval(() => ws.send(JSON.stringify({ type: "ping" })), 10000);
+      };
+      ws.onclose = () => {
+        clearInterval(heartbeat);
+        if (!closed) retry = setTimeout(connect, 3000);
+      };
+    };
+
+    connect();
+
+    return () => {
+      closed = true;
+      clearTimeout(retry);
+      clearInterval(heartbeat);
+      ws?.close();
+    };
+  }, [isOnline]);
+
   const fetchJobs = async () => {
   try {
-    const unassigned = await getUnassigned();
+    const position = await currentPosition();
+    // Without any known position the feed has nothing to sort by: show no jobs
+    const unassigned = await getUnassigned(position || {}).catch(() => ({ data: { items: [] } }));
     const mine = await getMyDeliveries();
 
-    const unassignedData = (unassigned.data || []).filter(
+    const unassignedData = (unassigned.data?.items || []).filter(
       // job.status !== 'cancelled' && isPickupTimeValid(job.scheduled_pickup)
       job => job.status === 'pending'
     );
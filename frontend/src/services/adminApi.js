@@ -1,7 +1,7 @@
-import API from "./api";
+import { getAllPages } from "./api";
 
 export const getAllCustomers = () =>
-  API.get("/api/v1/admin/customers");
+  getAllPages("/api/v1/admin/customers", { limit: 500 });
 
 export const getAllDrivers = () =>
-  API.get("/api/v1/admin/drivers");
+  getAllPages("/api/v1/admin/drivers", { limit: 500 });
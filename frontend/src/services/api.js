@@ -21,6 +21,20 @@ console.log("🔥 API BASE URL =", process.env.REACT_APP_API_URL);
 
 export default API;
 
+// List endpoints answer a page at a time: { items, next_cursor }.
+// Follow next_cursor to the end and hand back the rows as res.data.
+export const getAllPages = async (url, params = {}) => {
+  const items = [];
+  let cursor = null;
+  let res;
+  do {
+    res = await API.get(url, { params: cursor ? { ...params, cursor } : params });
+    items.push(...res.data.items);
+    cursor = res.data.next_cursor;
+  } while (cursor);
+  return { ...res, data: items };
+};
+
 // --- Auth ---
 export const login = (data) => API.post('/api/v1/auth/login', data);
 export const register = (data) => API.post('/api/v1/auth/register', data);
@@ -28,12 +42,15 @@ export const getMe = () => API.get('/api/v1/auth/me');
 
 // --- Deliveries ---
 export const bookDelivery = (data) => API.post('/api/v1/deliveries/book', data);
-export const getMyDeliveries = () => API.get('/api/v1/deliveries/my-deliveries');
-export const getUnassigned = () => API.get('/api/v1/deliveries/unassigned');
+export const getMyDeliveries = () =>
+  getAllPages('/api/v1/deliveries/my-deliveries', { limit: 100 });
+// Nearby pending pickups, nearest first: { items, next_cursor }
+export const getUnassigned = (params = {}) =>
+  API.get('/api/v1/deliveries/unassigned', { params });
 export const getCompletedDeliveries = () =>
-  API.get("/api/v1/deliveries/completed");
+  getAllPages("/api/v1/deliveries/completed", { limit: 100 });
 export const getDriverCompletedDeliveries = () =>
-  API.get("/api/v1/deliveries/driver/completed");
+  getAllPages("/api/v1/deliveries/driver/completed", { limit: 100 });
 
 
 // --- Driver Actions ---